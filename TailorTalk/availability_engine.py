@@ -0,0 +1,145 @@
+"""
+Availability Engine
+-------------------
+This module finds common free windows for group meetings from many attendees' busy lists:
+- Busy lists are merged in one streaming pass with a k-way heap merge (heapq.merge), one sorted stream per attendee
+- A sweep line keeps the busy intervals overlapping the current window in a heap ordered by end time, and the
+  window slides forward (two pointers) whenever the attendees busy in it break the quorum
+- Quorum: everyone by default, a fraction of attendees (e.g. 0.8), or all required attendees plus a fraction
+  of the optional ones; attendees whose calendars could not be read count as not free
+- The attendees busy in the current window are tracked incrementally as intervals enter and leave it
+- Work is O(n log n) in the number of busy intervals n (the merge itself is O(n log k) for k attendees) plus
+  O(k log k) per window found, independent of the horizon length (no per-minute grids), so 100+ attendees
+  over a month stay cheap
+
+Usage: find_common_slots(get_group_availability(calendars, start, end, credentials=...), start, end, slot_minutes=60)
+"""
+
+import math
+import heapq
+import datetime
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple
+
+import pytz
+
+
+def _epoch(value: str) -> float:
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = pytz.UTC.localize(parsed)
+    return parsed.timestamp()
+
+
+def _iso(epoch: float) -> str:
+    return datetime.datetime.fromtimestamp(epoch, pytz.UTC).isoformat()
+
+
+def _stream(attendee: str, busy: List[Dict[str, str]]) -> Iterator[Tuple[float, float, str]]:
+    for start, end in sorted((_epoch(b["start"]), _epoch(b["end"])) for b in busy):
+        if end > start:
+            yield start, end, attendee
+
+
+def find_common_slots(busy_by_attendee: Dict[str, Optional[List[Dict[str, str]]]], start_time: str, end_time: str, slot_minutes: int = 30, required: Iterable[str] = None, quorum: float = 1.0) -> List[Dict[str, Any]]:
+    """
+    Find the maximal windows in which enough attendees are free for at least slot_minutes.
+    Args:
+        busy_by_attendee (Dict[str, Optional[List[Dict[str, str]]]]): Busy slots (start, end) per attendee,
+            e.g. from calendar_node.get_group_availability; None marks an attendee whose availability is unknown.
+        start_time (str): ISO 8601 start of the search horizon.
+        end_time (str): ISO 8601 end of the search horizon.
+        slot_minutes (int): Minimum window length in minutes (the meeting duration).
+        required (Iterable[str], optional): Attendees who must all be free. The quorum applies to everyone else.
+        quorum (float): Fraction of the (non-required) attendees who must be free: 1.0 (default) means all,
+            0.8 means 80%; required=[...] with quorum=0.5 means all required plus half of the optional attendees.
+    Returns:
+        List[Dict[str, Any]]: Windows in start order with keys start, end, free (number of attendees free for the
+        whole window) and busy (attendees who are busy at some point in it, or unknown). Windows can overlap
+        when different attendees are missing from each.
+    """
+    required = set(required or []) & set(busy_by_attendee)
+    optional = [attendee for attendee in busy_by_attendee if attendee not in required]
+    unknown = sorted(attendee for attendee, busy in busy_by_attendee.items() if busy is None)
+    if any(attendee in required for attendee in unknown):
+        return []
+    # How many optional attendees may be missing, after those with unknown availability
+    allowed_missing = len(optional) - math.ceil(quorum * len(optional) - 1e-9) - len(unknown)
+    if allowed_missing < 0:
+        return []
+
+    horizon_start, horizon_end = _epoch(start_time), _epoch(end_time)
+    duration = slot_minutes * 60
+    total = len(busy_by_attendee)
+    merged = heapq.merge(*(_stream(attendee, busy) for attendee, busy in busy_by_attendee.items() if busy))
+
+    windows: List[Dict[str, Any]] = []
+    window_start = horizon_start
+    in_window: Dict[str, int] = {}  # attendee -> busy intervals overlapping the window
+    ends: List[Tuple[float, str, float]] = []  # heap of (end, attendee, start) for those intervals
+    starting: Dict[str, int] = {}  # attendee -> those of their intervals that start at the sweep position
+    sweep_at = None
+    last_end = None
+    busy_required = 0
+    busy_optional = 0
+
+    def add(attendee: str, start: float, end: float) -> None:
+        nonlocal busy_required, busy_optional
+        heapq.heappush(ends, (end, attendee, start))
+        starting[attendee] = starting.get(attendee, 0) + 1
+        if attendee in in_window:
+            in_window[attendee] += 1
+            return
+        in_window[attendee] = 1
+        if attendee in required:
+            busy_required += 1
+        else:
+            busy_optional += 1
+
+    def pop() -> float:
+        nonlocal busy_required, busy_optional
+        end, attendee, start = heapq.heappop(ends)
+        if start == sweep_at:
+            starting[attendee] -= 1
+        in_window[attendee] -= 1
+        if not in_window[attendee]:
+            del in_window[attendee]
+            if attendee in required:
+                busy_required -= 1
+            else:
+                busy_optional -= 1
+        return end
+
+    def emit(window_end: float, at_sweep: bool = False) -> None:
+        nonlocal last_end
+        # Window starts only move forward, so a window ending no later than the last one lies inside it
+        # (with a subset of its busy attendees) and is not maximal
+        if window_end - window_start >= duration and (last_end is None or window_end > last_end):
+            last_end = window_end
+            # Ending at the sweep position, intervals that only start there are outside the window
+            busy = sorted(attendee for attendee, count in in_window.items() if not at_sweep or count > starting.get(attendee, 0)) + unknown
+            windows.append({"start": _iso(window_start), "end": _iso(window_end), "free": total - len(busy), "busy": busy})
+
+    for start, end, attendee in merged:
+        if end <= window_start:
+            continue
+        if start >= horizon_end:
+            break
+        if start != sweep_at:
+            starting.clear()
+            sweep_at = start
+        # Intervals that ended before the window opened no longer count against it
+        while ends and ends[0][0] <= window_start:
+            pop()
+        breaks_quorum = attendee not in in_window and (attendee in required or busy_optional + 1 > allowed_missing)
+        if breaks_quorum:
+            # The window so far is maximal
+            emit(max(start, window_start), at_sweep=True)
+        add(attendee, start, end)
+        if breaks_quorum:
+            # Slide the window start past the earliest-ending busy intervals until the quorum holds again
+            while busy_required or busy_optional > allowed_missing:
+                window_start = max(window_start, pop())
+    while ends and ends[0][0] <= window_start:
+        pop()
+    emit(horizon_end)
+    return windows
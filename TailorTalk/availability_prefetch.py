@@ -0,0 +1,133 @@
+"""
+Availability Prefetch
+---------------------
+This module speculatively fetches the user's free/busy window while the router is still deciding:
+- Started as soon as the turn looks like booking (local intent rules, or the intent node's result)
+- Runs on the shared node executor, overlapping the Google round trip with the router's LLM round trip
+- Claimed by the suggestion step if the route goes there; otherwise discarded at the end of the turn
+- Hit, miss and waste counts are kept so the speculation can be tuned (or turned off) from data
+
+Optionally: AVAILABILITY_PREFETCH = '1' (default) or '0', AVAILABILITY_WINDOW_DAYS (default 7)
+"""
+
+import os
+import re
+import time
+import datetime
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional, Tuple
+
+from calendar_node import get_calendar_availability
+from node_executor import submit
+
+AVAILABILITY_PREFETCH = os.getenv("AVAILABILITY_PREFETCH", "1") == "1"
+AVAILABILITY_WINDOW_DAYS = int(os.getenv("AVAILABILITY_WINDOW_DAYS", "7"))
+
+_BOOKING_INTENT = re.compile(r"book|schedul|meeting|appointment|availab|slot|calendar|resched|modif", re.I)
+
+_stats_lock = threading.Lock()
+_stats = {"started": 0, "hits": 0, "wasted": 0, "misses": 0, "saved_ms": 0.0}
+
+
+def looks_like_booking(intent_result: Dict[str, Any]) -> bool:
+    """
+    True if an intent result (from intent_rules or analyze_intent) suggests the turn may need availability.
+    """
+    if not isinstance(intent_result, dict) or "error" in intent_result:
+        return False
+    return bool(_BOOKING_INTENT.search(str(intent_result.get("intent", ""))))
+
+
+def availability_window(now: datetime.datetime = None) -> Tuple[str, str]:
+    """
+    Return the (start, end) ISO window used for suggestions: now until AVAILABILITY_WINDOW_DAYS ahead, in UTC.
+    """
+    now = now or datetime.datetime.utcnow()
+    return now.isoformat() + "Z", (now + datetime.timedelta(days=AVAILABILITY_WINDOW_DAYS)).isoformat() + "Z"
+
+
+def _count(key: str, amount: float = 1) -> None:
+    with _stats_lock:
+        _stats[key] += amount
+
+
+class AvailabilityPrefetch:
+    """
+    One speculative free/busy fetch for the current turn.
+    """
+
+    def __init__(self, user_email: str, credentials=None):
+        self.user_email = user_email
+        self.start_time, self.end_time = availability_window()
+        self.started_at = time.perf_counter()
+        self.future: Future = submit(self._fetch, credentials)
+        self.finished_at: Optional[float] = None
+        self.settled = False
+        _count("started")
+
+    def _fetch(self, credentials) -> List[Dict[str, Any]]:
+        try:
+            return get_calendar_availability(self.user_email, self.start_time, self.end_time, credentials=credentials)
+        finally:
+            self.finished_at = time.perf_counter()
+
+    def claim(self) -> Tuple[List[Dict[str, Any]], str, str]:
+        """
+        Use the prefetched result. Blocks if the fetch is still running; re-raises its error.
+        Returns:
+            Tuple[List[Dict[str, Any]], str, str]: Busy slots, and the window start and end they cover.
+        """
+        claimed_at = time.perf_counter()
+        busy = self.future.result()
+        if not self.settled:
+            self.settled = True
+            _count("hits")
+            # Fetch time that overlapped other work instead of being waited for
+            _count("saved_ms", (min(self.finished_at or claimed_at, claimed_at) - self.started_at) * 1000)
+        return busy, self.start_time, self.end_time
+
+    def discard(self) -> None:
+        """
+        Drop the speculation (the route went elsewhere). The fetch is cancelled if it has not started.
+        """
+        if self.settled:
+            return
+        self.settled = True
+        self.future.cancel()
+        _count("wasted")
+
+
+def start_availability_prefetch(user_email: str, credentials=None) -> Optional[AvailabilityPrefetch]:
+    """
+    Start a speculative fetch, unless prefetching is disabled or there are no credentials to fetch with.
+    """
+    if not AVAILABILITY_PREFETCH or credentials is None or not user_email:
+        return None
+    return AvailabilityPrefetch(user_email, credentials)
+
+
+def fetch_availability(prefetch: Optional[AvailabilityPrefetch], user_email: str, credentials=None) -> Tuple[List[Dict[str, Any]], str, str]:
+    """
+    Return (busy slots, window start, window end), from the prefetch if there is one, otherwise fetched now.
+    """
+    if prefetch is not None:
+        return prefetch.claim()
+    _count("misses")
+    start_time, end_time = availability_window()
+    return get_calendar_availability(user_email, start_time, end_time, credentials=credentials), start_time, end_time
+
+
+def get_prefetch_stats() -> Dict[str, Any]:
+    """
+    Return started, hits, wasted and misses (needed but not prefetched) counts, hit and waste rates
+    (over started prefetches), and the mean Google latency hidden per hit.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    started = stats["started"]
+    stats["hit_rate"] = round(stats["hits"] / started, 3) if started else 0.0
+    stats["waste_rate"] = round(stats["wasted"] / started, 3) if started else 0.0
+    stats["mean_saved_ms"] = round(stats["saved_ms"] / stats["hits"], 1) if stats["hits"] else 0.0
+    stats["saved_ms"] = round(stats["saved_ms"], 1)
+    return stats
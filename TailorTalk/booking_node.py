@@ -3,16 +3,16 @@ Booking Execution Node
 ---------------------
 This module handles the technical aspects of booking calendar events, sending invitations, and managing the booking transaction.
 - Core booking is API-driven (Google Calendar integration placeholder)
-- Groq LLM is used for user-friendly error and success messages
+- Success and error messages are rendered from local templates (message_templates.py); Groq LLM
+  personalization is opt-in via LLM_POLISH=booking, with the template as fallback
 
 Requires: Google Calendar API credentials (to be configured)
 Optionally: GROQ_API_KEY (set directly in the code) for LLM-based communication
 """
 
 import requests
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List
 import re
-from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 import pickle
@@ -20,8 +20,26 @@ import os
 import datetime
 import streamlit as st
 
-GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"  # Updated endpoint
+from groq_client import chat_completion, stream_chat_completion
+from prompt_render import render_data
+from message_templates import polish_enabled, render_booking
+from google_services import get_service, credential_key
+from freebusy_cache import apply_event_change, invalidate as invalidate_freebusy
+from calendar_sync import apply_event as mirror_event
+from turn_trace import span, traced, SPAN_KIND_CLIENT
+
+# Static instructions: kept byte-identical across calls so the provider can reuse the cached prefix
+BOOKING_SUCCESS_SYSTEM_PROMPT = """You are a conversational AI assistant. Craft a personalized confirmation message for a successful calendar booking.
+- Match the user's tone (given as Tone)
+- Include the event details
+- Start from the draft message and personalize it; keep every detail in it accurate
+Respond ONLY with a single confirmation message in plain text. Do not include any explanation, markdown, or text outside the message."""
+BOOKING_FAILURE_SYSTEM_PROMPT = """You are a conversational AI assistant. Explain a booking failure in a user-friendly, empathetic way.
+- Match the user's tone (given as Tone)
+- Explain the error details
+- Suggest next steps if possible.
+- Start from the draft message and personalize it
+Respond ONLY with a single error message in plain text. Do not include any explanation, markdown, or text outside the message."""
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 TOKEN_PATH = 'token.pickle'
@@ -29,10 +47,11 @@ CREDENTIALS_PATH = 'credentials.json'
 
 def get_calendar_service(credentials=None, credentials_path=None):
     if credentials is not None:
-        return build('calendar', 'v3', credentials=credentials)
+        return get_service('calendar', 'v3', credentials)
     raise RuntimeError("Google OAuth credentials must be provided. The local OAuth flow is not supported in production. Please log in via the web interface.")
 
 
+@traced("booking")
 def book_calendar_event(event_details: Dict[str, Any], credentials=None, credentials_path=None) -> Dict[str, Any]:
     """
     Book a calendar event using Google Calendar API.
@@ -74,10 +93,36 @@ def book_calendar_event(event_details: Dict[str, Any], credentials=None, credent
             },
             'attendees': [{'email': email} for email in participants if "@" in email],
         }
-        created_event = service.events().insert(calendarId='primary', body=event, sendUpdates='all').execute()
-        return {"success": True, "event_id": created_event.get("id"), "error": None}
+        with span("google.calendar.events.insert", kind=SPAN_KIND_CLIENT, attendees=len(event['attendees'])):
+            created_event = service.events().insert(calendarId='primary', body=event, sendUpdates='all').execute()
     except Exception as e:
         return {"success": False, "event_id": None, "error": str(e)}
+    # The event exists now; keeping cached availability current must not turn the booking into a failure
+    user = credential_key(credentials)
+    try:
+        apply_event_change(user, 'primary', None, created_event)
+        mirror_event(user, 'primary', created_event)
+    except Exception as e:
+        print(f"[Booking] could not write event {created_event.get('id')} through to cached availability: {e}")
+        invalidate_freebusy(user)
+    return {"success": True, "event_id": created_event.get("id"), "error": None}
+
+
+def _build_booking_messages(success: bool, event_details: Dict[str, Any], error: str, communication_style: str, draft: str) -> List[Dict[str, str]]:
+    if success:
+        system_prompt = BOOKING_SUCCESS_SYSTEM_PROMPT
+        prompt = f"""Tone: {communication_style}
+Event details: {render_data(event_details)}
+Draft message: {draft}"""
+    else:
+        system_prompt = BOOKING_FAILURE_SYSTEM_PROMPT
+        prompt = f"""Tone: {communication_style}
+Error details: {error}
+Draft message: {draft}"""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
 
 
 def generate_booking_message(success: bool, event_details: Dict[str, Any], error: str = None, communication_style: str = "neutral") -> str:
@@ -89,45 +134,55 @@ def generate_booking_message(success: bool, event_details: Dict[str, Any], error
         error (str): Error message, if any.
         communication_style (str): Desired tone/style (e.g., 'formal', 'casual').
     Returns:
-        str: User-facing message.
+        str: User-facing message (the template rendering unless LLM polish is enabled and succeeds).
     """
-    if success:
-        prompt = f"""
-You are a conversational AI assistant. Craft a personalized confirmation message for a successful calendar booking.
-- Match the user's tone: {communication_style}
-- Include event details: {event_details}
-Respond ONLY with a single confirmation message in plain text. Do not include any explanation, markdown, or text outside the message.
-"""
-    else:
-        prompt = f"""
-You are a conversational AI assistant. Explain a booking failure in a user-friendly, empathetic way.
-- Match the user's tone: {communication_style}
-- Error details: {error}
-- Suggest next steps if possible.
-Respond ONLY with a single error message in plain text. Do not include any explanation, markdown, or text outside the message.
-"""
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "llama-3.3-70b-versatile",  # Updated model name
-        "messages": [
-            {"role": "system", "content": "You are a booking communication assistant for calendar events."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 128,
-        "temperature": 0.5
-    }
+    draft = render_booking(success, event_details, error, communication_style)
+    if not polish_enabled("booking"):
+        return draft
+    messages = _build_booking_messages(success, event_details, error, communication_style, draft)
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
+        result = chat_completion("booking", messages, max_tokens=128, temperature=0.5)
         content = result["choices"][0]["message"]["content"]
         # Remove markdown or extra explanation if present
         msg = content.strip()
         if msg.startswith("```"):
             msg = re.sub(r"^```[a-zA-Z]*\\n|```$", "", msg, flags=re.MULTILINE).strip()
-        return msg
+        return msg or draft
+    except Exception as e:
+        print(f"[Booking] LLM polish failed, using template: {e}")
+        return draft
+
+
+def stream_booking_message(success: bool, event_details: Dict[str, Any], error: str = None, communication_style: str = "neutral") -> Iterator[str]:
+    """
+    Streaming variant of generate_booking_message: yields the message in fragments as Groq produces them.
+    Args:
+        success (bool): Whether the booking was successful.
+        event_details (Dict[str, Any]): The event details.
+        error (str): Error message, if any.
+        communication_style (str): Desired tone/style (e.g., 'formal', 'casual').
+    Returns:
+        Iterator[str]: Message fragments. The template rendering is yielded as a single fragment when LLM
+        polish is disabled, or when the request fails before any text arrives.
+    """
+    draft = render_booking(success, event_details, error, communication_style)
+    if not polish_enabled("booking"):
+        yield draft
+        return
+    messages = _build_booking_messages(success, event_details, error, communication_style, draft)
+    produced = False
+    try:
+        for fragment in stream_chat_completion("booking", messages, max_tokens=128, temperature=0.5):
+            if not produced:
+                # Drop a leading markdown fence if the model adds one
+                fragment = re.sub(r"^\s*```[a-zA-Z]*\n?", "", fragment)
+            if fragment:
+                produced = True
+                yield fragment
     except Exception as e:
-        return f"Groq API request failed or invalid booking message: {str(e)}" 
+        print(f"[Booking] LLM polish failed, using template: {e}")
+        if not produced:
+            yield draft
+        return
+    if not produced:
+        yield draft
\ No newline at end of file
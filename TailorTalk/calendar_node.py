@@ -10,14 +10,13 @@ This module interfaces with Google Calendar to:
 Requires: Google Calendar API credentials.json in the project root
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import datetime
 import os
 import pytz
 import streamlit as st
 
 # Google Calendar API imports
-from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 import pickle
@@ -26,25 +25,40 @@ import pickle
 import requests
 import re
 
-GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"  # Updated endpoint
+from groq_client import GROQ_API_KEY, chat_completion
+from json_stream import extract_json
+from prompt_render import render_data
+from google_services import get_service, credential_key
+import freebusy_cache
+from calendar_sync import CALENDAR_SYNC, mirrored_availability, apply_event as mirror_event
+from node_executor import submit
+from turn_trace import span, traced, SPAN_KIND_CLIENT
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 TOKEN_PATH = 'token.pickle'
 CREDENTIALS_PATH = 'credentials.json'
+# FreeBusy accepts at most 50 calendars per query
+FREEBUSY_MAX_ITEMS = 50
+
+# Static instructions: kept byte-identical across calls so the provider can reuse the cached prefix
+SLOT_RANKING_SYSTEM_PROMPT = """You are a scheduling assistant. Given the available slots and user preferences, rank the slots and suggest the best options.
+Respond ONLY with a JSON list of ranked slots (most preferred first). Do not include any explanation, markdown, or text outside the JSON."""
 
 # 1. Google Calendar API Auth
 
 def get_calendar_service(credentials=None, credentials_path=None):
     if credentials is not None:
-        return build('calendar', 'v3', credentials=credentials)
+        return get_service('calendar', 'v3', credentials)
     raise RuntimeError("Google OAuth credentials must be provided. The local OAuth flow is not supported in production. Please log in via the web interface.")
 
 # 2. Fetch busy slots from Google Calendar
 
+@traced("calendar_availability")
 def get_calendar_availability(user_email: str, start_time: str, end_time: str, credentials=None, credentials_path=None) -> List[Dict[str, Any]]:
     """
     Retrieve busy slots from the user's Google Calendar between start_time and end_time.
+    Served from the incremental-sync event mirror when CALENDAR_SYNC is on (calendar_sync.py), otherwise
+    from freebusy_cache.py when a recent fetch covers the window.
     Args:
         user_email (str): The user's email address (not used for auth, just for info).
         start_time (str): ISO 8601 start datetime (e.g., '2024-06-10T00:00:00Z').
@@ -53,16 +67,83 @@ def get_calendar_availability(user_email: str, start_time: str, end_time: str, c
     Returns:
         List[Dict[str, Any]]: List of busy slots (start, end).
     """
+    user = credential_key(credentials)
+    if CALENDAR_SYNC:
+        return mirrored_availability(user, 'primary', start_time, end_time, lambda: get_calendar_service(credentials=credentials))
+    cached = freebusy_cache.lookup(user, 'primary', start_time, end_time)
+    if cached is not None:
+        return cached
+    query_start, query_end = freebusy_cache.fetch_window(start_time, end_time)
+    busy_times = _query_freebusy(['primary'], query_start, query_end, credentials)['primary']['busy']
+    freebusy_cache.store(user, 'primary', query_start, query_end, busy_times)
+    return freebusy_cache.clip(busy_times, start_time, end_time)
+
+
+def _query_freebusy(calendar_ids: List[str], start_time: str, end_time: str, credentials) -> Dict[str, Any]:
     service = get_calendar_service(credentials=credentials)
     body = {
         "timeMin": start_time,
         "timeMax": end_time,
         "timeZone": "UTC",
-        "items": [{"id": 'primary'}]
+        "items": [{"id": calendar_id} for calendar_id in calendar_ids]
     }
-    eventsResult = service.freebusy().query(body=body).execute()
-    busy_times = eventsResult['calendars']['primary']['busy']
-    return busy_times
+    with span("google.calendar.freebusy.query", kind=SPAN_KIND_CLIENT, calendars=len(calendar_ids)) as sp:
+        calendars = service.freebusy().query(body=body).execute()['calendars']
+        if sp is not None:
+            sp.set("busy_slots", sum(len(entry.get('busy', [])) for entry in calendars.values()))
+    return calendars
+
+
+@traced("group_availability")
+def get_group_availability(calendar_ids: List[str], start_time: str, end_time: str, credentials=None) -> Dict[str, Optional[List[Dict[str, str]]]]:
+    """
+    Retrieve busy slots for several calendars (attendees' emails, room/resource calendars) at once.
+    Calendars not in freebusy_cache.py are packed into as few FreeBusy queries as the item limit allows,
+    and the queries run in parallel on the node executor.
+    Args:
+        calendar_ids (List[str]): Calendar IDs to look up.
+        start_time (str): ISO 8601 start datetime (e.g., '2024-06-10T00:00:00Z').
+        end_time (str): ISO 8601 end datetime.
+        credentials (Credentials): Google OAuth credentials object (required)
+    Returns:
+        Dict[str, Optional[List[Dict[str, str]]]]: Busy slots (start, end) per calendar ID, in request order;
+        None for calendars whose free/busy Google could not provide (not found, not shared, ...) or whose
+        query failed.
+    """
+    user = credential_key(credentials)
+    calendar_ids = list(dict.fromkeys(calendar_ids))
+    results: Dict[str, Optional[List[Dict[str, str]]]] = {}
+    missing = []
+    for calendar_id in calendar_ids:
+        cached = freebusy_cache.lookup(user, calendar_id, start_time, end_time)
+        if cached is not None:
+            results[calendar_id] = cached
+        else:
+            missing.append(calendar_id)
+    query_start, query_end = freebusy_cache.fetch_window(start_time, end_time)
+    chunks = [missing[i:i + FREEBUSY_MAX_ITEMS] for i in range(0, len(missing), FREEBUSY_MAX_ITEMS)]
+    # The first chunk runs on this thread, so a single query never waits for a free executor worker
+    futures = [submit(_query_freebusy, chunk, query_start, query_end, credentials) for chunk in chunks[1:]]
+    responses = []
+    for chunk, result in zip(chunks, [None] + futures):
+        try:
+            responses.append(result.result() if result is not None else _query_freebusy(chunk, query_start, query_end, credentials))
+        except Exception as e:
+            # One failed query only costs its own calendars; the other chunks' results are still used
+            print(f"[Calendar] Free/busy query for {len(chunk)} calendars failed: {e}")
+            responses.append(dict.fromkeys(chunk))
+    for calendars in responses:
+        for calendar_id, entry in calendars.items():
+            if entry is None:
+                results[calendar_id] = None
+                continue
+            if entry.get('errors'):
+                print(f"[Calendar] Free/busy unavailable for {calendar_id}: {entry['errors']}")
+                results[calendar_id] = None
+                continue
+            freebusy_cache.store(user, calendar_id, query_start, query_end, entry.get('busy', []))
+            results[calendar_id] = freebusy_cache.clip(entry.get('busy', []), start_time, end_time)
+    return {calendar_id: results.get(calendar_id) for calendar_id in calendar_ids}
 
 # 3. Find free slots given busy slots
 
@@ -103,25 +184,57 @@ def find_free_slots(busy_slots: List[Dict[str, str]], start_time: str, end_time:
             })
     return free
 
+
+def localize_slots(slots: List[Dict[str, Any]], timezone: str) -> List[Dict[str, Any]]:
+    """
+    Express slots (UTC, as returned by find_free_slots / find_common_slots) in the user's timezone, which is
+    also the timezone the user's reply picking one of them is parsed and booked in.
+    Args:
+        slots (List[Dict[str, Any]]): Slots with ISO 8601 'start' and 'end'.
+        timezone (str): IANA timezone of the user.
+    Returns:
+        List[Dict[str, Any]]: The slots with local 'start'/'end' and a 'timezone' key.
+    """
+    tz = pytz.timezone(timezone)
+    localized = []
+    for slot in slots:
+        start = datetime.datetime.fromisoformat(slot['start'].replace('Z', '+00:00')).astimezone(tz)
+        end = datetime.datetime.fromisoformat(slot['end'].replace('Z', '+00:00')).astimezone(tz)
+        localized.append(dict(slot, start=start.isoformat(), end=end.isoformat(), timezone=timezone))
+    return localized
+
 # 4. Update an event
 
-def update_event(event_id: str, updated_fields: Dict[str, Any], calendar_id: str = 'primary') -> Dict[str, Any]:
+def update_event(event_id: str, updated_fields: Dict[str, Any], calendar_id: str = 'primary', credentials=None) -> Dict[str, Any]:
     """
     Update an event with new details.
     Args:
         event_id (str): The event ID to update.
         updated_fields (Dict[str, Any]): Fields to update (e.g., start, end, summary).
         calendar_id (str): Calendar ID (default 'primary').
+        credentials (Credentials): Google OAuth credentials object (required)
     Returns:
         Dict[str, Any]: The updated event resource.
     """
-    service = get_calendar_service()
-    event = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+    service = get_calendar_service(credentials=credentials)
+    with span("google.calendar.events.get", kind=SPAN_KIND_CLIENT):
+        event = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+    previous = dict(event)
     event.update(updated_fields)
-    updated_event = service.events().update(calendarId=calendar_id, eventId=event_id, body=event).execute()
+    with span("google.calendar.events.update", kind=SPAN_KIND_CLIENT):
+        updated_event = service.events().update(calendarId=calendar_id, eventId=event_id, body=event).execute()
+    # The update already happened; a failed write-through only costs the cached windows
+    user = credential_key(credentials)
+    try:
+        freebusy_cache.apply_event_change(user, calendar_id, previous, updated_event)
+        mirror_event(user, calendar_id, updated_event)
+    except Exception as e:
+        print(f"[Calendar] could not write event {event_id} through to cached availability: {e}")
+        freebusy_cache.invalidate(user)
     return updated_event
 
 # 5. LLM-based slot ranking (unchanged)
+@traced("slot_ranking")
 def suggest_optimal_slots(free_slots: List[Dict[str, Any]], user_preferences: Dict[str, Any], context: str = "") -> List[Dict[str, Any]]:
     """
     Optionally use Groq LLM to rank and optimize suggested slots based on user preferences and context.
@@ -136,44 +249,25 @@ def suggest_optimal_slots(free_slots: List[Dict[str, Any]], user_preferences: Di
     if not GROQ_API_KEY or not free_slots:
         return free_slots
 
-    prompt = f"""
-You are a scheduling assistant. Given the following available slots and user preferences, rank the slots and suggest the best options.
-Free slots: {free_slots}
-User preferences: {user_preferences}
+    prompt = f"""User preferences: {render_data(user_preferences)}
 Context: {context}
-Respond ONLY with a JSON list of ranked slots (most preferred first). Do not include any explanation, markdown, or text outside the JSON.
-"""
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "llama-3.3-70b-versatile",  # Updated model name
-        "messages": [
-            {"role": "system", "content": "You are a scheduling optimization assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 512,
-        "temperature": 0.2
-    }
+Free slots: {render_data(free_slots)}"""
+    messages = [
+        {"role": "system", "content": SLOT_RANKING_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
     import json as pyjson
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
+        result = chat_completion("calendar", messages, max_tokens=512, temperature=0.2)
         content = result["choices"][0]["message"]["content"]
         try:
             ranked_slots = pyjson.loads(content)
             return ranked_slots
         except Exception as e:
             # Try to extract JSON substring
-            match = re.search(r'\[.*\]', content, re.DOTALL)
-            if match:
-                try:
-                    ranked_slots = pyjson.loads(match.group(0))
-                    return ranked_slots
-                except Exception as e2:
-                    return free_slots  # Fallback: return original slots if LLM fails
+            ranked_slots = extract_json(content, "[")
+            if ranked_slots is not None:
+                return ranked_slots
             return free_slots  # Fallback: return original slots if LLM fails
     except Exception as e:
         return free_slots  # Fallback: return original slots if LLM fails 
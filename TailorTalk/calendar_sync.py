@@ -0,0 +1,245 @@
+"""
+Calendar Sync
+-------------
+This module keeps a local per-user mirror of calendar events current with Google's incremental sync:
+- The first sync lists every event (paginated); later syncs send the stored syncToken and fetch only changes
+- A 410 Gone (expired sync token) drops the mirror and runs a full resync
+- The mirror keeps only what availability needs: the busy interval of each event that blocks time
+  (not cancelled, not transparent, not declined), stored compactly on disk as gzipped JSON per user and calendar
+- get_calendar_availability answers from the mirror with a binary search, touching the network only for deltas,
+  at most once per CALENDAR_SYNC_INTERVAL seconds; events booked or moved by TailorTalk are applied immediately
+
+Optionally: CALENDAR_SYNC = '1' to enable (default '0', availability then uses free/busy queries),
+CALENDAR_SYNC_DIR (default '.calendar_sync'), CALENDAR_SYNC_INTERVAL (seconds, default 30)
+"""
+
+import os
+import gzip
+import json
+import time
+import bisect
+import datetime
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import pytz
+
+from turn_trace import span, SPAN_KIND_CLIENT
+
+CALENDAR_SYNC = os.getenv("CALENDAR_SYNC", "0") == "1"
+CALENDAR_SYNC_DIR = os.getenv("CALENDAR_SYNC_DIR", ".calendar_sync")
+CALENDAR_SYNC_INTERVAL = float(os.getenv("CALENDAR_SYNC_INTERVAL", "30"))
+
+# events().list page size (the API maximum)
+PAGE_SIZE = 2500
+
+_mirrors: Dict[Tuple[str, str], "EventMirror"] = {}
+_mirrors_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"full_syncs": 0, "delta_syncs": 0, "resyncs_410": 0, "pages": 0, "changes": 0, "queries": 0}
+
+
+def _count(key: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def _to_epoch(value: Dict[str, str], calendar_timezone: str) -> int:
+    if "dateTime" in value:
+        parsed = datetime.datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = pytz.timezone(value.get("timeZone") or calendar_timezone).localize(parsed)
+    else:
+        # All-day events run from midnight to midnight in the calendar's time zone
+        parsed = pytz.timezone(calendar_timezone).localize(datetime.datetime.fromisoformat(value["date"]))
+    return int(parsed.timestamp())
+
+
+def _format(epoch: int) -> str:
+    return datetime.datetime.fromtimestamp(epoch, pytz.UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def busy_interval(event: Dict[str, Any], calendar_timezone: str = "UTC") -> Optional[Tuple[int, int]]:
+    """
+    The (start, end) epoch seconds an event blocks, or None if it does not block time.
+    """
+    if event.get("status") == "cancelled" or event.get("transparency") == "transparent":
+        return None
+    if any(attendee.get("self") and attendee.get("responseStatus") == "declined" for attendee in event.get("attendees", [])):
+        return None
+    if "start" not in event or "end" not in event:
+        return None
+    return _to_epoch(event["start"], calendar_timezone), _to_epoch(event["end"], calendar_timezone)
+
+
+class EventMirror:
+    """
+    Busy intervals of one user's calendar, kept current with events().list(syncToken=...).
+    """
+
+    def __init__(self, user: str, calendar_id: str = "primary", directory: str = None):
+        self.user = user
+        self.calendar_id = calendar_id
+        self.path = os.path.join(directory or CALENDAR_SYNC_DIR, f"{user}_{calendar_id.replace('/', '_')}.json.gz")
+        self.sync_token: Optional[str] = None
+        self.time_zone = "UTC"
+        self.events: Dict[str, Tuple[int, int]] = {}
+        self.synced_at = 0.0
+        self._index: Optional[List[Tuple[int, int]]] = None
+        self._longest = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.sync_token = data.get("sync_token")
+        self.time_zone = data.get("time_zone") or "UTC"
+        self.events = {event_id: tuple(interval) for event_id, interval in data.get("events", {}).items()}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump({"sync_token": self.sync_token, "time_zone": self.time_zone, "events": self.events}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def _apply(self, event: Dict[str, Any]) -> None:
+        interval = busy_interval(event, self.time_zone)
+        if interval is None:
+            self.events.pop(event["id"], None)
+        else:
+            self.events[event["id"]] = interval
+        self._index = None
+
+    def _list_pages(self, service, sync_token: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+        events: List[Dict[str, Any]] = []
+        page_token = None
+        time_zone = None
+        while True:
+            params = {"calendarId": self.calendar_id, "singleEvents": True, "maxResults": PAGE_SIZE}
+            if sync_token:
+                params["syncToken"] = sync_token
+            if page_token:
+                params["pageToken"] = page_token
+            with span("google.calendar.events.list", kind=SPAN_KIND_CLIENT, incremental=bool(sync_token)) as sp:
+                page = service.events().list(**params).execute()
+                if sp is not None:
+                    sp.set("events", len(page.get("items", [])))
+            _count("pages")
+            events.extend(page.get("items", []))
+            time_zone = page.get("timeZone") or time_zone
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return events, page.get("nextSyncToken"), time_zone
+
+    def sync(self, service) -> int:
+        """
+        Bring the mirror up to date: incremental if a sync token is stored, otherwise (or after 410 Gone) a full sync.
+        Returns:
+            int: Number of changed events received.
+        """
+        from googleapiclient.errors import HttpError
+        with self._lock:
+            full = self.sync_token is None
+            try:
+                events, sync_token, time_zone = self._list_pages(service, self.sync_token)
+            except HttpError as e:
+                if getattr(e.resp, "status", None) != 410 or full:
+                    raise
+                # The sync token expired or was invalidated: start over
+                print(f"[CalendarSync] sync token for {self.calendar_id} expired, running a full sync")
+                _count("resyncs_410")
+                full = True
+                events, sync_token, time_zone = self._list_pages(service, None)
+            if full:
+                self.events = {}
+                self._index = None
+            self.time_zone = time_zone or self.time_zone
+            for event in events:
+                self._apply(event)
+            self.sync_token = sync_token
+            self.synced_at = time.monotonic()
+            self._save()
+        _count("full_syncs" if full else "delta_syncs")
+        _count("changes", len(events))
+        return len(events)
+
+    def is_fresh(self) -> bool:
+        return self.sync_token is not None and time.monotonic() - self.synced_at < CALENDAR_SYNC_INTERVAL
+
+    def apply_event(self, event: Dict[str, Any]) -> None:
+        """
+        Apply an event TailorTalk just created or changed, ahead of the next delta sync (which is idempotent).
+        """
+        with self._lock:
+            self._apply(event)
+            if self.sync_token is not None:
+                self._save()
+
+    def busy(self, start_time: str, end_time: str) -> List[Dict[str, str]]:
+        """
+        Merged busy slots overlapping [start_time, end_time], clipped to it, in the free/busy response format.
+        """
+        start = int(datetime.datetime.fromisoformat(start_time.replace("Z", "+00:00")).timestamp())
+        end = int(datetime.datetime.fromisoformat(end_time.replace("Z", "+00:00")).timestamp())
+        with self._lock:
+            if self._index is None:
+                self._index = sorted(self.events.values())
+                self._longest = max((e - s for s, e in self._index), default=0)
+            index, longest = self._index, self._longest
+        # Only events starting after (start - longest event) can overlap the window
+        i = bisect.bisect_left(index, (start - longest, start - longest))
+        merged: List[List[int]] = []
+        for s, e in index[i:bisect.bisect_left(index, (end, end))]:
+            if e <= start:
+                continue
+            s, e = max(s, start), min(e, end)
+            if merged and s <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], e)
+            else:
+                merged.append([s, e])
+        _count("queries")
+        return [{"start": _format(s), "end": _format(e)} for s, e in merged]
+
+
+def get_mirror(user: str, calendar_id: str = "primary") -> EventMirror:
+    with _mirrors_lock:
+        key = (user, calendar_id)
+        if key not in _mirrors:
+            _mirrors[key] = EventMirror(user, calendar_id)
+        return _mirrors[key]
+
+
+def mirrored_availability(user: str, calendar_id: str, start_time: str, end_time: str, service_factory) -> List[Dict[str, str]]:
+    """
+    Busy slots from the user's mirror, syncing deltas first unless it was synced within CALENDAR_SYNC_INTERVAL.
+    Args:
+        service_factory: Callable returning the Calendar service; only called when a sync is needed.
+    """
+    mirror = get_mirror(user, calendar_id)
+    if not mirror.is_fresh():
+        mirror.sync(service_factory())
+    return mirror.busy(start_time, end_time)
+
+
+def apply_event(user: str, calendar_id: str, event: Dict[str, Any]) -> None:
+    """
+    Write-through for bookings and updates; a no-op unless sync is enabled and the user's mirror is loaded.
+    """
+    if not CALENDAR_SYNC:
+        return
+    with _mirrors_lock:
+        mirror = _mirrors.get((user, calendar_id))
+    if mirror is not None:
+        mirror.apply_event(event)
+
+
+def get_sync_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["mirrors"] = len(_mirrors)
+    return stats
@@ -0,0 +1,408 @@
+"""
+Cassette
+--------
+This module records and replays the external traffic of a conversation, for reproducible performance
+regression runs:
+- Record mode captures every Groq, Google Calendar/People and MailerSend request and response (with its latency)
+  into a compact gzipped JSON-lines cassette
+- Replay mode serves the responses back without any network access, with the original latency or none
+- Requests are matched exactly (method, URL and canonical body); if the pipeline changed and an exact match is
+  missing, the next unused response for the same route (Groq model + system prompt, Google method + path,
+  MailerSend endpoint) is served instead, so a new version can be replayed against an old cassette
+- Groq traffic is intercepted by a transport adapter on the shared session, Google API calls by the
+  googleapiclient request builder, MailerSend sends by wrapping the SDK call
+- Combined with turn traces (TURN_TRACE_PATH, which include per-turn CPU time), `python cassette.py compare`
+  reports node call counts and CPU time between two runs
+
+Optionally: CASSETTE_MODE ('off' (default), 'record' or 'replay'), CASSETTE_PATH (default 'cassette.jsonl.gz'),
+CASSETTE_LATENCY ('original' (default) or 'zero'; replay only)
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import threading
+import urllib.parse
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassette.jsonl.gz")
+CASSETTE_LATENCY = os.getenv("CASSETTE_LATENCY", "original").lower()
+
+
+class CassetteMiss(requests.exceptions.RequestException):
+    """
+    Replay found no recorded response for a request.
+    """
+
+
+class ReplayedError(requests.exceptions.RequestException):
+    """
+    A request that failed while recording (connection error, timeout, ...) fails the same way on replay.
+    """
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(_canonical(value).encode("utf-8")).hexdigest()[:16]
+
+
+def _parse_body(body: Any) -> Any:
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+    try:
+        return json.loads(body)
+    except (TypeError, ValueError):
+        return body
+
+
+class Cassette:
+    """
+    One cassette file, in record or replay mode. Safe to use from node executor threads.
+    """
+
+    def __init__(self, path: str, mode: str, latency: str = "original"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._by_key: Dict[str, deque] = {}
+        self._by_route: Dict[str, deque] = {}
+        self._used = set()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        if mode == "replay":
+            self._load()
+
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def _load(self) -> None:
+        with self._open("r") as f:
+            for line in f:
+                if line.strip():
+                    self._entries.append(json.loads(line))
+        for index, entry in enumerate(self._entries):
+            self._by_key.setdefault(entry["key"], deque()).append(index)
+            self._by_route.setdefault(entry["route"], deque()).append(index)
+
+    def _count(self, service: str, event: str) -> None:
+        stats = self._stats.setdefault(service, {"recorded": 0, "replayed": 0, "route_matched": 0, "misses": 0})
+        stats[event] += 1
+
+    def record(self, service: str, route: Any, request: Dict[str, Any], response: Dict[str, Any], seconds: float) -> None:
+        """
+        Append one exchange to the cassette (written immediately, so a crashed session keeps its traffic).
+        """
+        entry = {
+            "service": service,
+            "key": _digest([service, request]),
+            "route": _digest([service, route]),
+            "ms": round(seconds * 1000, 1),
+            "request": request,
+            "response": response,
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str)
+        with self._lock:
+            with self._open("a") as f:
+                f.write(line + "\n")
+            self._count(service, "recorded")
+
+    def _take(self, queue: Optional[deque]) -> Optional[int]:
+        while queue:
+            index = queue.popleft()
+            if index not in self._used:
+                self._used.add(index)
+                return index
+        return None
+
+    def replay(self, service: str, route: Any, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return the recorded response for a request, sleeping for its recorded latency unless latency is 'zero'.
+        Raises:
+            CassetteMiss: If neither an exact nor a same-route recording is left.
+        """
+        key, route_key = _digest([service, request]), _digest([service, route])
+        with self._lock:
+            index = self._take(self._by_key.get(key))
+            if index is not None:
+                self._count(service, "replayed")
+            else:
+                index = self._take(self._by_route.get(route_key))
+                if index is None:
+                    self._count(service, "misses")
+                    raise CassetteMiss(f"No recorded {service} response for {_canonical(route)[:200]}")
+                self._count(service, "route_matched")
+            entry = self._entries[index]
+        if self.latency != "zero":
+            time.sleep(entry["ms"] / 1000)
+        return entry["response"]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {service: dict(counts) for service, counts in self._stats.items()}
+            unused = len(self._entries) - len(self._used)
+        result = {"mode": self.mode, "path": self.path, "services": stats}
+        if self.mode == "replay":
+            result["unused"] = unused
+        return result
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    The process-wide cassette configured by CASSETTE_MODE, or None when recording/replay is off.
+    """
+    global _cassette
+    if CASSETTE_MODE not in ("record", "replay"):
+        return None
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                _cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE, CASSETTE_LATENCY)
+    return _cassette
+
+
+def get_cassette_stats() -> Optional[Dict[str, Any]]:
+    cassette = get_cassette()
+    return cassette.stats() if cassette is not None else None
+
+
+def call(service: str, route: Any, request: Dict[str, Any], fn: Callable[[], Any]) -> Any:
+    """
+    Run an SDK call through the cassette (used for MailerSend). The result must be JSON-serializable;
+    tuples come back as lists on replay.
+    """
+    cassette = get_cassette()
+    if cassette is None:
+        return fn()
+    if cassette.mode == "replay":
+        response = cassette.replay(service, route, request)
+        if "error" in response:
+            raise ReplayedError(response["error"])
+        return response["result"]
+    start = time.perf_counter()
+    try:
+        result = fn()
+    except Exception as e:
+        cassette.record(service, route, request, {"error": f"{type(e).__name__}: {e}"}, time.perf_counter() - start)
+        raise
+    cassette.record(service, route, request, {"result": result}, time.perf_counter() - start)
+    return result
+
+
+# --- Groq (requests) ---
+
+def _groq_route(request: Dict[str, Any]) -> List[Any]:
+    body = request.get("body") if isinstance(request.get("body"), dict) else {}
+    system = next((m.get("content", "") for m in body.get("messages", []) if m.get("role") == "system"), "")
+    return [request["method"], request["url"], body.get("model"), _digest(system)]
+
+
+class CassetteAdapter(HTTPAdapter):
+    """
+    Transport adapter that records or replays every request sent through a requests.Session.
+    Recording reads streamed bodies completely, so they can be replayed; iter_lines() still works on them.
+    """
+
+    def __init__(self, service: str, inner: HTTPAdapter = None, **kwargs):
+        super().__init__(**kwargs)
+        self.service = service
+        self.inner = inner or HTTPAdapter()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        cassette = get_cassette()
+        if cassette is None:
+            return self.inner.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        # Keyed on the path only, so a cassette recorded against Groq replays against any GROQ_API_URL host
+        url = urllib.parse.urlsplit(request.url)
+        path = url.path + (f"?{url.query}" if url.query else "")
+        recorded_request = {"method": request.method, "url": path, "body": _parse_body(request.body)}
+        route = _groq_route(recorded_request)
+        if cassette.mode == "replay":
+            recorded = cassette.replay(self.service, route, recorded_request)
+            if "error" in recorded:
+                raise ReplayedError(recorded["error"], request=request)
+            return self._build_response(request, recorded)
+        start = time.perf_counter()
+        try:
+            response = self.inner.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+            content = response.content
+        except requests.exceptions.RequestException as e:
+            cassette.record(self.service, route, recorded_request, {"error": f"{type(e).__name__}: {e}"}, time.perf_counter() - start)
+            raise
+        cassette.record(self.service, route, recorded_request, {
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": dict(response.headers),
+            "body": content.decode("utf-8", "replace"),
+        }, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def _build_response(request, recorded: Dict[str, Any]) -> requests.Response:
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = recorded.get("reason")
+        response.headers = CaseInsensitiveDict(recorded.get("headers") or {})
+        response._content = recorded.get("body", "").encode("utf-8")
+        response._content_consumed = True
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        self.inner.close()
+        super().close()
+
+
+# --- Google APIs (googleapiclient) ---
+
+def google_request_builder():
+    """
+    The requestBuilder to pass to googleapiclient's build(): records/replays when a cassette is active.
+    """
+    from googleapiclient.http import HttpRequest
+    if get_cassette() is None:
+        return HttpRequest
+    return _cassette_http_request_class()
+
+
+_http_request_class = None
+
+
+def _cassette_http_request_class():
+    global _http_request_class
+    if _http_request_class is not None:
+        return _http_request_class
+    import httplib2
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import HttpRequest
+
+    class CassetteHttpRequest(HttpRequest):
+        def execute(self, http=None, num_retries=0):
+            cassette = get_cassette()
+            if cassette is None:
+                return super().execute(http=http, num_retries=num_retries)
+            recorded_request = {"method": self.method, "uri": self.uri, "body": _parse_body(self.body)}
+            route = [self.method, urllib.parse.urlsplit(self.uri).path]
+            if cassette.mode == "replay":
+                recorded = cassette.replay("google", route, recorded_request)
+                if "error" in recorded:
+                    raise ReplayedError(recorded["error"])
+                resp = httplib2.Response(dict(recorded.get("headers") or {}, status=str(recorded["status"])))
+                content = recorded.get("body", "").encode("utf-8")
+                if resp.status >= 300:
+                    raise HttpError(resp, content, uri=self.uri)
+                return self.postproc(resp, content)
+
+            captured: Dict[str, Any] = {}
+            postproc = self.postproc
+
+            def capture(resp, content):
+                captured.update(status=resp.status, headers=dict(resp), body=content)
+                return postproc(resp, content)
+
+            self.postproc = capture
+            start = time.perf_counter()
+            try:
+                return super().execute(http=http, num_retries=num_retries)
+            except HttpError as e:
+                captured.update(status=e.resp.status, headers=dict(e.resp), body=e.content)
+                raise
+            except Exception as e:
+                if not captured:
+                    captured["error"] = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                self.postproc = postproc
+                if captured:
+                    if isinstance(captured.get("body"), bytes):
+                        captured["body"] = captured["body"].decode("utf-8", "replace")
+                    if "headers" in captured:
+                        captured["headers"].pop("status", None)
+                    cassette.record("google", route, recorded_request, captured, time.perf_counter() - start)
+
+    _http_request_class = CassetteHttpRequest
+    return _http_request_class
+
+
+# --- Offline comparison ---
+
+def summarize_cassette(path: str) -> Dict[str, Any]:
+    """
+    Exchanges, recorded latency and cassette size per service.
+    """
+    services: Dict[str, Dict[str, Any]] = {}
+    for entry in Cassette(path, "replay")._entries:
+        stats = services.setdefault(entry["service"], {"exchanges": 0, "recorded_ms": 0.0})
+        stats["exchanges"] += 1
+        stats["recorded_ms"] = round(stats["recorded_ms"] + entry["ms"], 1)
+    return {"path": path, "bytes": os.path.getsize(path), "services": services}
+
+
+def summarize_traces(path: str) -> Dict[str, Any]:
+    """
+    Per-node call counts plus LLM calls, CPU and wall time per turn, from a TURN_TRACE_PATH file.
+    """
+    turns, node_calls = 0, {}
+    totals = {"llm_calls": 0, "cpu_ms": 0.0, "wall_ms": 0.0}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            trace = json.loads(line)
+            turns += 1
+            for record in trace["records"]:
+                key = f"{record['node']}:{record['cache']}"
+                node_calls[key] = node_calls.get(key, 0) + 1
+            for field in totals:
+                totals[field] += trace["totals"].get(field) or 0
+    per_turn = {f"{field}_per_turn": round(value / turns, 2) if turns else 0.0 for field, value in totals.items()}
+    return {"turns": turns, "node_calls": node_calls, **per_turn}
+
+
+def compare_traces(baseline_path: str, candidate_path: str) -> Dict[str, Any]:
+    """
+    Compare two runs of the same cassette (e.g. two versions of the app): node call counts and per-turn cost.
+    """
+    baseline, candidate = summarize_traces(baseline_path), summarize_traces(candidate_path)
+    nodes = sorted(set(baseline["node_calls"]) | set(candidate["node_calls"]))
+    return {
+        "turns": [baseline["turns"], candidate["turns"]],
+        "node_calls": {node: [baseline["node_calls"].get(node, 0), candidate["node_calls"].get(node, 0)] for node in nodes},
+        **{field: [baseline[field], candidate[field]] for field in ("llm_calls_per_turn", "cpu_ms_per_turn", "wall_ms_per_turn")},
+    }
+
+
+if __name__ == "__main__":
+    # python cassette.py summary cassette.jsonl.gz
+    # python cassette.py compare baseline_traces.jsonl candidate_traces.jsonl
+    if len(sys.argv) == 3 and sys.argv[1] == "summary":
+        print(json.dumps(summarize_cassette(sys.argv[2]), indent=2))
+    elif len(sys.argv) == 4 and sys.argv[1] == "compare":
+        print(json.dumps(compare_traces(sys.argv[2], sys.argv[3]), indent=2))
+    else:
+        print("Usage: python cassette.py summary <cassette> | compare <baseline_traces> <candidate_traces>")
+        sys.exit(2)
@@ -0,0 +1,217 @@
+"""
+Circuit Breaker
+---------------
+This module protects turns from a degraded LLM dependency:
+- A circuit breaker around Groq calls, driven by the rolling error rate and slow-call rate of recent calls
+- While open, calls fail immediately (no network) and nodes return degraded local results instead:
+  local intent rules, local detail extraction, rule-based routing, and templated messages
+- After a cool-down a single probe call is let through (half-open); success closes the circuit
+- An end-to-end deadline per turn: every Groq call's read timeout is capped by the time left in the turn,
+  and calls past the deadline fail immediately
+- Breaker state and counters are exposed for monitoring (get_breaker_states)
+
+Optionally: BREAKER_WINDOW_SECONDS (default 60), BREAKER_MIN_CALLS (5), BREAKER_ERROR_RATE (0.5),
+BREAKER_SLOW_CALL_SECONDS (8), BREAKER_SLOW_CALL_RATE (0.5), BREAKER_COOLDOWN_SECONDS (30),
+TURN_DEADLINE_SECONDS (default 25)
+"""
+
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from typing import Dict, Any, Optional
+
+import requests
+
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "8"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", "25"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_turn_deadline: contextvars.ContextVar = contextvars.ContextVar("turn_deadline", default=None)
+
+
+class LLMUnavailable(requests.exceptions.RequestException):
+    """
+    The LLM was not called: the circuit is open or the turn's deadline has passed.
+    Nodes catch this to return degraded local results.
+    """
+
+
+class CircuitOpenError(LLMUnavailable):
+    pass
+
+
+class DeadlineExceeded(LLMUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker (closed -> open -> half-open -> closed).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self.open_reason = ""
+        self._calls = deque()
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._counters = {"opened": 0, "rejected": 0, "successes": 0, "failures": 0}
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > BREAKER_WINDOW_SECONDS:
+            self._calls.popleft()
+
+    def _rates(self) -> Dict[str, float]:
+        calls = len(self._calls)
+        if not calls:
+            return {"calls": 0, "error_rate": 0.0, "slow_call_rate": 0.0}
+        return {
+            "calls": calls,
+            "error_rate": sum(1 for _, ok, _ in self._calls if not ok) / calls,
+            "slow_call_rate": sum(1 for _, _, seconds in self._calls if seconds >= BREAKER_SLOW_CALL_SECONDS) / calls,
+        }
+
+    def _open(self, now: float, reason: str) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.open_reason = reason
+        self._counters["opened"] += 1
+        print(f"[Breaker] {self.name} open: {reason}")
+
+    def is_open(self) -> bool:
+        """
+        True while calls would be rejected (open and still cooling down). Does not consume the half-open probe.
+        """
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < BREAKER_COOLDOWN_SECONDS
+
+    def allow(self) -> bool:
+        """
+        Decide whether a call may go out now; in half-open state only one probe call is allowed at a time.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= BREAKER_COOLDOWN_SECONDS:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def abandon(self) -> None:
+        """
+        An allowed call was never sent or was cut short locally; free the half-open probe without an outcome.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record(self, ok: bool, seconds: float) -> None:
+        """
+        Record the outcome of a call that was allowed through.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._counters["successes" if ok else "failures"] += 1
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok and seconds < BREAKER_SLOW_CALL_SECONDS:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    print(f"[Breaker] {self.name} closed")
+                else:
+                    self._open(now, "probe call failed" if not ok else "probe call slow")
+                return
+            self._calls.append((now, ok, seconds))
+            self._trim(now)
+            if self.state != CLOSED:
+                return
+            rates = self._rates()
+            if rates["calls"] < BREAKER_MIN_CALLS:
+                return
+            if rates["error_rate"] >= BREAKER_ERROR_RATE:
+                self._open(now, f"error rate {rates['error_rate']:.0%} over {rates['calls']} calls")
+            elif rates["slow_call_rate"] >= BREAKER_SLOW_CALL_RATE:
+                self._open(now, f"{rates['slow_call_rate']:.0%} of {rates['calls']} calls slower than {BREAKER_SLOW_CALL_SECONDS:g}s")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._trim(time.monotonic())
+            rates = self._rates()
+            snapshot = {
+                "state": self.state,
+                "open_reason": self.open_reason if self.state != CLOSED else "",
+                "window_calls": rates["calls"],
+                "error_rate": round(rates["error_rate"], 3),
+                "slow_call_rate": round(rates["slow_call_rate"], 3),
+            }
+            snapshot.update(self._counters)
+        return snapshot
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str = "groq") -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def get_breaker_states() -> Dict[str, Dict[str, Any]]:
+    """
+    Return state, rolling error/slow-call rates and counters for every breaker.
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+def start_turn_deadline(seconds: float = None) -> float:
+    """
+    Set the end-to-end deadline for the current turn (propagated to node executor threads).
+    Returns:
+        float: The deadline as a time.monotonic() value.
+    """
+    deadline = time.monotonic() + (TURN_DEADLINE_SECONDS if seconds is None else seconds)
+    _turn_deadline.set(deadline)
+    return deadline
+
+
+def clear_turn_deadline() -> None:
+    _turn_deadline.set(None)
+
+
+def time_remaining() -> Optional[float]:
+    """
+    Seconds left in the current turn, or None outside a turn.
+    """
+    deadline = _turn_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def llm_available(name: str = "groq") -> bool:
+    """
+    Cheap pre-check for nodes: False if the circuit is open or the turn's deadline has passed.
+    """
+    remaining = time_remaining()
+    return not get_breaker(name).is_open() and (remaining is None or remaining > 0)
@@ -6,6 +6,8 @@ This module uses Groq LLM to interpret user responses during the confirmation ph
 - Conditional agreements (e.g., "if John can join")
 - Implicit feedback (e.g., "that's a bit late for me")
 - Multi-step modifications (changing multiple aspects)
+The small model answers first; unparseable results escalate to the large model (model_policy.py).
+While the LLM is unavailable (circuit open or turn deadline passed), plain yes/no replies are interpreted locally.
 
 Requires: GROQ_API_KEY (set directly in the code)
 """
@@ -15,10 +17,47 @@ from typing import Dict, Any, List
 import re
 import os
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"  # Updated endpoint
+from model_policy import chat_completion_tiered, has_keys
+from json_stream import extract_json
+from history_manager import window_history
+from prompt_render import render_data, render_history
+from intent_rules import CONFIRM_PHRASES, CANCEL_PHRASES
+from circuit_breaker import LLMUnavailable, llm_available
+from turn_trace import traced
 
+# Static instructions: kept byte-identical across calls so the provider can reuse the cached prefix
+CONFIRMATION_SYSTEM_PROMPT = """You are a confirmation handler for a calendar booking agent. Analyze the user's response to the current booking proposal.
+- Identify if the user fully confirms, partially confirms, requests modifications, or expresses implicit feedback.
+- Handle conditional agreements and multi-step modifications.
+- Suggest the appropriate next action (book, suggest new options, ask for clarification, etc.).
+
+Respond ONLY with a valid JSON object with keys: confirmation_status, requested_modifications, implicit_feedback, next_action. Do not include any explanation, markdown, or text outside the JSON."""
+
+
+def interpret_confirmation_locally(user_response: str) -> Dict[str, Any]:
+    """
+    Degraded interpretation used while the LLM is unavailable: plain confirmations and refusals are
+    recognised, anything else asks the user for a yes/no answer.
+    Returns:
+        Dict[str, Any]: Same shape as handle_confirmation_response, with degraded=True.
+    """
+    text = " ".join(re.sub(r"[^\w\s']", "", (user_response or "").lower()).split())
+    if text in CONFIRM_PHRASES:
+        status, next_action = "confirmed", "book"
+    elif text in CANCEL_PHRASES:
+        status, next_action = "rejected", "suggest_new"
+    else:
+        status, next_action = "clarification_needed", "ask_clarification"
+    return {
+        "confirmation_status": status,
+        "requested_modifications": {},
+        "implicit_feedback": "",
+        "next_action": next_action,
+        "degraded": True
+    }
 
+
+@traced("confirmation")
 def handle_confirmation_response(user_response: str, booking_proposal: Dict[str, Any], conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
     """
     Interpret the user's confirmation response and determine next actions.
@@ -33,35 +72,19 @@ def handle_confirmation_response(user_response: str, booking_proposal: Dict[str,
             - implicit_feedback: notes on inferred preferences or concerns
             - next_action: 'book', 'suggest_new', 'ask_clarification', etc.
     """
-    prompt = f"""
-You are a confirmation handler for a calendar booking agent. Analyze the user's response to the current booking proposal.
-- Identify if the user fully confirms, partially confirms, requests modifications, or expresses implicit feedback.
-- Handle conditional agreements and multi-step modifications.
-- Suggest the appropriate next action (book, suggest new options, ask for clarification, etc.).
-
-Booking proposal: {booking_proposal}
-Conversation history: {conversation_history}
-User response: {user_response}
-
-Respond ONLY with a valid JSON object with keys: confirmation_status, requested_modifications, implicit_feedback, next_action. Do not include any explanation, markdown, or text outside the JSON.
-"""
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "llama-3.3-70b-versatile",  # Updated model name
-        "messages": [
-            {"role": "system", "content": "You are a confirmation handler for calendar booking."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 512,
-        "temperature": 0.2
-    }
+    if not llm_available():
+        return interpret_confirmation_locally(user_response)
+    conversation_history = window_history(conversation_history, "confirmation")
+    prompt = f"""Booking proposal: {render_data(booking_proposal)}
+Conversation history:
+{render_history(conversation_history)}
+User response: {user_response}"""
+    messages = [
+        {"role": "system", "content": CONFIRMATION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
+        result = chat_completion_tiered("confirmation", messages, max_tokens=512, temperature=0.2, accept=has_keys("confirmation_status"))
         import json as pyjson
         try:
             content = result["choices"][0]["message"]["content"]
@@ -69,13 +92,12 @@ Respond ONLY with a valid JSON object with keys: confirmation_status, requested_
             return parsed
         except Exception as e:
             # Try to extract JSON substring
-            match = re.search(r'\{.*\}', content, re.DOTALL)
-            if match:
-                try:
-                    parsed = pyjson.loads(match.group(0))
-                    return parsed
-                except Exception as e2:
-                    return {"error": f"Failed to parse extracted JSON: {str(e2)}", "raw_response": content}
+            parsed = extract_json(content)
+            if parsed is not None:
+                return parsed
             return {"error": f"Failed to parse LLM response: {str(e)}", "raw_response": content}
+    except LLMUnavailable as e:
+        print(f"[Confirmation] LLM unavailable, interpreting locally: {e}")
+        return interpret_confirmation_locally(user_response)
     except requests.exceptions.RequestException as e:
         return {"error": f"Groq API request failed: {str(e)}", "raw_response": getattr(e, 'response', None) and e.response.text} 
\ No newline at end of file
@@ -6,6 +6,8 @@ This module uses Groq LLM to naturally and sensitively collect email addresses f
 - Context-sensitive timing
 - Trust building (explaining why email is needed)
 - Error handling for invalid formats or reluctance
+The request is rendered from local templates (message_templates.py); LLM personalization is opt-in via
+LLM_POLISH=email, with the template as fallback.
 
 Requires: GROQ_API_KEY (set directly in the code)
 """
@@ -15,10 +17,22 @@ import requests
 from typing import List, Dict, Any
 import os
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"  # Updated endpoint
+from groq_client import chat_completion
+from prompt_render import render_data
+from message_templates import polish_enabled, render_email_request
+from turn_trace import traced
+
+# Static instructions: kept byte-identical across calls so the provider can reuse the cached prefix
+EMAIL_REQUEST_SYSTEM_PROMPT = """You are a conversational AI assistant. Craft a natural, trust-building prompt to request the user's email address.
+- Match the user's tone (given as Tone)
+- Explain why the email is needed (given as Context)
+- If the user has previously declined or provided an invalid email, address their concerns or gently prompt again.
+- Be sensitive to privacy and build trust.
+- Start from the draft message and personalize it
+Respond ONLY with a single prompt message in plain text. Do not include any explanation, markdown, or text outside the prompt."""
 
 
+@traced("email_request")
 def generate_email_request_prompt(context: str, communication_style: str = "neutral", previous_attempts: List[str] = None) -> str:
     """
     Generate a natural language prompt to request the user's email address, matching tone and context.
@@ -27,44 +41,32 @@ def generate_email_request_prompt(context: str, communication_style: str = "neut
         communication_style (str): Desired tone/style (e.g., 'formal', 'casual').
         previous_attempts (List[str]): Previous user responses to email requests, if any.
     Returns:
-        str: Natural language prompt for email collection.
+        str: Natural language prompt for email collection (the template rendering unless LLM polish is enabled and succeeds).
     """
     if previous_attempts is None:
         previous_attempts = []
-    prompt = f"""
-You are a conversational AI assistant. Craft a natural, trust-building prompt to request the user's email address.
-- Match the user's tone: {communication_style}
-- Explain why the email is needed: {context}
-- If the user has previously declined or provided an invalid email, address their concerns or gently prompt again.
-- Be sensitive to privacy and build trust.
-Previous attempts: {previous_attempts}
-Respond ONLY with a single prompt message in plain text. Do not include any explanation, markdown, or text outside the prompt.
-"""
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "llama-3.3-70b-versatile",  # Updated model name
-        "messages": [
-            {"role": "system", "content": "You are an email collection assistant for calendar booking."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 128,
-        "temperature": 0.6
-    }
+    draft = render_email_request(communication_style, previous_attempts)
+    if not polish_enabled("email"):
+        return draft
+    prompt = f"""Tone: {communication_style}
+Context: {context}
+Previous attempts: {render_data(previous_attempts)}
+Draft message: {draft}"""
+    messages = [
+        {"role": "system", "content": EMAIL_REQUEST_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
+        result = chat_completion("email", messages, max_tokens=128, temperature=0.6)
         content = result["choices"][0]["message"]["content"]
         # Remove markdown or extra explanation if present
         prompt_msg = content.strip()
         if prompt_msg.startswith("```"):
             prompt_msg = re.sub(r"^```[a-zA-Z]*\\n|```$", "", prompt_msg, flags=re.MULTILINE).strip()
-        return prompt_msg
+        return prompt_msg or draft
     except Exception as e:
-        return f"Groq API request failed or invalid prompt: {str(e)}"
+        print(f"[Email] LLM polish failed, using template: {e}")
+        return draft
 
 
 def validate_email_format(email: str) -> bool:
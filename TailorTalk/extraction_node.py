@@ -6,6 +6,9 @@ This module uses Groq LLM to extract structured information from user input and
 - Ambiguity resolution (context-dependent meanings)
 - Incomplete information detection (what's missing)
 - Multi-turn assembly (combining details from conversation turns)
+Plain date/time/duration expressions are resolved locally by temporal_parser.py; the LLM is only used for
+expressions the parser cannot resolve (e.g. "after the holiday", "before my lunch meeting").
+While the LLM is unavailable (circuit open or turn deadline passed), the parser's best-effort result is returned.
 
 Requires: GROQ_API_KEY (set directly in the code)
 """
@@ -14,62 +17,70 @@ import requests
 from typing import Dict, Any, List
 import re
 import os
+import time
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"  # Updated endpoint
+from groq_client import chat_completion
+from json_stream import extract_json
+from history_manager import window_history
+from prompt_render import render_history
+from turn_trace import record_call, traced
+from temporal_parser import resolve_details_locally
+from circuit_breaker import LLMUnavailable, llm_available
+from node_executor import submit
+from concurrent.futures import Future
 
+# Static instructions: kept byte-identical across calls so the provider can reuse the cached prefix
+EXTRACTION_SYSTEM_PROMPT = """You are an expert assistant for a calendar booking agent. Analyze the conversation history and the latest user message.
+Extract the following as a JSON object:
+- date (absolute, e.g., 2024-06-10)
+- time (24h format, e.g., 15:00)
+- duration (in minutes)
+- participants (list of names or emails, if any)
+- location (if mentioned)
+- missing_info (list of required details not provided)
+- ambiguity_notes (list of ambiguities or context-dependent meanings)
+- context_assembly (summary of how details were gathered across turns)
 
-def extract_details(user_input: str, conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
+Handle complex temporal expressions (e.g., "next Friday after the holiday", "before my lunch meeting").
+Infer missing information if possible, and note any assumptions.
+
+Respond ONLY with a valid JSON object with the keys above. Do not include any explanation, markdown, or text outside the JSON."""
+
+
+@traced("extraction")
+def extract_details(user_input: str, conversation_history: List[Dict[str, str]], timezone: str = None) -> Dict[str, Any]:
     """
     Extract structured details (date, time, duration, participants, etc.) from user input and conversation history.
     Args:
         user_input (str): The latest message from the user.
         conversation_history (List[Dict[str, str]]): List of previous messages (role: 'user'/'assistant', content: str).
+        timezone (str): IANA timezone of the user, used to resolve relative dates locally (defaults to DEFAULT_TIMEZONE).
     Returns:
         Dict[str, Any]: Structured result with extracted details, missing info, and ambiguity notes.
     """
-    prompt = f"""
-    You are an expert assistant for a calendar booking agent. Analyze the following conversation and the latest user message.
-    Extract the following as a JSON object:
-    - date (absolute, e.g., 2024-06-10)
-    - time (24h format, e.g., 15:00)
-    - duration (in minutes)
-    - participants (list of names or emails, if any)
-    - location (if mentioned)
-    - missing_info (list of required details not provided)
-    - ambiguity_notes (list of ambiguities or context-dependent meanings)
-    - context_assembly (summary of how details were gathered across turns)
-    
-    Handle complex temporal expressions (e.g., "next Friday after the holiday", "before my lunch meeting").
-    Infer missing information if possible, and note any assumptions.
-    
-    Conversation history:
-    {conversation_history}
-    
-    Latest user message:
-    {user_input}
-    
-    Respond ONLY with a valid JSON object with the keys above. Do not include any explanation, markdown, or text outside the JSON.
-    """
+    start = time.perf_counter()
+    local_result = resolve_details_locally(user_input, conversation_history, timezone=timezone)
+    if local_result is not None:
+        record_call("extraction", "local", len(user_input), 0, 0, (time.perf_counter() - start) * 1000, "local")
+        return local_result
+    if not llm_available():
+        record_call("extraction", "local", len(user_input), 0, 0, (time.perf_counter() - start) * 1000, "degraded")
+        return resolve_details_locally(user_input, conversation_history, timezone=timezone, best_effort=True)
 
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "llama-3.3-70b-versatile",  # Updated model name
-        "messages": [
-            {"role": "system", "content": "You are a detail extraction assistant for calendar booking."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 512,
-        "temperature": 0.2
-    }
+    conversation_history = window_history(conversation_history, "extraction")
+    prompt = f"""Conversation history:
+{render_history(conversation_history)}
+
+Latest user message:
+{user_input}"""
+
+    messages = [
+        {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
 
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
+        result = chat_completion("extraction", messages, max_tokens=512, temperature=0.2)
         import json as pyjson
         try:
             content = result["choices"][0]["message"]["content"]
@@ -77,13 +88,25 @@ def extract_details(user_input: str, conversation_history: List[Dict[str, str]])
             return parsed
         except Exception as e:
             # Try to extract JSON substring
-            match = re.search(r'\{.*\}', content, re.DOTALL)
-            if match:
-                try:
-                    parsed = pyjson.loads(match.group(0))
-                    return parsed
-                except Exception as e2:
-                    return {"error": f"Failed to parse extracted JSON: {str(e2)}", "raw_response": content}
+            parsed = extract_json(content)
+            if parsed is not None:
+                return parsed
             return {"error": f"Failed to parse LLM response: {str(e)}", "raw_response": content}
+    except LLMUnavailable as e:
+        print(f"[Extraction] LLM unavailable, using local parser: {e}")
+        return resolve_details_locally(user_input, conversation_history, timezone=timezone, best_effort=True)
     except requests.exceptions.RequestException as e:
-        return {"error": f"Groq API request failed: {str(e)}", "raw_response": getattr(e, 'response', None) and e.response.text} 
\ No newline at end of file
+        return {"error": f"Groq API request failed: {str(e)}", "raw_response": getattr(e, 'response', None) and e.response.text}
+
+
+def extract_details_async(user_input: str, conversation_history: List[Dict[str, str]], timezone: str = None) -> Future:
+    """
+    Run extract_details on the shared node executor so it can overlap with other nodes in the same turn.
+    Args:
+        user_input (str): The latest message from the user.
+        conversation_history (List[Dict[str, str]]): List of previous messages (a snapshot is taken before scheduling).
+        timezone (str): IANA timezone of the user.
+    Returns:
+        Future: Resolves to the same dict returned by extract_details.
+    """
+    return submit(extract_details, user_input, list(conversation_history), timezone)
\ No newline at end of file
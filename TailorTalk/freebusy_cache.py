@@ -0,0 +1,207 @@
+"""
+FreeBusy Cache
+--------------
+This module caches Google Calendar free/busy results between turns:
+- Keyed by (user, calendar) with one entry per fetched window; entries expire after a short TTL
+- Interval-aware reuse: any window inside a cached, unexpired window is answered from it (busy slots clipped)
+- Fetches are padded past the requested end so the next turn's sliding "now + N days" window still fits
+- Write-through: events created or moved by TailorTalk update the cached busy intervals instead of
+  forcing a refetch; a change that cannot be applied exactly drops the affected windows
+- Hit, miss, write-through and invalidation counts are kept for the turn trace
+
+Optionally: FREEBUSY_CACHE_TTL (seconds, default 120, 0 disables), FREEBUSY_CACHE_SIZE (windows, default 256),
+FREEBUSY_FETCH_PAD_MINUTES (default 60)
+"""
+
+import os
+import time
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import pytz
+
+FREEBUSY_CACHE_TTL = float(os.getenv("FREEBUSY_CACHE_TTL", "120"))
+FREEBUSY_CACHE_SIZE = int(os.getenv("FREEBUSY_CACHE_SIZE", "256"))
+FREEBUSY_FETCH_PAD_MINUTES = int(os.getenv("FREEBUSY_FETCH_PAD_MINUTES", "60"))
+
+Interval = Tuple[datetime.datetime, datetime.datetime]
+
+_lock = threading.Lock()
+# (user, calendar, window start, window end) -> (fetched_at, sorted busy intervals)
+_windows: "OrderedDict[Tuple[str, str, datetime.datetime, datetime.datetime], tuple]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "writes": 0, "invalidations": 0}
+
+
+def parse_time(value: str, timezone: str = None) -> datetime.datetime:
+    """
+    Parse an RFC 3339 / ISO 8601 time to an aware UTC datetime; naive values are read in `timezone` (default UTC).
+    """
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = pytz.timezone(timezone or "UTC").localize(parsed)
+    return parsed.astimezone(pytz.UTC)
+
+
+def format_time(value: datetime.datetime) -> str:
+    return value.astimezone(pytz.UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def enabled() -> bool:
+    return FREEBUSY_CACHE_TTL > 0
+
+
+def fetch_window(start: str, end: str) -> Tuple[str, str]:
+    """
+    The window to actually query on a miss: the requested one, padded at the end for the next turn's reuse.
+    """
+    if not enabled():
+        return start, end
+    return start, format_time(parse_time(end) + datetime.timedelta(minutes=FREEBUSY_FETCH_PAD_MINUTES))
+
+
+def _count(key: str, amount: int = 1) -> None:
+    _stats[key] += amount
+
+
+def _merge(intervals: List[Interval]) -> List[Interval]:
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _clip(busy: List[Interval], start: datetime.datetime, end: datetime.datetime) -> List[Dict[str, str]]:
+    return [{"start": format_time(max(s, start)), "end": format_time(min(e, end))} for s, e in busy if s < end and e > start]
+
+
+def clip(busy: List[Dict[str, str]], start: str, end: str) -> List[Dict[str, str]]:
+    """
+    Restrict busy slots (e.g. from a padded fetch) to the window [start, end].
+    """
+    return _clip([(parse_time(b["start"]), parse_time(b["end"])) for b in busy], parse_time(start), parse_time(end))
+
+
+def _expire(now: float) -> None:
+    for key in [k for k, (fetched_at, _) in _windows.items() if now - fetched_at > FREEBUSY_CACHE_TTL]:
+        del _windows[key]
+
+
+def lookup(user: str, calendar: str, start: str, end: str) -> Optional[List[Dict[str, str]]]:
+    """
+    Return cached busy slots for [start, end] if an unexpired cached window covers it, else None.
+    """
+    if not enabled():
+        return None
+    start_dt, end_dt = parse_time(start), parse_time(end)
+    with _lock:
+        _expire(time.monotonic())
+        for key, (_, busy) in _windows.items():
+            if key[0] == user and key[1] == calendar and key[2] <= start_dt and key[3] >= end_dt:
+                _windows.move_to_end(key)
+                _count("hits")
+                return _clip(busy, start_dt, end_dt)
+        _count("misses")
+    return None
+
+
+def store(user: str, calendar: str, start: str, end: str, busy: List[Dict[str, str]]) -> None:
+    """
+    Cache the busy slots Google returned for the queried window [start, end].
+    """
+    if not enabled():
+        return
+    key = (user, calendar, parse_time(start), parse_time(end))
+    intervals = _merge([(parse_time(b["start"]), parse_time(b["end"])) for b in busy])
+    with _lock:
+        # A wider window supersedes the ones it contains
+        for other in [k for k in _windows if k[:2] == key[:2] and key[2] <= k[2] and k[3] <= key[3]]:
+            del _windows[other]
+        _windows[key] = (time.monotonic(), intervals)
+        while len(_windows) > FREEBUSY_CACHE_SIZE:
+            _windows.popitem(last=False)
+
+
+def add_busy(user: str, calendar: str, start: datetime.datetime, end: datetime.datetime) -> None:
+    """
+    Write-through for a created (or moved-to) event: mark [start, end] busy in every cached window it overlaps.
+    """
+    with _lock:
+        for key, (fetched_at, busy) in list(_windows.items()):
+            if key[:2] == (user, calendar) and start < key[3] and end > key[2]:
+                _windows[key] = (fetched_at, _merge(busy + [(max(start, key[2]), min(end, key[3]))]))
+                _count("writes")
+
+
+def remove_busy(user: str, calendar: str, start: datetime.datetime, end: datetime.datetime) -> None:
+    """
+    Write-through for a moved-from (or deleted) event. Free/busy merges overlapping events, so the interval is
+    only removed when it is exactly one cached busy block; otherwise the overlapping windows are dropped.
+    """
+    with _lock:
+        for key, (fetched_at, busy) in list(_windows.items()):
+            if key[:2] != (user, calendar) or not (start < key[3] and end > key[2]):
+                continue
+            clipped = (max(start, key[2]), min(end, key[3]))
+            if clipped in busy:
+                _windows[key] = (fetched_at, [b for b in busy if b != clipped])
+                _count("writes")
+            else:
+                del _windows[key]
+                _count("invalidations")
+
+
+def invalidate(user: str = None) -> None:
+    """
+    Drop cached windows for one user, or all of them.
+    """
+    with _lock:
+        for key in [k for k in _windows if user is None or k[0] == user]:
+            del _windows[key]
+            _count("invalidations")
+
+
+def event_interval(event: Dict[str, Any]) -> Optional[Interval]:
+    """
+    The busy interval a timed event resource occupies, or None if it does not block time (transparent or cancelled).
+    """
+    if event.get("transparency") == "transparent" or event.get("status") == "cancelled":
+        return None
+    start, end = event["start"], event["end"]
+    return parse_time(start["dateTime"], start.get("timeZone")), parse_time(end["dateTime"], end.get("timeZone"))
+
+
+def apply_event_change(user: str, calendar: str, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+    """
+    Write an event change through to the cache: `before` is the event as it was (None if created),
+    `after` as it is now (None if deleted). All-day events are not tracked and drop the user's windows instead.
+    """
+    events = [event for event in (before, after) if event]
+    if any("dateTime" not in (event.get("start") or {}) or "dateTime" not in (event.get("end") or {}) for event in events):
+        invalidate(user)
+        return
+    try:
+        old = event_interval(before) if before else None
+        new = event_interval(after) if after else None
+    except (KeyError, ValueError, pytz.UnknownTimeZoneError):
+        invalidate(user)
+        return
+    if old == new:
+        return
+    if old:
+        remove_busy(user, calendar, *old)
+    if new:
+        add_busy(user, calendar, *new)
+
+
+def get_freebusy_cache_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+        stats["windows"] = len(_windows)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    return stats
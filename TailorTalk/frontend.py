@@ -3,17 +3,27 @@ from typing import List, Dict, Any
 import json
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
 
-from intent_node import analyze_intent
-from extraction_node import extract_details
+from intent_node import analyze_intent_async
+from extraction_node import extract_details_async
 from router_node import route_conversation
-from suggestion_node import generate_suggestion_message
-from calendar_node import get_calendar_availability, suggest_optimal_slots
+from turn_analyzer_node import analyze_turn, TURN_ANALYZER_MODE
+from suggestion_node import stream_suggestion_message
+from calendar_node import get_calendar_availability, get_group_availability, localize_slots, suggest_optimal_slots
+from availability_engine import find_common_slots
 from confirmation_node import handle_confirmation_response
 from email_node import validate_email_format
-from booking_node import book_calendar_event, generate_booking_message
+from booking_node import book_calendar_event, stream_booking_message
 from notification_node import generate_notification_email, send_email
+from turn_trace import start_turn_trace, finish_turn_trace, span
+from intent_rules import classify_intent_locally
+from availability_prefetch import looks_like_booking, start_availability_prefetch, fetch_availability, get_prefetch_stats
+from circuit_breaker import start_turn_deadline, clear_turn_deadline, get_breaker_states
+from cassette import google_request_builder, get_cassette_stats
+from google_services import session_credentials, refreshed_credentials_info, get_service_cache_stats, get_service
+from temporal_parser import DEFAULT_TIMEZONE, apply_user_timezone
+from freebusy_cache import get_freebusy_cache_stats
+from calendar_sync import CALENDAR_SYNC, get_sync_stats
 
 st.set_page_config(page_title="TailorTalk - Calendar Booking AI", page_icon="📅", layout="centered")
 
@@ -54,7 +64,8 @@ def credentials_to_dict(credentials):
 
 def get_credentials_from_session():
     if "google_credentials" in st.session_state:
-        return Credentials(**st.session_state["google_credentials"])
+        # Same object across reruns, so cached Calendar services (google_services.py) are reused
+        return session_credentials(st.session_state["google_credentials"])
     return None
 
 # --- Google OAuth2 Login ---
@@ -79,7 +90,7 @@ if "google_credentials" not in st.session_state:
 if "user_email" not in st.session_state or "user_name" not in st.session_state:
     credentials = get_credentials_from_session()
     try:
-        people_service = build('people', 'v1', credentials=credentials)
+        people_service = build('people', 'v1', credentials=credentials, requestBuilder=google_request_builder())
         profile = people_service.people().get(resourceName='people/me', personFields='names,emailAddresses').execute()
         email = None
         name = None
@@ -97,6 +108,17 @@ if "user_email" not in st.session_state or "user_name" not in st.session_state:
         st.error(f"Failed to retrieve your Google profile: {e}")
         st.stop()
 
+# --- User Timezone (from the Google Calendar settings) ---
+# Relative dates ("tomorrow at 3pm") are resolved and booked in this timezone
+if "user_timezone" not in st.session_state:
+    try:
+        calendar_service = get_service('calendar', 'v3', get_credentials_from_session())
+        st.session_state["user_timezone"] = calendar_service.settings().get(setting='timezone').execute()['value']
+    except Exception as e:
+        print(f"[Frontend] Could not read the calendar timezone, using {DEFAULT_TIMEZONE}: {e}")
+        st.session_state["user_timezone"] = DEFAULT_TIMEZONE
+st.sidebar.caption(f"Timezone: {st.session_state['user_timezone']}")
+
 # --- Chat State Initialization ---
 if "history" not in st.session_state:
     st.session_state.history = []
@@ -120,162 +142,262 @@ def append_and_display(role, content):
     st.session_state.history.append({"role": role, "content": content})
     st.chat_message(role).write(content)
 
+def stream_and_display(role, fragments, span_name="stream"):
+    """
+    Render a message progressively as fragments arrive, then store the final text in history.
+    The generator only runs while it is consumed here, so the node's span is opened around the stream.
+    """
+    with span(span_name):
+        content = st.chat_message(role).write_stream(fragments)
+    if not isinstance(content, str):
+        content = "".join(str(part) for part in content)
+    content = content.strip()
+    st.session_state.history.append({"role": role, "content": content})
+    return content
+
+def render_turn_trace(trace):
+    """
+    Show per-node token, latency and cache accounting for the turn in a collapsible sidebar panel.
+    """
+    totals = trace.totals()
+    label = f"Turn trace: {totals['llm_calls']} LLM calls, {totals['prompt_tokens']}+{totals['completion_tokens']} tokens, {totals['wall_ms']:.0f} ms"
+    with st.sidebar.expander(label):
+        if trace.records:
+            st.table(trace.records)
+        st.json(totals)
+        if trace.outputs:
+            st.json(trace.outputs, expanded=False)
+    render_waterfall(trace)
+
+def render_waterfall(trace):
+    """
+    Draw the turn's spans as a waterfall (one bar per node / external call, offset from the turn start).
+    """
+    rows = trace.waterfall()
+    if not rows:
+        return
+    import altair as alt
+    import pandas as pd
+    df = pd.DataFrame([{k: v for k, v in row.items() if k != "attributes"} for row in rows])
+    df["attributes"] = [json.dumps(row["attributes"], ensure_ascii=False, default=str) for row in rows]
+    df["order"] = range(len(df))
+    chart = alt.Chart(df).mark_bar().encode(
+        x=alt.X("start_ms:Q", title="ms since turn start"),
+        x2="end_ms:Q",
+        y=alt.Y("span:N", sort=alt.EncodingSortField(field="order"), title=None),
+        color=alt.Color("status:N", scale=alt.Scale(domain=["ok", "error"], range=["#4c78a8", "#e45756"])),
+        tooltip=["span", "duration_ms", "status", "attributes"]
+    ).properties(height=22 * len(df) + 40)
+    with st.sidebar.expander(f"Turn waterfall ({len(df)} spans, trace {trace.trace_id[:8]})"):
+        st.altair_chart(chart, use_container_width=True)
+
+def render_breaker_state():
+    """
+    Show LLM circuit breaker state in the sidebar, with a warning while replies are degraded.
+    """
+    states = get_breaker_states()
+    for name, state in states.items():
+        if state["state"] != "closed":
+            st.sidebar.warning(f"{name} is degraded ({state['state']}: {state['open_reason']}); replies use local rules and templates.")
+    if states:
+        with st.sidebar.expander("LLM circuit breaker"):
+            st.json(states)
+
 # --- Main Chat Workflow ---
 if user_input:
-    append_and_display("user", user_input)
-    # 1. Intent Recognition
-    intent_result = analyze_intent(user_input, st.session_state.history)
-    st.write("[DEBUG] Intent Node Output:", intent_result)
-    print("[DEBUG] Intent Node Output:")
-    print(json.dumps(intent_result, indent=2, ensure_ascii=False))
-    if "error" in intent_result:
-        append_and_display("assistant", f"[Intent Error] {intent_result['error']}")
-        st.stop()
-    st.session_state.user_intent = intent_result.get("intent", "unknown")
-    # 2. Detail Extraction
-    details_result = extract_details(user_input, st.session_state.history)
-    st.write("[DEBUG] Extraction Node Output:", details_result)
-    print("[DEBUG] Extraction Node Output:")
-    print(json.dumps(details_result, indent=2, ensure_ascii=False))
-    if "error" in details_result:
-        append_and_display("assistant", f"[Extraction Error] {details_result['error']}")
-        st.stop()
-    # Always use the Google-authenticated user email and name
-    details_result["participants"] = [st.session_state.user_email]
-    details_result["user_name"] = st.session_state.user_name
-    st.session_state.extracted_details = details_result
-    # 3. Router Node
-    router_result = route_conversation(
-        st.session_state.conversation_state,
-        st.session_state.user_intent,
-        st.session_state.extracted_details,
-        st.session_state.history
-    )
-    st.write("[DEBUG] Router Node Output:", router_result)
-    print("[DEBUG] Router Node Output:")
-    print(json.dumps(router_result, indent=2, ensure_ascii=False))
-    if "reason" in router_result:
-        print(f"[Router] {router_result['reason']}")
-    next_node = router_result.get("next_node", "end")
-    # 4. Node Handling (robust logic)
-    credentials = get_credentials_from_session()
-    if next_node == "suggestion":
-        import datetime
-        now = datetime.datetime.utcnow()
-        week_later = now + datetime.timedelta(days=7)
-        busy = get_calendar_availability(
-            st.session_state.user_email,
-            now.isoformat() + "Z",
-            week_later.isoformat() + "Z",
-            credentials=credentials
-        )
-        from calendar_node import find_free_slots
-        free_slots = find_free_slots(busy, now.isoformat() + "Z", week_later.isoformat() + "Z")
-        suggestion = generate_suggestion_message(
-            free_slots,
-            user_preferences={"communication_style": intent_result.get("style", "neutral")},
-            communication_style=intent_result.get("style", "neutral"),
-            context="calendar booking"
-        )
-        if suggestion.startswith("Groq API request failed"):
-            append_and_display("assistant", f"[Suggestion Error] {suggestion}")
-            st.stop()
-        append_and_display("assistant", suggestion)
-    elif next_node == "confirmation":
-        details = st.session_state.extracted_details
-        summary_lines = []
-        if details.get("date"): summary_lines.append(f"**Date:** {details['date']}")
-        if details.get("time"): summary_lines.append(f"**Time:** {details['time']}")
-        if details.get("duration"): summary_lines.append(f"**Duration:** {details['duration']} minutes")
-        if details.get("participants"): summary_lines.append(f"**Participants:** {', '.join(details['participants'])}")
-        if details.get("location"): summary_lines.append(f"**Location:** {details['location']}")
-        if summary_lines:
-            summary_msg = "Here are the details for your booking:\n" + "\n".join(summary_lines)
-            append_and_display("assistant", summary_msg)
-        confirmation_prompt = "Do you confirm the booking details? (yes/no)"
-        append_and_display("assistant", confirmation_prompt)
-    elif next_node == "booking":
-        last_user_message = st.session_state.history[-1]["content"].strip().lower() if st.session_state.history else ""
-        if last_user_message in ["no", "cancel", "not now"]:
-            append_and_display("assistant", "Okay, the booking has been cancelled. If you want to start over or change any details, just let me know!")
-            st.stop()
-        elif last_user_message not in ["yes", "confirm", "i confirm", "confirmed"]:
-            append_and_display("assistant", "Please type 'yes' to confirm your booking or 'no' to cancel.")
-            st.stop()
-        booking_result = book_calendar_event(st.session_state.extracted_details, credentials=credentials)
-        if isinstance(booking_result, dict) and "error" in booking_result and booking_result["error"]:
-            append_and_display("assistant", f"[Booking Error] {booking_result['error']}")
-            st.stop()
-        booking_msg = generate_booking_message(
-            success=booking_result["success"],
-            event_details=st.session_state.extracted_details,
-            error=booking_result["error"],
-            communication_style=intent_result.get("style", "neutral")
-        )
-        if booking_msg.startswith("Groq API request failed"):
-            append_and_display("assistant", f"[Booking Message Error] {booking_msg}")
+    trace = start_turn_trace(history_length=len(st.session_state.history))
+    # Bound the whole turn; executor threads inherit the deadline with the trace context
+    start_turn_deadline()
+    prefetch = None
+    try:
+        append_and_display("user", user_input)
+        credentials = get_credentials_from_session()
+        # Speculatively fetch free/busy while the LLM nodes run; discarded unless the route is 'suggestion'
+        if looks_like_booking(classify_intent_locally(user_input, st.session_state.history)):
+            prefetch = start_availability_prefetch(st.session_state.user_email, credentials)
+        fused = TURN_ANALYZER_MODE == "fused"
+        if fused:
+            # 1-3. Intent, Details and Routing from a single LLM call
+            turn_result = analyze_turn(user_input, st.session_state.conversation_state, st.session_state.history)
+            intent_result = turn_result["intent"]
+            details_result = turn_result["details"]
+            router_result = turn_result["routing"]
+        else:
+            # 1-2. Intent Recognition and Detail Extraction (independent, run concurrently)
+            intent_future = analyze_intent_async(user_input, st.session_state.history)
+            details_future = extract_details_async(user_input, st.session_state.history, st.session_state.get("user_timezone"))
+            intent_result = intent_future.result()
+        trace.set_output("intent", intent_result)
+        if "error" in intent_result:
+            append_and_display("assistant", f"[Intent Error] {intent_result['error']}")
             st.stop()
-        append_and_display("assistant", booking_msg)
-        notif = generate_notification_email(
-            event_details=st.session_state.extracted_details,
-            notification_type="confirmation",
-            communication_style=intent_result.get("style", "neutral"),
-            user_name=st.session_state.user_name
-        )
-        if isinstance(notif, dict) and "body" in notif and notif["body"].startswith("Groq API request failed"):
-            append_and_display("assistant", f"[Notification Error] {notif['body']}")
+        st.session_state.user_intent = intent_result.get("intent", "unknown")
+        if prefetch is None and looks_like_booking(intent_result):
+            prefetch = start_availability_prefetch(st.session_state.user_email, credentials)
+        if not fused:
+            details_result = details_future.result()
+        trace.set_output("extraction", details_result)
+        if "error" in details_result:
+            append_and_display("assistant", f"[Extraction Error] {details_result['error']}")
             st.stop()
-        email_result = send_email(
-            to_email=st.session_state.user_email,
-            subject=notif["subject"],
-            body=notif["body"],
-            recipient_name=st.session_state.user_name
-        )
-        st.sidebar.write(f"[Frontend] Email send result: {email_result}")
-        if email_result[0]:
-            notif_msg = f"A confirmation email has been sent: {notif['subject']}"
-        else:
-            notif_msg = f"[Email Error] Failed to send confirmation email. Reason: {email_result[3]}"
-        append_and_display("assistant", notif_msg)
-    elif next_node == "end":
-        end_msg = "Thank you for using TailorTalk! If you need anything else, just ask."
-        append_and_display("assistant", end_msg)
-    else:
-        # Custom handling for missing required fields
-        router_reason = router_result.get("reason", "").lower()
-        missing_info = st.session_state.extracted_details.get("missing_info", [])
-        missing_prompts = []
-        if missing_info:
-            for field in missing_info:
-                if field == "time":
-                    missing_prompts.append("the time for your meeting")
-                elif field == "date":
-                    missing_prompts.append("the date for your meeting")
-                elif field == "participants":
-                    missing_prompts.append("the participants or who should be invited")
-                elif field == "location":
-                    missing_prompts.append("the location for your meeting")
-                else:
-                    missing_prompts.append(field)
-        # Also check router reason for missing fields
-        for field in ["time", "date", "participants", "location"]:
-            if f"{field} is a required field" in router_reason and field not in missing_info:
-                if field == "time":
-                    missing_prompts.append("the time for your meeting")
-                elif field == "date":
-                    missing_prompts.append("the date for your meeting")
-                elif field == "participants":
-                    missing_prompts.append("the participants or who should be invited")
-                elif field == "location":
-                    missing_prompts.append("the location for your meeting")
-                else:
-                    missing_prompts.append(field)
-        if missing_prompts:
-            ask_msg = "Could you please specify " + ", ".join(missing_prompts) + "?"
-            append_and_display("assistant", ask_msg)
+        # Always use the Google-authenticated user email and name; invitees named by email are kept after it
+        participants = details_result.get("participants") or []
+        if isinstance(participants, str):
+            # The LLM sometimes returns a single participant as a plain string
+            participants = [participants]
+        guests = [p for p in participants if isinstance(p, str) and "@" in p and p != st.session_state.user_email]
+        details_result["participants"] = [st.session_state.user_email] + guests
+        details_result["user_name"] = st.session_state.user_name
+        # Only the local parser sets the timezone; LLM-extracted dates are meant in the user's timezone too
+        apply_user_timezone(details_result, st.session_state.user_timezone)
+        st.session_state.extracted_details = details_result
+        # 3. Router Node
+        if not fused:
+            router_result = route_conversation(
+                st.session_state.conversation_state,
+                st.session_state.user_intent,
+                st.session_state.extracted_details,
+                st.session_state.history
+            )
+        trace.set_output("router", router_result)
+        if "reason" in router_result:
+            print(f"[Router] {router_result['reason']}")
+        next_node = router_result.get("next_node", "end")
+        # 4. Node Handling (robust logic)
+        if next_node == "suggestion":
+            busy, window_start, window_end = fetch_availability(prefetch, st.session_state.user_email, credentials=credentials)
+            guests = st.session_state.extracted_details.get("participants", [])[1:]
+            if guests:
+                # Suggest only times the invitees are free too; calendars they have not shared are skipped
+                guest_busy = get_group_availability(guests, window_start, window_end, credentials=credentials)
+                busy_by_attendee = {st.session_state.user_email: busy}
+                busy_by_attendee.update({guest: slots for guest, slots in guest_busy.items() if slots is not None})
+                windows = find_common_slots(busy_by_attendee, window_start, window_end, required=[st.session_state.user_email])
+                free_slots = [{"start": window["start"], "end": window["end"]} for window in windows]
+            else:
+                from calendar_node import find_free_slots
+                free_slots = find_free_slots(busy, window_start, window_end)
+            # Shown in the timezone the user's pick ("the 3pm one") will be parsed and booked in
+            free_slots = localize_slots(free_slots, st.session_state.user_timezone)
+            suggestion_stream = stream_suggestion_message(
+                free_slots,
+                user_preferences={"communication_style": intent_result.get("style", "neutral")},
+                communication_style=intent_result.get("style", "neutral"),
+                context="calendar booking"
+            )
+            # Falls back to the template message if the LLM call fails
+            stream_and_display("assistant", suggestion_stream, span_name="suggestion")
+        elif next_node == "confirmation":
+            details = st.session_state.extracted_details
+            summary_lines = []
+            if details.get("date"): summary_lines.append(f"**Date:** {details['date']}")
+            if details.get("time"): summary_lines.append(f"**Time:** {details['time']}")
+            if details.get("duration"): summary_lines.append(f"**Duration:** {details['duration']} minutes")
+            if details.get("participants"): summary_lines.append(f"**Participants:** {', '.join(details['participants'])}")
+            if details.get("location"): summary_lines.append(f"**Location:** {details['location']}")
+            if summary_lines:
+                summary_msg = "Here are the details for your booking:\n" + "\n".join(summary_lines)
+                append_and_display("assistant", summary_msg)
+            confirmation_prompt = "Do you confirm the booking details? (yes/no)"
+            append_and_display("assistant", confirmation_prompt)
+        elif next_node == "booking":
+            last_user_message = st.session_state.history[-1]["content"].strip().lower() if st.session_state.history else ""
+            if last_user_message in ["no", "cancel", "not now"]:
+                append_and_display("assistant", "Okay, the booking has been cancelled. If you want to start over or change any details, just let me know!")
+                st.stop()
+            elif last_user_message not in ["yes", "confirm", "i confirm", "confirmed"]:
+                append_and_display("assistant", "Please type 'yes' to confirm your booking or 'no' to cancel.")
+                st.stop()
+            booking_result = book_calendar_event(st.session_state.extracted_details, credentials=credentials)
+            if isinstance(booking_result, dict) and "error" in booking_result and booking_result["error"]:
+                append_and_display("assistant", f"[Booking Error] {booking_result['error']}")
+                st.stop()
+            booking_stream = stream_booking_message(
+                success=booking_result["success"],
+                event_details=st.session_state.extracted_details,
+                error=booking_result["error"],
+                communication_style=intent_result.get("style", "neutral")
+            )
+            stream_and_display("assistant", booking_stream, span_name="booking_message")
+            notif = generate_notification_email(
+                event_details=st.session_state.extracted_details,
+                notification_type="confirmation",
+                communication_style=intent_result.get("style", "neutral"),
+                user_name=st.session_state.user_name
+            )
+            if isinstance(notif, dict) and "body" in notif and notif["body"].startswith("Groq API request failed"):
+                append_and_display("assistant", f"[Notification Error] {notif['body']}")
+                st.stop()
+            email_result = send_email(
+                to_email=st.session_state.user_email,
+                subject=notif["subject"],
+                body=notif["body"],
+                recipient_name=st.session_state.user_name
+            )
+            st.sidebar.write(f"[Frontend] Email send result: {email_result}")
+            if email_result[0]:
+                notif_msg = f"A confirmation email has been sent: {notif['subject']}"
+            else:
+                notif_msg = f"[Email Error] Failed to send confirmation email. Reason: {email_result[3]}"
+            append_and_display("assistant", notif_msg)
+        elif next_node == "end":
+            end_msg = "Thank you for using TailorTalk! If you need anything else, just ask."
+            append_and_display("assistant", end_msg)
         else:
-            fallback_msg = "I'm not sure how to proceed. Could you please clarify your request?"
-            append_and_display("assistant", fallback_msg)
+            # Custom handling for missing required fields
+            router_reason = router_result.get("reason", "").lower()
+            missing_info = st.session_state.extracted_details.get("missing_info", [])
+            missing_prompts = []
+            if missing_info:
+                for field in missing_info:
+                    if field == "time":
+                        missing_prompts.append("the time for your meeting")
+                    elif field == "date":
+                        missing_prompts.append("the date for your meeting")
+                    elif field == "participants":
+                        missing_prompts.append("the participants or who should be invited")
+                    elif field == "location":
+                        missing_prompts.append("the location for your meeting")
+                    else:
+                        missing_prompts.append(field)
+            # Also check router reason for missing fields
+            for field in ["time", "date", "participants", "location"]:
+                if f"{field} is a required field" in router_reason and field not in missing_info:
+                    if field == "time":
+                        missing_prompts.append("the time for your meeting")
+                    elif field == "date":
+                        missing_prompts.append("the date for your meeting")
+                    elif field == "participants":
+                        missing_prompts.append("the participants or who should be invited")
+                    elif field == "location":
+                        missing_prompts.append("the location for your meeting")
+                    else:
+                        missing_prompts.append(field)
+            if missing_prompts:
+                ask_msg = "Could you please specify " + ", ".join(missing_prompts) + "?"
+                append_and_display("assistant", ask_msg)
+            else:
+                fallback_msg = "I'm not sure how to proceed. Could you please clarify your request?"
+                append_and_display("assistant", fallback_msg)
+    finally:
+        if prefetch is not None:
+            prefetch.discard()
+            trace.set_output("availability_prefetch", get_prefetch_stats())
+        trace.set_output("llm_breaker", get_breaker_states())
+        trace.set_output("google_services", get_service_cache_stats())
+        trace.set_output("freebusy_cache", get_freebusy_cache_stats())
+        if CALENDAR_SYNC:
+            trace.set_output("calendar_sync", get_sync_stats())
+        # Keep an access token the transport refreshed during the turn, so the next rerun does not refresh again
+        refreshed = refreshed_credentials_info(st.session_state.get("google_credentials") or {})
+        if refreshed is not None:
+            st.session_state["google_credentials"] = refreshed
+        if get_cassette_stats() is not None:
+            trace.set_output("cassette", get_cassette_stats())
+        clear_turn_deadline()
+        finish_turn_trace()
+        render_turn_trace(trace)
+        render_breaker_state()
 
 # Handle pending email collection (user response to email prompt)
 if st.session_state.pending_email and user_input:
@@ -0,0 +1,167 @@
+"""
+Google Services
+---------------
+This module reuses Google API client objects across turns instead of rebuilding them per call:
+- Session credentials are turned into one google.oauth2 Credentials object per login, reused across reruns
+- Built services (discovery document parsed once) are cached per API and credential and shared by every
+  thread, including the new script thread Streamlit starts for each rerun
+- Each thread gets its own pooled authorized HTTP transport through a thread-local (httplib2 connections are
+  not thread-safe, so threads never share one); a thread's transport goes away with the thread
+- Bounded LRU with eviction; entries are rebuilt when their credential's access token changes (refresh or re-login)
+- A token refreshed in place by the transport can be written back to the session (refreshed_credentials_info)
+- Hit, miss, eviction and invalidation counts are kept for the turn trace
+
+Optionally: GOOGLE_SERVICE_CACHE_SIZE (default 32), GOOGLE_HTTP_TIMEOUT (seconds, default 30)
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from cassette import google_request_builder
+
+GOOGLE_SERVICE_CACHE_SIZE = int(os.getenv("GOOGLE_SERVICE_CACHE_SIZE", "32"))
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "30"))
+
+_lock = threading.Lock()
+# (api, version, credential key) -> (service, access token it was built with)
+_services: "OrderedDict[Tuple[str, str, str], tuple]" = OrderedDict()
+# credential key -> (Credentials, token it was created from)
+_credentials: Dict[str, tuple] = {}
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def credential_key(credentials) -> str:
+    """
+    Stable identity of a login: the OAuth client and refresh token (the access token changes on refresh).
+    """
+    return _key(getattr(credentials, "client_id", None), getattr(credentials, "refresh_token", None), getattr(credentials, "token", None))
+
+
+def _key(client_id: Optional[str], refresh_token: Optional[str], token: Optional[str]) -> str:
+    raw = f"{client_id or ''}|{refresh_token or token or ''}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def session_credentials(info: Dict[str, Any]):
+    """
+    Return the Credentials object for a session's stored credential dict, reusing the one from earlier reruns.
+    Args:
+        info (Dict[str, Any]): Keyword arguments for google.oauth2.credentials.Credentials (token, refresh_token, ...).
+    Returns:
+        Credentials: The cached object while the stored token matches it, otherwise a new one.
+    """
+    from google.oauth2.credentials import Credentials
+    key = _key(info.get("client_id"), info.get("refresh_token"), info.get("token"))
+    with _lock:
+        cached = _credentials.get(key)
+        if cached is not None and info.get("token") in (cached[1], cached[0].token):
+            return cached[0]
+    credentials = Credentials(**info)
+    with _lock:
+        _credentials[key] = (credentials, info.get("token"))
+    return credentials
+
+
+def refreshed_credentials_info(info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    If the transport refreshed the session's access token in place, return the updated credential dict to store.
+    Returns:
+        Optional[Dict[str, Any]]: `info` with the new token, or None if nothing changed.
+    """
+    with _lock:
+        cached = _credentials.get(_key(info.get("client_id"), info.get("refresh_token"), info.get("token")))
+    if cached is None or not cached[0].token or cached[0].token == info.get("token"):
+        return None
+    return dict(info, token=cached[0].token)
+
+
+class _ThreadLocalHttp:
+    """
+    The transport of a shared service: requests go through an AuthorizedHttp owned by the calling thread.
+    """
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self._local = threading.local()
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            http = AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+            self._local.http = http
+        return http
+
+    def request(self, *args, **kwargs):
+        return self._http().request(*args, **kwargs)
+
+    def close(self) -> None:
+        http = getattr(self._local, "http", None)
+        if http is not None:
+            http.close()
+            self._local.http = None
+
+
+def _build(api: str, version: str, credentials):
+    from googleapiclient.discovery import build
+    return build(api, version, http=_ThreadLocalHttp(credentials), requestBuilder=google_request_builder(), cache_discovery=False)
+
+
+def get_service(api: str, version: str, credentials):
+    """
+    Return a cached googleapiclient service for these credentials, building it on first use.
+    Args:
+        api (str): API name, e.g. 'calendar'.
+        version (str): API version, e.g. 'v3'.
+        credentials (Credentials): Google OAuth credentials object.
+    Returns:
+        Resource: The service, shared across threads; its requests use a transport owned by the calling thread.
+    """
+    cred_key = credential_key(credentials)
+    key = (api, version, cred_key)
+    with _lock:
+        cached = _services.get(key)
+        if cached is not None:
+            if cached[1] == credentials.token:
+                _services.move_to_end(key)
+                _stats["hits"] += 1
+                return cached[0]
+            # The access token changed since these were built: drop every service for this login
+            for stale in [k for k in _services if k[2] == cred_key]:
+                del _services[stale]
+                _stats["invalidations"] += 1
+        _stats["misses"] += 1
+    service = _build(api, version, credentials)
+    with _lock:
+        _services[key] = (service, credentials.token)
+        _services.move_to_end(key)
+        while len(_services) > GOOGLE_SERVICE_CACHE_SIZE:
+            _services.popitem(last=False)
+            _stats["evictions"] += 1
+    return service
+
+
+def invalidate_services(credentials=None) -> None:
+    """
+    Drop cached services (and the cached Credentials) for one login, or all of them if credentials is None.
+    """
+    cred_key = credential_key(credentials) if credentials is not None else None
+    with _lock:
+        for key in [k for k in _services if cred_key is None or k[2] == cred_key]:
+            del _services[key]
+            _stats["invalidations"] += 1
+        if cred_key is None:
+            _credentials.clear()
+        else:
+            _credentials.pop(cred_key, None)
+
+
+def get_service_cache_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_services)
+    return stats
@@ -0,0 +1,444 @@
+"""
+Groq Client
+-----------
+This module provides the shared HTTP client used by every LLM node to talk to Groq:
+- A single pooled requests.Session (keep-alive, no TCP+TLS handshake per call)
+- Per-node connect/read timeouts
+- Configurable retries with backoff for transient server failures (5xx)
+- Admission through the process-wide rate limiter/scheduler, with 429 Retry-After handling (see llm_scheduler.py)
+- Per-call latency reporting
+- Token streaming (server-sent events) for user-facing messages
+- Response caching per node policy (see llm_cache.py)
+- Token and latency accounting into the current turn trace (see turn_trace.py)
+- Provider prompt-cache accounting per node (cached prefix tokens from usage.prompt_tokens_details)
+- Record/replay of all Groq traffic when CASSETTE_MODE is set (see cassette.py)
+- A circuit breaker and the per-turn deadline (see circuit_breaker.py): calls fail fast with LLMUnavailable
+  while the circuit is open or the turn is out of time, and read timeouts are capped by the time left
+
+Requires: GROQ_API_KEY (environment variable, or Streamlit secrets when the variable is unset)
+Optionally: GROQ_API_URL, GROQ_MAX_RETRIES, GROQ_BACKOFF_FACTOR, GROQ_POOL_SIZE, GROQ_RATE_LIMIT_RETRIES,
+GROQ_MAX_RETRY_AFTER (environment variables)
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from llm_cache import get_cache, get_cache_ttl, make_cache_key
+from history_manager import estimate_tokens
+from turn_trace import record_call
+from llm_scheduler import SchedulerTimeout, get_scheduler, retry_after_seconds
+from circuit_breaker import CircuitOpenError, DeadlineExceeded, get_breaker, time_remaining
+from cassette import CassetteAdapter, get_cassette
+
+
+def _streamlit_secret(name: str) -> Optional[str]:
+    # Deployments configure the key in .streamlit/secrets.toml; scripts run outside Streamlit have none
+    try:
+        import streamlit as st
+        return st.secrets.get(name)
+    except Exception:
+        return None
+
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY") or _streamlit_secret("GROQ_API_KEY")
+# Any OpenAI-compatible endpoint, e.g. the local mock (mock_llm_server.py) for load tests
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "2"))
+GROQ_BACKOFF_FACTOR = float(os.getenv("GROQ_BACKOFF_FACTOR", "0.5"))
+GROQ_POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", "10"))
+# 429s are retried through the scheduler (so every caller backs off together), not by urllib3
+GROQ_RATE_LIMIT_RETRIES = int(os.getenv("GROQ_RATE_LIMIT_RETRIES", "3"))
+GROQ_MAX_RETRY_AFTER = float(os.getenv("GROQ_MAX_RETRY_AFTER", "20"))
+
+# (connect timeout, read timeout) in seconds, per node
+DEFAULT_TIMEOUT = (3.05, 30)
+NODE_TIMEOUTS = {
+    "intent": (3.05, 15),
+    "extraction": (3.05, 20),
+    "router": (3.05, 15),
+    "confirmation": (3.05, 15),
+    "suggestion": (3.05, 30),
+    "booking": (3.05, 20),
+    "email": (3.05, 20),
+    "notification": (3.05, 30),
+    "calendar": (3.05, 20),
+    "turn_analyzer": (3.05, 20),
+}
+
+class _ServerErrorRetry(Retry):
+    # urllib3 otherwise retries any 429 that carries Retry-After on its own, bypassing the scheduler
+    RETRY_AFTER_STATUS_CODES = frozenset([503])
+
+
+_session = None
+_session_lock = threading.Lock()
+_latency_lock = threading.Lock()
+_latencies: Dict[str, List[float]] = {}
+_prefix_cache: Dict[str, Dict[str, float]] = {}
+
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide pooled session, creating it on first use.
+    Returns:
+        requests.Session: Session with keep-alive connection pooling and retry policy mounted.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = _ServerErrorRetry(
+                    total=GROQ_MAX_RETRIES,
+                    connect=GROQ_MAX_RETRIES,
+                    read=GROQ_MAX_RETRIES,
+                    status=GROQ_MAX_RETRIES,
+                    backoff_factor=GROQ_BACKOFF_FACTOR,
+                    status_forcelist=(500, 502, 503, 504),
+                    allowed_methods=frozenset(["POST"]),
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=GROQ_POOL_SIZE, pool_maxsize=GROQ_POOL_SIZE, max_retries=retry)
+                if get_cassette() is not None:
+                    # Record or replay Groq traffic (CASSETTE_MODE)
+                    adapter = CassetteAdapter("groq", inner=adapter)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "Authorization": f"Bearer {GROQ_API_KEY}",
+                    "Content-Type": "application/json"
+                })
+                _session = session
+    return _session
+
+
+def get_timeout(node: str) -> Tuple[float, float]:
+    """
+    Return the (connect, read) timeout for a node.
+    """
+    return NODE_TIMEOUTS.get(node, DEFAULT_TIMEOUT)
+
+
+def _deadline_timeout(node: str) -> Tuple[Tuple[float, float], bool]:
+    """
+    The node's (connect, read) timeout with the read timeout capped by the time left in the current turn.
+    Returns:
+        Tuple[Tuple[float, float], bool]: The timeout, and whether it was shortened by the deadline.
+    Raises:
+        DeadlineExceeded: If the turn's deadline has already passed.
+    """
+    connect, read = get_timeout(node)
+    remaining = time_remaining()
+    if remaining is None or remaining >= read:
+        return (connect, read), False
+    if remaining <= 0:
+        raise DeadlineExceeded(f"Turn deadline passed before the {node} call")
+    return (min(connect, remaining), remaining), True
+
+
+def _record_latency(node: str, seconds: float) -> None:
+    with _latency_lock:
+        _latencies.setdefault(node, []).append(seconds)
+
+
+def cached_prompt_tokens(usage: Dict[str, Any]) -> Optional[int]:
+    """
+    Prompt tokens the provider served from its prefix cache (OpenAI-compatible usage.prompt_tokens_details).
+    """
+    details = usage.get("prompt_tokens_details") or {}
+    return details.get("cached_tokens")
+
+
+def _record_prefix_cache(node: str, usage: Dict[str, Any], seconds: float) -> None:
+    if not usage:
+        return
+    cached = cached_prompt_tokens(usage) or 0
+    with _latency_lock:
+        stats = _prefix_cache.setdefault(node, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "hit_calls": 0, "hit_ms": 0.0, "miss_ms": 0.0})
+        stats["calls"] += 1
+        stats["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        stats["cached_tokens"] += cached
+        if cached:
+            stats["hit_calls"] += 1
+            stats["hit_ms"] += seconds * 1000
+        else:
+            stats["miss_ms"] += seconds * 1000
+
+
+def get_prompt_cache_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Summarize provider prompt-cache reuse per node.
+    Returns:
+        Dict[str, Dict[str, float]]: Per node: calls, hit_rate (calls with cached prefix tokens), cached_share
+        (cached / prompt tokens), and mean latency of calls with and without a prefix-cache hit.
+    """
+    with _latency_lock:
+        snapshot = {node: dict(stats) for node, stats in _prefix_cache.items()}
+    result = {}
+    for node, stats in snapshot.items():
+        misses = stats["calls"] - stats["hit_calls"]
+        result[node] = {
+            "calls": stats["calls"],
+            "hit_rate": round(stats["hit_calls"] / stats["calls"], 3),
+            "cached_share": round(stats["cached_tokens"] / stats["prompt_tokens"], 3) if stats["prompt_tokens"] else 0.0,
+            "hit_mean_ms": round(stats["hit_ms"] / stats["hit_calls"], 1) if stats["hit_calls"] else None,
+            "miss_mean_ms": round(stats["miss_ms"] / misses, 1) if misses else None,
+        }
+    return result
+
+
+def get_latency_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Summarize per-node Groq call latency recorded in this process.
+    Returns:
+        Dict[str, Dict[str, float]]: Per node: count, mean_ms, p50_ms, max_ms.
+    """
+    with _latency_lock:
+        snapshot = {node: sorted(values) for node, values in _latencies.items()}
+    stats = {}
+    for node, values in snapshot.items():
+        if not values:
+            continue
+        stats[node] = {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values) * 1000, 1),
+            "p50_ms": round(values[len(values) // 2] * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1),
+        }
+    return stats
+
+
+def _post_scheduled(node: str, model: str, data: Dict[str, Any], reserved_tokens: int, stream: bool = False) -> requests.Response:
+    """
+    Send a request once the scheduler admits it, retrying 429s after their Retry-After delay.
+    The caller owns the admitted slot and must call get_scheduler().release(...) when done with the response.
+    Each attempt passes through the circuit breaker and is recorded in it (errors and 5xx count as failures;
+    a 429 means rate limiting, not an outage, so it is not recorded as an outcome).
+    Admission waits at most the queue timeout or the time left in the turn, whichever is shorter.
+    Raises:
+        CircuitOpenError: If the circuit is open (no request is sent).
+        DeadlineExceeded: If the turn's deadline passes before or while the call is queued (no request is sent).
+        requests.exceptions.RequestException: On connection errors, timeouts, or queue timeout (slot released).
+    """
+    scheduler = get_scheduler()
+    breaker = get_breaker()
+    for attempt in range(GROQ_RATE_LIMIT_RETRIES + 1):
+        remaining = time_remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"Turn deadline passed before the {node} call")
+        if not breaker.allow():
+            raise CircuitOpenError(f"Groq circuit is open; skipped the {node} call")
+        deadline_bound = remaining is not None and remaining < scheduler.queue_timeout
+        try:
+            scheduler.acquire(node, model, reserved_tokens, timeout=remaining if deadline_bound else None)
+        except SchedulerTimeout as e:
+            breaker.abandon()
+            if deadline_bound:
+                raise DeadlineExceeded(f"Turn deadline reached while the {node} call was queued") from e
+            raise
+        except BaseException:
+            breaker.abandon()
+            raise
+        # The read timeout is capped by what is left of the turn after queueing
+        try:
+            timeout, shortened = _deadline_timeout(node)
+        except DeadlineExceeded:
+            scheduler.release(model, reserved_tokens, 0)
+            breaker.abandon()
+            raise
+        sent = time.perf_counter()
+        try:
+            response = get_session().post(GROQ_API_URL, json=data, timeout=timeout, stream=stream)
+        except BaseException as e:
+            scheduler.release(model, reserved_tokens, 0)
+            if isinstance(e, requests.exceptions.Timeout) and shortened:
+                # Our own deadline cut the call short; that says nothing about the provider's health
+                breaker.abandon()
+                raise DeadlineExceeded(f"Turn deadline reached during the {node} call") from e
+            breaker.record(False, time.perf_counter() - sent)
+            raise
+        if response.status_code == 429:
+            breaker.abandon()
+        else:
+            breaker.record(response.status_code < 500, time.perf_counter() - sent)
+        scheduler.observe(model, response.headers)
+        if response.status_code != 429 or attempt == GROQ_RATE_LIMIT_RETRIES:
+            return response
+        delay = retry_after_seconds(response.headers)
+        remaining = time_remaining()
+        if delay > GROQ_MAX_RETRY_AFTER or (remaining is not None and delay >= remaining):
+            return response
+        response.close()
+        scheduler.release(model, reserved_tokens, 0)
+        scheduler.block(model, delay)
+        print(f"[Groq] node={node} model={model} status=429 retry_after_s={delay:.1f} attempt={attempt + 1}")
+    return response
+
+
+def chat_completion(node: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float, model: str = DEFAULT_MODEL, response_format: Optional[Dict[str, str]] = None, escalated: bool = False) -> Dict[str, Any]:
+    """
+    Send a chat completion request to Groq over the shared pooled session.
+    Args:
+        node (str): Name of the calling node (selects timeout, labels latency).
+        messages (List[Dict[str, str]]): Chat messages (role, content).
+        max_tokens (int): Maximum completion tokens.
+        temperature (float): Sampling temperature.
+        model (str): Groq model name.
+        response_format (Dict[str, str], optional): Structured output mode, e.g. {"type": "json_object"}.
+        escalated (bool): Marks the call in the turn trace as an escalation to the large model.
+    Returns:
+        Dict[str, Any]: Parsed JSON response from Groq (possibly served from the response cache).
+    Raises:
+        requests.exceptions.RequestException: On connection errors, timeouts, or non-2xx responses.
+    """
+    data = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature
+    }
+    if response_format:
+        data["response_format"] = response_format
+    prompt_chars = sum(len(m.get("content", "")) for m in messages)
+    prompt_estimate = estimate_tokens("".join(m.get("content", "") for m in messages))
+    ttl = get_cache_ttl(node)
+    cache_key = None
+    start = time.perf_counter()
+    if ttl > 0:
+        cache_key = make_cache_key(model, messages, temperature, max_tokens, response_format)
+        cached = get_cache().get(node, cache_key)
+        if cached is not None:
+            usage = cached.get("usage") or {}
+            record_call(node, model, prompt_chars, usage.get("prompt_tokens"), usage.get("completion_tokens"), (time.perf_counter() - start) * 1000, "hit", escalated=escalated)
+            print(f"[Groq] node={node} model={model} cache=hit")
+            return cached
+    status = None
+    result = None
+    admitted = False
+    try:
+        response = _post_scheduled(node, model, data, prompt_estimate + max_tokens)
+        admitted = True
+        status = response.status_code
+        response.raise_for_status()
+        result = response.json()
+        if cache_key is not None:
+            get_cache().set(cache_key, result, ttl)
+        return result
+    finally:
+        elapsed = time.perf_counter() - start
+        _record_latency(node, elapsed)
+        usage = (result or {}).get("usage") or {}
+        if admitted:
+            get_scheduler().release(model, prompt_estimate + max_tokens, usage.get("total_tokens"))
+        _record_prefix_cache(node, usage, elapsed)
+        record_call(
+            node,
+            model,
+            prompt_chars,
+            usage.get("prompt_tokens", prompt_estimate),
+            usage.get("completion_tokens"),
+            elapsed * 1000,
+            "miss" if cache_key is not None else "off",
+            status,
+            escalated=escalated,
+            cached_tokens=cached_prompt_tokens(usage)
+        )
+        print(f"[Groq] node={node} model={model} status={status} latency_ms={elapsed * 1000:.1f}")
+
+
+def stream_chat_completion(node: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float, model: str = DEFAULT_MODEL, escalated: bool = False) -> Iterator[str]:
+    """
+    Stream a chat completion from Groq, yielding content deltas as they arrive.
+    Args:
+        node (str): Name of the calling node (selects timeout, labels latency).
+        messages (List[Dict[str, str]]): Chat messages (role, content).
+        max_tokens (int): Maximum completion tokens.
+        temperature (float): Sampling temperature.
+        model (str): Groq model name.
+        escalated (bool): Marks the call in the turn trace as an escalation to the large model.
+    Returns:
+        Iterator[str]: Content fragments in order. A cached response is yielded as a single fragment.
+    Raises:
+        requests.exceptions.RequestException: On connection errors, timeouts, or non-2xx responses.
+    """
+    data = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "stream": True
+    }
+    prompt_chars = sum(len(m.get("content", "")) for m in messages)
+    prompt_estimate = estimate_tokens("".join(m.get("content", "") for m in messages))
+    ttl = get_cache_ttl(node)
+    cache_key = None
+    start = time.perf_counter()
+    if ttl > 0:
+        cache_key = make_cache_key(model, messages, temperature, max_tokens)
+        cached = get_cache().get(node, cache_key)
+        if cached is not None:
+            usage = cached.get("usage") or {}
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            record_call(node, model, prompt_chars, usage.get("prompt_tokens"), usage.get("completion_tokens"), elapsed_ms, "hit", ttft_ms=elapsed_ms, escalated=escalated)
+            yield cached["choices"][0]["message"]["content"]
+            return
+    status = None
+    ttft = None
+    usage = {}
+    parts: List[str] = []
+    completed = False
+    admitted = False
+    try:
+        with _post_scheduled(node, model, data, prompt_estimate + max_tokens, stream=True) as response:
+            admitted = True
+            status = response.status_code
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage") or usage
+                for choice in chunk.get("choices", []):
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+                        parts.append(delta)
+                        yield delta
+        completed = True
+    finally:
+        elapsed = time.perf_counter() - start
+        _record_latency(node, elapsed)
+        completion_tokens = usage.get("completion_tokens", estimate_tokens("".join(parts)) if parts else None)
+        if admitted:
+            get_scheduler().release(model, prompt_estimate + max_tokens, usage.get("prompt_tokens", prompt_estimate) + (completion_tokens or 0))
+        _record_prefix_cache(node, usage, elapsed)
+        record_call(
+            node,
+            model,
+            prompt_chars,
+            usage.get("prompt_tokens", prompt_estimate),
+            completion_tokens,
+            elapsed * 1000,
+            "miss" if cache_key is not None else "off",
+            status,
+            ttft_ms=ttft * 1000 if ttft is not None else None,
+            escalated=escalated,
+            cached_tokens=cached_prompt_tokens(usage)
+        )
+        print(f"[Groq] node={node} model={model} status={status} stream=1 ttft_ms={(ttft or 0) * 1000:.1f} latency_ms={elapsed * 1000:.1f}")
+    if completed and cache_key is not None and parts:
+        get_cache().set(cache_key, {"choices": [{"message": {"role": "assistant", "content": "".join(parts)}}], "usage": usage}, ttl)
@@ -0,0 +1,158 @@
+"""
+History Manager
+---------------
+This module bounds the conversation history that LLM nodes interpolate into their prompts:
+- Keeps the most recent turns verbatim, within a per-node token budget
+- Folds older turns into a compact rolling summary, prepended as a {'role': 'summary'} entry
+- Extends the summary incrementally: summaries are memoized by history prefix, so each turn only folds the
+  messages that newly fell out of the window (no LLM call, no recomputation of the whole history)
+- Drops error and debug strings (e.g. "[Intent Error] ...") that carry no conversational content
+
+Optionally: HISTORY_WINDOW_MESSAGES (default 6), HISTORY_SUMMARY_CACHE_SIZE (default 256)
+"""
+
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
+
+HISTORY_WINDOW_MESSAGES = int(os.getenv("HISTORY_WINDOW_MESSAGES", "6"))
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "256"))
+
+# Approximate token budget for the whole history block (summary + verbatim turns), per node
+NODE_HISTORY_BUDGETS = {
+    "intent": 400,
+    "extraction": 800,
+    "router": 600,
+    "confirmation": 600,
+    "turn_analyzer": 800,
+}
+DEFAULT_HISTORY_BUDGET = 600
+SUMMARY_BUDGET_SHARE = 0.35
+SUMMARY_LINE_CHARS = 160
+
+_ERROR_PATTERN = re.compile(r"^\[[^\]]*(Error|DEBUG)\]|Groq API request failed")
+
+_summary_lock = threading.Lock()
+_summaries: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token) used for budgeting prompts.
+    """
+    return len(text) // 4 + 1
+
+
+def _is_noise(message: Dict[str, str]) -> bool:
+    return message.get("role") != "user" and bool(_ERROR_PATTERN.search(message.get("content", "")))
+
+
+def _summary_line(message: Dict[str, str]) -> str:
+    content = re.sub(r"\s+", " ", message.get("content", "")).strip()
+    if message.get("role") != "user":
+        # Assistant turns: the first sentence carries the proposal/question
+        content = re.split(r"(?<=[.!?])\s", content, maxsplit=1)[0]
+    if len(content) > SUMMARY_LINE_CHARS:
+        content = content[:SUMMARY_LINE_CHARS - 3] + "..."
+    return f"{'U' if message.get('role') == 'user' else 'A'}: {content}"
+
+
+def _prefix_hashes(messages: List[Dict[str, str]]) -> List[str]:
+    hashes = []
+    digest = hashlib.sha1()
+    for message in messages:
+        digest.update(message.get("role", "").encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(message.get("content", "").encode("utf-8"))
+        digest.update(b"\x01")
+        hashes.append(digest.copy().hexdigest())
+    return hashes
+
+
+def _rolling_summary(older: List[Dict[str, str]]) -> Tuple[str, ...]:
+    """
+    Return summary lines for `older`, reusing the longest previously summarized prefix.
+    """
+    if not older:
+        return ()
+    hashes = _prefix_hashes(older)
+    lines: Tuple[str, ...] = ()
+    start = 0
+    with _summary_lock:
+        for i in range(len(hashes) - 1, -1, -1):
+            cached = _summaries.get(hashes[i])
+            if cached is not None:
+                _summaries.move_to_end(hashes[i])
+                lines, start = cached, i + 1
+                break
+    if start == len(older):
+        return lines
+    lines = lines + tuple(_summary_line(m) for m in older[start:])
+    with _summary_lock:
+        _summaries[hashes[-1]] = lines
+        while len(_summaries) > HISTORY_SUMMARY_CACHE_SIZE:
+            _summaries.popitem(last=False)
+    return lines
+
+
+def window_history(conversation_history: List[Dict[str, str]], node: str, max_messages: int = None, token_budget: int = None) -> List[Dict[str, str]]:
+    """
+    Return a bounded view of the conversation history for a node's prompt.
+    Args:
+        conversation_history (List[Dict[str, str]]): Full history (role: 'user'/'assistant', content: str).
+        node (str): Calling node, selects the token budget from NODE_HISTORY_BUDGETS.
+        max_messages (int): Maximum verbatim messages (defaults to HISTORY_WINDOW_MESSAGES).
+        token_budget (int): Approximate token budget for the returned history (defaults to the node's budget).
+    Returns:
+        List[Dict[str, str]]: Optional {'role': 'summary', 'content': ...} entry for older turns, followed by
+        the most recent messages verbatim.
+    """
+    if max_messages is None:
+        max_messages = HISTORY_WINDOW_MESSAGES
+    if token_budget is None:
+        token_budget = NODE_HISTORY_BUDGETS.get(node, DEFAULT_HISTORY_BUDGET)
+    messages = [m for m in conversation_history or [] if not _is_noise(m)]
+
+    recent: List[Dict[str, str]] = []
+    used = 0
+    recent_budget = int(token_budget * (1 - SUMMARY_BUDGET_SHARE))
+    for message in reversed(messages):
+        cost = estimate_tokens(message.get("content", ""))
+        if len(recent) >= max_messages or (recent and used + cost > recent_budget):
+            break
+        recent.append(message)
+        used += cost
+    recent.reverse()
+
+    older = messages[:len(messages) - len(recent)]
+    lines = list(_rolling_summary(older))
+    summary_budget = token_budget - used
+    kept: List[str] = []
+    for line in reversed(lines):
+        cost = estimate_tokens(line)
+        if summary_budget - cost < 0:
+            break
+        kept.append(line)
+        summary_budget -= cost
+    kept.reverse()
+    if not kept:
+        return recent
+    omitted = len(lines) - len(kept)
+    header = f"Earlier conversation ({omitted} older messages omitted): " if omitted else "Earlier conversation: "
+    return [{"role": "summary", "content": header + " | ".join(kept)}] + recent
+
+
+def get_history_stats(conversation_history: List[Dict[str, str]], node: str) -> Dict[str, Any]:
+    """
+    Compare full and windowed history size for a node (approximate tokens).
+    """
+    windowed = window_history(conversation_history, node)
+    return {
+        "messages": len(conversation_history or []),
+        "full_tokens": sum(estimate_tokens(m.get("content", "")) for m in conversation_history or []),
+        "windowed_messages": len(windowed),
+        "windowed_tokens": sum(estimate_tokens(m.get("content", "")) for m in windowed)
+    }
@@ -6,6 +6,9 @@ This module uses Groq LLM to analyze user input and conversation history to dete
 - Confidence in the detected intent
 - Communication style (formal, casual, urgent, etc.)
 - Context integration (relation to previous turns)
+Trivially classifiable messages are answered by the local rules in intent_rules.py without an LLM call.
+The small model answers first; low-confidence or unparseable results escalate to the large model (model_policy.py).
+While the LLM is unavailable (circuit open or turn deadline passed), the local rules' best guess is returned (degraded=True).
 
 Requires: GROQ_API_KEY (set directly in the code)
 """
@@ -14,11 +17,31 @@ import requests
 from typing import Dict, Any, List
 import re
 import os
+import time
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"  # Updated endpoint
+from model_policy import chat_completion_tiered, confident
+from json_stream import extract_json
+from history_manager import window_history
+from prompt_render import render_history
+from turn_trace import record_call, traced
+from intent_rules import fast_path_intent, degraded_intent
+from circuit_breaker import LLMUnavailable, llm_available
+from node_executor import submit
+from concurrent.futures import Future
 
+# Static instructions: kept byte-identical across calls so the provider can reuse the cached prefix
+INTENT_SYSTEM_PROMPT = """You are an AI assistant for a calendar booking agent. Analyze the conversation history and the latest user message.
+For the latest user message, provide:
+- Primary intent (booking, question, complaint, casual, etc.)
+- Confidence (0-1)
+- Communication style (formal, casual, urgent, frustrated, etc.)
+- Context summary (how this message relates to previous turns)
+
+Respond ONLY with a valid JSON object with keys: intent, confidence, style, context_summary.
+Do not include any explanation, markdown, or text outside the JSON."""
 
+
+@traced("intent")
 def analyze_intent(user_input: str, conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
     """
     Analyze user input and conversation history to extract intent, confidence, style, and context.
@@ -28,43 +51,29 @@ def analyze_intent(user_input: str, conversation_history: List[Dict[str, str]])
     Returns:
         Dict[str, Any]: Structured result with intent, confidence, style, and context summary.
     """
-    prompt = f"""
-    You are an AI assistant for a calendar booking agent. Analyze the following conversation and the latest user message.
-    For the latest user message, provide:
-    - Primary intent (booking, question, complaint, casual, etc.)
-    - Confidence (0-1)
-    - Communication style (formal, casual, urgent, frustrated, etc.)
-    - Context summary (how this message relates to previous turns)
-    
-    Conversation history:
-    {conversation_history}
-    
-    Latest user message:
-    {user_input}
-    
-    Respond ONLY with a valid JSON object with keys: intent, confidence, style, context_summary.
-    Do not include any explanation, markdown, or text outside the JSON.
-    """
+    start = time.perf_counter()
+    local_result = fast_path_intent(user_input, conversation_history)
+    if local_result is not None:
+        record_call("intent", "local", len(user_input), 0, 0, (time.perf_counter() - start) * 1000, "local")
+        return local_result
+    if not llm_available():
+        record_call("intent", "local", len(user_input), 0, 0, (time.perf_counter() - start) * 1000, "degraded")
+        return degraded_intent(user_input, conversation_history)
 
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "llama-3.3-70b-versatile",  # Updated model name
-        "messages": [
-            {"role": "system", "content": "You are a helpful assistant for intent recognition."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 512,
-        "temperature": 0.2
-    }
+    conversation_history = window_history(conversation_history, "intent")
+    prompt = f"""Conversation history:
+{render_history(conversation_history)}
+
+Latest user message:
+{user_input}"""
+
+    messages = [
+        {"role": "system", "content": INTENT_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
 
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, json=data)
-        print("Groq API response:", response.status_code, response.text)  # Debug print
-        response.raise_for_status()
-        result = response.json()
+        result = chat_completion_tiered("intent", messages, max_tokens=512, temperature=0.2, accept=confident("intent"))
         import json as pyjson
         try:
             content = result["choices"][0]["message"]["content"]
@@ -72,13 +81,24 @@ def analyze_intent(user_input: str, conversation_history: List[Dict[str, str]])
             return parsed
         except Exception as e:
             # Try to extract JSON substring
-            match = re.search(r'\{.*\}', content, re.DOTALL)
-            if match:
-                try:
-                    parsed = pyjson.loads(match.group(0))
-                    return parsed
-                except Exception as e2:
-                    return {"error": f"Failed to parse extracted JSON: {str(e2)}", "raw_response": content}
+            parsed = extract_json(content)
+            if parsed is not None:
+                return parsed
             return {"error": f"Failed to parse LLM response: {str(e)}", "raw_response": content}
+    except LLMUnavailable as e:
+        print(f"[Intent] LLM unavailable, using local rules: {e}")
+        return degraded_intent(user_input, conversation_history)
     except requests.exceptions.RequestException as e:
-        return {"error": f"Groq API request failed: {str(e)}", "raw_response": getattr(e, 'response', None) and e.response.text} 
\ No newline at end of file
+        return {"error": f"Groq API request failed: {str(e)}", "raw_response": getattr(e, 'response', None) and e.response.text}
+
+
+def analyze_intent_async(user_input: str, conversation_history: List[Dict[str, str]]) -> Future:
+    """
+    Run analyze_intent on the shared node executor so it can overlap with other nodes in the same turn.
+    Args:
+        user_input (str): The latest message from the user.
+        conversation_history (List[Dict[str, str]]): List of previous messages (a snapshot is taken before scheduling).
+    Returns:
+        Future: Resolves to the same dict returned by analyze_intent.
+    """
+    return submit(analyze_intent, user_input, list(conversation_history))
\ No newline at end of file
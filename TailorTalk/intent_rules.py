@@ -0,0 +1,172 @@
+"""
+Intent Rules
+------------
+This module is a local, rule-based fast path in front of the Intent Recognition Node:
+- Classifies trivially recognisable messages ("yes", "cancel", "hi", "book a meeting tomorrow at 3")
+- Returns the same {intent, confidence, style, context_summary} shape as analyze_intent
+- Runs in microseconds with no network call; analyze_intent falls back to the LLM below a confidence threshold
+- Reports fast-path hit rate and latency
+- Supplies the degraded intent result used while the LLM is unavailable (degraded_intent)
+
+Optionally: INTENT_FAST_PATH_THRESHOLD (default 0.85; set above 1 to disable the fast path)
+"""
+
+import os
+import re
+import time
+import threading
+from typing import Dict, Any, List, Optional
+
+INTENT_FAST_PATH_THRESHOLD = float(os.getenv("INTENT_FAST_PATH_THRESHOLD", "0.85"))
+
+CONFIRM_PHRASES = {
+    "yes", "y", "yeah", "yep", "yup", "sure", "ok", "okay", "confirm", "confirmed", "i confirm",
+    "yes please", "sounds good", "looks good", "go ahead", "book it", "perfect", "that works"
+}
+CANCEL_PHRASES = {
+    "no", "n", "nope", "cancel", "not now", "never mind", "nevermind", "stop", "no thanks", "cancel it"
+}
+GREETING_PHRASES = {
+    "hi", "hello", "hey", "hi there", "hello there", "good morning", "good afternoon", "good evening",
+    "thanks", "thank you", "thanks a lot", "thank you so much", "bye", "goodbye"
+}
+
+_BOOKING_VERB = re.compile(r"\b(book|schedule|set up|setup|arrange|reserve|plan|organi[sz]e)\b")
+_BOOKING_NOUN = re.compile(r"\b(meeting|call|appointment|slot|session|sync|catch[- ]?up|interview|demo)\b")
+_TEMPORAL = re.compile(r"\b(today|tomorrow|tonight|next|this|monday|tuesday|wednesday|thursday|friday|saturday|sunday|at \d|\d{1,2}(:\d{2})?\s*(am|pm)|\d{1,2}:\d{2})\b")
+_URGENT = re.compile(r"\b(asap|urgent|urgently|immediately|right away|right now)\b")
+_FRUSTRATED = re.compile(r"(!{2,}|\b(ugh|annoying|annoyed|frustrat\w*|still not|again\?|ridiculous|useless)\b)")
+_FORMAL = re.compile(r"\b(please|kindly|would you|could you|i would like|regards)\b")
+
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "hits": 0, "total_seconds": 0.0}
+
+
+def _normalize(text: str) -> str:
+    text = text.strip().lower()
+    text = re.sub(r"[.!?,\s]+$", "", text)
+    return re.sub(r"\s+", " ", text)
+
+
+def _detect_style(text: str) -> str:
+    lowered = text.lower()
+    if _URGENT.search(lowered):
+        return "urgent"
+    if _FRUSTRATED.search(lowered):
+        return "frustrated"
+    if _FORMAL.search(lowered):
+        return "formal"
+    return "casual"
+
+
+def _last_assistant_message(conversation_history: List[Dict[str, str]]) -> str:
+    for msg in reversed(conversation_history or []):
+        if msg.get("role") == "assistant":
+            return msg.get("content", "")
+    return ""
+
+
+def classify_intent_locally(user_input: str, conversation_history: List[Dict[str, str]]) -> Optional[Dict[str, Any]]:
+    """
+    Classify a message with local rules.
+    Args:
+        user_input (str): The latest message from the user.
+        conversation_history (List[Dict[str, str]]): List of previous messages (role: 'user'/'assistant', content: str).
+    Returns:
+        Optional[Dict[str, Any]]: {intent, confidence, style, context_summary} if a rule matched, else None.
+    """
+    text = _normalize(user_input)
+    if not text:
+        return None
+    style = _detect_style(user_input)
+    last_assistant = _last_assistant_message(conversation_history).lower()
+    awaiting_answer = "confirm" in last_assistant or last_assistant.rstrip().endswith("?")
+
+    if text in CONFIRM_PHRASES:
+        return {
+            "intent": "confirmation",
+            "confidence": 0.95 if awaiting_answer else 0.8,
+            "style": style,
+            "context_summary": "User is confirming the assistant's last proposal." if awaiting_answer else "User gave a standalone confirmation."
+        }
+    if text in CANCEL_PHRASES:
+        return {
+            "intent": "cancellation",
+            "confidence": 0.95 if awaiting_answer else 0.8,
+            "style": style,
+            "context_summary": "User is declining the assistant's last proposal." if awaiting_answer else "User gave a standalone refusal."
+        }
+    if text in GREETING_PHRASES:
+        return {
+            "intent": "casual",
+            "confidence": 0.9,
+            "style": style,
+            "context_summary": "User sent a greeting or pleasantry."
+        }
+    if _BOOKING_VERB.search(text) and (_BOOKING_NOUN.search(text) or _TEMPORAL.search(text)):
+        return {
+            "intent": "booking",
+            "confidence": 0.9 if _BOOKING_NOUN.search(text) else 0.8,
+            "style": style,
+            "context_summary": "User is requesting to book a meeting."
+        }
+    return None
+
+
+def fast_path_intent(user_input: str, conversation_history: List[Dict[str, str]], threshold: float = None) -> Optional[Dict[str, Any]]:
+    """
+    Return a local classification when it meets the confidence threshold, recording hit rate and latency.
+    Args:
+        user_input (str): The latest message from the user.
+        conversation_history (List[Dict[str, str]]): List of previous messages.
+        threshold (float): Minimum confidence to accept the local result (defaults to INTENT_FAST_PATH_THRESHOLD).
+    Returns:
+        Optional[Dict[str, Any]]: The local result, or None if the LLM should be used.
+    """
+    if threshold is None:
+        threshold = INTENT_FAST_PATH_THRESHOLD
+    start = time.perf_counter()
+    result = classify_intent_locally(user_input, conversation_history)
+    hit = result is not None and result["confidence"] >= threshold
+    elapsed = time.perf_counter() - start
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["total_seconds"] += elapsed
+        if hit:
+            _stats["hits"] += 1
+    return result if hit else None
+
+
+def degraded_intent(user_input: str, conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Best local classification regardless of confidence, for turns where the LLM cannot be called
+    (circuit open or turn deadline passed). Unrecognised messages are treated as a low-confidence booking request.
+    Args:
+        user_input (str): The latest message from the user.
+        conversation_history (List[Dict[str, str]]): List of previous messages.
+    Returns:
+        Dict[str, Any]: Same shape as analyze_intent, with degraded=True.
+    """
+    result = classify_intent_locally(user_input, conversation_history) or {
+        "intent": "booking",
+        "confidence": 0.3,
+        "style": _detect_style(user_input),
+        "context_summary": "Classified without the LLM (unavailable); assumed a scheduling request."
+    }
+    return dict(result, degraded=True)
+
+
+def get_fast_path_stats() -> Dict[str, Any]:
+    """
+    Summarize fast-path usage recorded in this process.
+    Returns:
+        Dict[str, Any]: calls, hits, hit_rate, mean_us (mean local classification time in microseconds).
+    """
+    with _stats_lock:
+        calls, hits, total = _stats["calls"], _stats["hits"], _stats["total_seconds"]
+    return {
+        "calls": calls,
+        "hits": hits,
+        "hit_rate": round(hits / calls, 3) if calls else 0.0,
+        "mean_us": round(total / calls * 1e6, 1) if calls else 0.0
+    }
@@ -0,0 +1,206 @@
+"""
+JSON Stream
+-----------
+This module parses JSON node outputs without waiting for, or re-scanning, the whole completion:
+- extract_json: single-pass, string-aware balanced-brace scanner that recovers the first JSON object/array
+  embedded in surrounding text (replaces the greedy re.search(r'\{.*\}', ..., re.DOTALL) fallback)
+- IncrementalJSONParser: fed completion fragments as they stream in, it exposes each top-level key of the
+  object as soon as that key's value has been fully received
+- stream_json_fields: streams a completion and stops reading (closing the connection) once the requested
+  keys are complete, so routing decisions do not wait for the rest of the generation
+"""
+
+import json
+from typing import Dict, Any, List, Optional, Iterable
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def extract_json(text: str, opener: str = "{") -> Optional[Any]:
+    """
+    Find and parse the first balanced JSON value starting with `opener` in `text`.
+    Args:
+        text (str): Raw LLM output, possibly with prose or markdown around the JSON.
+        opener (str): '{' for objects, '[' for arrays.
+    Returns:
+        Optional[Any]: Parsed value, or None if no balanced, valid JSON value was found.
+    """
+    if not text:
+        return None
+    closer = _CLOSERS[opener]
+    start = text.find(opener)
+    while start != -1:
+        depth = 0
+        in_string = False
+        escape = False
+        for i in range(start, len(text)):
+            ch = text[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == opener:
+                depth += 1
+            elif ch == closer:
+                depth -= 1
+                if depth == 0:
+                    try:
+                        return json.loads(text[start:i + 1])
+                    except ValueError:
+                        break
+        start = text.find(opener, start + 1)
+    return None
+
+
+class IncrementalJSONParser:
+    """
+    Incrementally scans a streamed JSON object and records top-level values as they complete.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+        self._expect_key = True
+        # Raw text of the key or value being read ('key' / 'value'), kept as pieces so that feeding
+        # is linear in the length of the completion
+        self._capturing: Optional[str] = None
+        self._capture: List[str] = []
+        self._capture_from = 0
+        self._fragments: List[str] = []
+
+    def _start_capture(self, kind: str, index: int) -> None:
+        self._capturing = kind
+        self._capture = []
+        self._capture_from = index
+
+    def _captured(self, fragment: str, end: int) -> str:
+        raw = "".join(self._capture) + fragment[self._capture_from:end]
+        self._capturing = None
+        self._capture = []
+        return raw
+
+    def feed(self, fragment: str) -> Dict[str, Any]:
+        """
+        Consume the next fragment of the completion.
+        Args:
+            fragment (str): Newly received text.
+        Returns:
+            Dict[str, Any]: Top-level fields completed so far.
+        """
+        if self.done or not fragment:
+            return self.fields
+        self._fragments.append(fragment)
+        # Only the new fragment is scanned; state carries over from the previous ones
+        i = 0
+        while i < len(fragment) and not self.done:
+            ch = fragment[i]
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._expect_key = True
+                i += 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._capturing == "key":
+                        self._key = json.loads(self._captured(fragment, i + 1))
+                    elif self._depth == 1 and self._capturing == "value":
+                        self._complete(self._captured(fragment, i + 1))
+                i += 1
+                continue
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._start_capture("key", i)
+                    self._expect_key = False
+                elif self._depth == 1 and self._key is not None and self._capturing is None:
+                    self._start_capture("value", i)
+            elif ch == ":" and self._depth == 1:
+                pass
+            elif ch in "{[":
+                if self._depth == 1 and self._key is not None and self._capturing is None:
+                    self._start_capture("value", i)
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._capturing == "value":
+                    self._complete(self._captured(fragment, i + 1))
+                elif self._depth == 0:
+                    if self._capturing == "value":
+                        self._complete(self._captured(fragment, i))
+                    self.done = True
+            elif ch == "," and self._depth == 1:
+                if self._capturing == "value":
+                    self._complete(self._captured(fragment, i))
+                self._expect_key = True
+            elif not ch.isspace() and self._depth == 1 and self._key is not None and self._capturing is None:
+                # number, true, false, null
+                self._start_capture("value", i)
+            i += 1
+        if self._capturing is not None:
+            self._capture.append(fragment[self._capture_from:])
+            self._capture_from = 0
+        return self.fields
+
+    def _complete(self, raw: str) -> None:
+        try:
+            self.fields[self._key] = json.loads(raw.strip())
+        except ValueError:
+            pass
+        self._key = None
+
+    def has(self, keys: Iterable[str]) -> bool:
+        return all(k in self.fields for k in keys)
+
+    @property
+    def text(self) -> str:
+        return "".join(self._fragments)
+
+
+def stream_json_fields(fragments: Iterable[str], required_keys: List[str], stop_when=None) -> Dict[str, Any]:
+    """
+    Read a streamed JSON completion only until the required keys are complete.
+    Args:
+        fragments (Iterable[str]): Completion fragments (e.g. from groq_client.stream_chat_completion).
+        required_keys (List[str]): Keys to wait for before returning.
+        stop_when (Callable[[Dict[str, Any]], bool], optional): Extra predicate on the fields parsed so far;
+            when it returns True the stream is abandoned even if not all required keys arrived.
+    Returns:
+        Dict[str, Any]: Parsed fields, plus '_complete' (True if the whole object was received) and '_text'
+        (the raw text read). If the stream ends without a parseable object, falls back to extract_json.
+    """
+    parser = IncrementalJSONParser()
+    iterator = iter(fragments)
+    try:
+        for fragment in iterator:
+            fields = parser.feed(fragment)
+            if parser.done or parser.has(required_keys) or (stop_when is not None and stop_when(fields)):
+                break
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+    fields = dict(parser.fields)
+    if not parser.done and not parser.has(required_keys):
+        recovered = extract_json(parser.text)
+        if isinstance(recovered, dict):
+            fields = recovered
+    fields["_complete"] = parser.done
+    fields["_text"] = parser.text
+    return fields
@@ -0,0 +1,220 @@
+"""
+LLM Response Cache
+------------------
+This module caches Groq chat completion responses underneath the node functions:
+- Keys on model, normalized prompt messages, temperature and output settings
+- Bounded in-memory LRU in front of an on-disk SQLite store
+- TTL-based expiry and eviction in both tiers
+- Per-node cache policies (TTL in seconds, 0 disables caching for that node)
+- Per-node hit/miss counters
+
+Optionally: LLM_CACHE_SIZE (default 512), LLM_CACHE_PATH (default 'llm_cache.sqlite3', empty disables disk),
+LLM_CACHE_TTL_<NODE> (e.g. LLM_CACHE_TTL_INTENT=600) to override a node's policy
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+
+# TTL in seconds per node; 0 disables caching (e.g. high-temperature suggestion text)
+NODE_CACHE_TTLS = {
+    "intent": 3600,
+    "extraction": 600,  # relative dates ("tomorrow") go stale, keep this short
+    "router": 3600,
+    "confirmation": 3600,
+    "turn_analyzer": 600,
+    "suggestion": 0,
+    "booking": 86400,
+    "email": 86400,
+    "notification": 3600,
+    "calendar": 600,
+}
+DEFAULT_CACHE_TTL = 0
+
+_PURGE_EVERY = 100
+
+
+def get_cache_ttl(node: str) -> int:
+    """
+    Return the cache TTL in seconds for a node (0 means the node is not cached).
+    """
+    override = os.getenv(f"LLM_CACHE_TTL_{node.upper()}")
+    if override is not None:
+        return int(override)
+    return NODE_CACHE_TTLS.get(node, DEFAULT_CACHE_TTL)
+
+
+def set_cache_ttl(node: str, ttl: int) -> None:
+    """
+    Set the cache TTL in seconds for a node at runtime (0 disables caching for the node).
+    """
+    NODE_CACHE_TTLS[node] = ttl
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_cache_key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int, response_format: Optional[Dict[str, str]] = None) -> str:
+    """
+    Build a stable cache key from the request parameters that affect the completion.
+    Args:
+        model (str): Groq model name.
+        messages (List[Dict[str, str]]): Chat messages; content is whitespace-normalized.
+        temperature (float): Sampling temperature.
+        max_tokens (int): Maximum completion tokens.
+        response_format (Dict[str, str], optional): Structured output mode.
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    payload = {
+        "model": model,
+        "messages": [[m.get("role", ""), _normalize(m.get("content", ""))] for m in messages],
+        "temperature": round(float(temperature), 3),
+        "max_tokens": max_tokens,
+        "response_format": response_format or None
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier TTL cache: bounded in-memory LRU backed by an optional SQLite store.
+    """
+
+    def __init__(self, max_size: int = LLM_CACHE_SIZE, db_path: Optional[str] = LLM_CACHE_PATH):
+        self.max_size = max_size
+        self.db_path = db_path or None
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._writes = 0
+        self._db = None
+        if self.db_path:
+            try:
+                self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+                self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires ON llm_cache (expires_at)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"[LLMCache] Disk cache disabled: {e}")
+                self._db = None
+
+    def _count(self, node: str, field: str) -> None:
+        counters = self._stats.setdefault(node, {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0})
+        counters[field] += 1
+
+    def get(self, node: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response, promoting disk hits into memory.
+        Returns:
+            Optional[Dict[str, Any]]: Cached response, or None on miss/expiry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._count(node, "hits")
+                    self._count(node, "memory_hits")
+                    return value
+                del self._memory[key]
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        if row[1] > now:
+                            value = json.loads(row[0])
+                            self._put_memory(key, value, row[1])
+                            self._count(node, "hits")
+                            self._count(node, "disk_hits")
+                            return value
+                        self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        self._db.commit()
+                except (sqlite3.Error, ValueError) as e:
+                    print(f"[LLMCache] Disk read failed: {e}")
+            self._count(node, "misses")
+            return None
+
+    def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        """
+        Store a response in both tiers with the given TTL in seconds.
+        """
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)", (key, json.dumps(value), expires_at))
+                    self._writes += 1
+                    if self._writes % _PURGE_EVERY == 0:
+                        self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"[LLMCache] Disk write failed: {e}")
+
+    def _put_memory(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Drop every entry from memory and disk and reset counters.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._stats.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return per-node hit/miss counters with hit rate.
+        """
+        with self._lock:
+            snapshot = {node: dict(counters) for node, counters in self._stats.items()}
+        for counters in snapshot.values():
+            total = counters["hits"] + counters["misses"]
+            counters["hit_rate"] = round(counters["hits"] / total, 3) if total else 0.0
+        return snapshot
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache:
+    """
+    Return the process-wide LLM cache, creating it on first use.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Summarize per-node cache hits and misses recorded in this process.
+    Returns:
+        Dict[str, Dict[str, Any]]: Per node: hits, misses, memory_hits, disk_hits, hit_rate.
+    """
+    return get_cache().stats()
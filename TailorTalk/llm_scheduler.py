@@ -0,0 +1,298 @@
+"""
+LLM Scheduler
+-------------
+This module coordinates all Groq calls made by the process (every Streamlit session shares it):
+- Token buckets per model for requests/minute and tokens/minute, so bursts queue locally instead of
+  turning into 429s
+- A bounded number of in-flight calls
+- Priority classes: interactive nodes (intent, extraction, routing, confirmation) are admitted ahead of
+  user-facing messages, which are admitted ahead of background work such as notification emails
+- Retry-After handling: a 429 pauses admission for that model until the server says to retry; calls for
+  other models queued behind it are still admitted
+- Bucket levels are corrected from Groq's x-ratelimit-remaining-* response headers
+
+Optionally: GROQ_MAX_CONCURRENCY (default 4), GROQ_QUEUE_TIMEOUT (seconds, default 30),
+GROQ_RPM_LIMIT / GROQ_TPM_LIMIT (override the per-model limits for every model)
+"""
+
+import os
+import time
+import heapq
+import itertools
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Tuple
+
+import requests
+
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "4"))
+GROQ_QUEUE_TIMEOUT = float(os.getenv("GROQ_QUEUE_TIMEOUT", "30"))
+
+# (requests per minute, tokens per minute), per model
+MODEL_RATE_LIMITS = {
+    "llama-3.3-70b-versatile": (30, 12000),
+    "llama-3.1-8b-instant": (30, 6000),
+}
+DEFAULT_RATE_LIMIT = (30, 6000)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_MESSAGE = 1
+PRIORITY_BACKGROUND = 2
+
+NODE_PRIORITIES = {
+    "intent": PRIORITY_INTERACTIVE,
+    "extraction": PRIORITY_INTERACTIVE,
+    "router": PRIORITY_INTERACTIVE,
+    "confirmation": PRIORITY_INTERACTIVE,
+    "turn_analyzer": PRIORITY_INTERACTIVE,
+    "suggestion": PRIORITY_MESSAGE,
+    "booking": PRIORITY_MESSAGE,
+    "email": PRIORITY_MESSAGE,
+    "calendar": PRIORITY_MESSAGE,
+    "notification": PRIORITY_BACKGROUND,
+}
+
+
+class SchedulerTimeout(requests.exceptions.Timeout):
+    """
+    Raised when a call waited longer than GROQ_QUEUE_TIMEOUT for admission.
+    """
+
+
+def get_rate_limit(model: str) -> Tuple[int, int]:
+    """
+    Return the (requests/minute, tokens/minute) limit for a model.
+    """
+    rpm, tpm = MODEL_RATE_LIMITS.get(model, DEFAULT_RATE_LIMIT)
+    return int(os.getenv("GROQ_RPM_LIMIT", rpm)), int(os.getenv("GROQ_TPM_LIMIT", tpm))
+
+
+def retry_after_seconds(headers: Dict[str, str], default: float = 1.0) -> float:
+    """
+    Parse a Retry-After header (delay in seconds or an HTTP date).
+    """
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    """
+    Continuously refilling bucket holding up to `capacity` units, refilled at capacity per minute.
+    """
+
+    def __init__(self, capacity: float):
+        self.capacity = float(capacity)
+        self.level = float(capacity)
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Seconds until `amount` units are available (0 if available now).
+        """
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+    def cap(self, remaining: float, now: float) -> None:
+        """
+        Lower the level to what the server reports as remaining.
+        """
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for Groq calls (priority queue + concurrency limit + rate buckets).
+    """
+
+    def __init__(self, max_concurrency: int = GROQ_MAX_CONCURRENCY, queue_timeout: float = GROQ_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._blocked_until: Dict[str, float] = {}
+        self._stats = {"admitted": 0, "queued": 0, "wait_ms": 0.0, "max_wait_ms": 0.0, "rate_limited": 0, "timeouts": 0}
+        self._wait_by_priority: Dict[int, float] = {}
+
+    def _buckets_for(self, model: str) -> Tuple[TokenBucket, TokenBucket]:
+        if model not in self._buckets:
+            rpm, tpm = get_rate_limit(model)
+            self._buckets[model] = (TokenBucket(rpm), TokenBucket(tpm))
+        return self._buckets[model]
+
+    def _model_wait(self, model: str, tokens: int, now: float) -> float:
+        """
+        Seconds until `model` may take another call of `tokens` tokens (Retry-After pause and rate buckets).
+        """
+        requests_bucket, tokens_bucket = self._buckets_for(model)
+        return max(
+            self._blocked_until.get(model, 0.0) - now,
+            requests_bucket.wait_time(1, now),
+            tokens_bucket.wait_time(tokens, now)
+        )
+
+    def acquire(self, node: str, model: str, tokens: int, timeout: Optional[float] = None) -> float:
+        """
+        Block until the call may be sent, then reserve one request and `tokens` tokens for `model`.
+        Args:
+            node (str): Calling node (selects the priority class from NODE_PRIORITIES).
+            model (str): Groq model the call targets.
+            tokens (int): Reserved tokens (prompt estimate + max_tokens); corrected in release().
+            timeout (float, optional): Longest wait for admission in seconds (default: the queue timeout).
+        Returns:
+            float: Seconds spent waiting for admission.
+        Raises:
+            SchedulerTimeout: If admission took longer than the timeout.
+        """
+        priority = NODE_PRIORITIES.get(node, PRIORITY_MESSAGE)
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            ticket = (priority, next(self._seq), model, tokens)
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._active < self.max_concurrency:
+                        wait = self._model_wait(model, tokens, now)
+                        # Calls ahead in the queue go first; those for another model are skipped while that
+                        # model is paused or out of budget, so one model's 429 does not stall the others
+                        ahead_ready = any(
+                            other < ticket and (other[2] == model or self._model_wait(other[2], other[3], now) <= 0)
+                            for other in self._waiting
+                        )
+                        if wait <= 0 and not ahead_ready:
+                            requests_bucket, tokens_bucket = self._buckets_for(model)
+                            requests_bucket.take(1)
+                            tokens_bucket.take(tokens)
+                            self._waiting.remove(ticket)
+                            heapq.heapify(self._waiting)
+                            self._active += 1
+                            self._cond.notify_all()
+                            break
+                        if ahead_ready:
+                            wait = None
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise SchedulerTimeout(f"Groq call for node '{node}' was not admitted within {timeout:g}s (rate limit or concurrency)")
+                    self._cond.wait(min(wait, remaining) if wait is not None else remaining)
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+            waited = time.monotonic() - start
+            self._stats["admitted"] += 1
+            if waited > 0.001:
+                self._stats["queued"] += 1
+            self._stats["wait_ms"] += waited * 1000
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], waited * 1000)
+            self._wait_by_priority[priority] = self._wait_by_priority.get(priority, 0.0) + waited * 1000
+        return waited
+
+    def release(self, model: str, reserved_tokens: int = 0, used_tokens: Optional[int] = None) -> None:
+        """
+        Free the in-flight slot and settle the token reservation against actual usage.
+        """
+        with self._cond:
+            self._active -= 1
+            if used_tokens is not None:
+                tokens_bucket = self._buckets_for(model)[1]
+                if used_tokens < reserved_tokens:
+                    tokens_bucket.give(reserved_tokens - used_tokens)
+                else:
+                    tokens_bucket.take(used_tokens - reserved_tokens)
+            self._cond.notify_all()
+
+    def block(self, model: str, seconds: float) -> None:
+        """
+        Pause admission for `model` (after a 429 with Retry-After).
+        """
+        with self._cond:
+            self._stats["rate_limited"] += 1
+            self._blocked_until[model] = max(self._blocked_until.get(model, 0.0), time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def observe(self, model: str, headers: Dict[str, str]) -> None:
+        """
+        Align the buckets with Groq's x-ratelimit-remaining-requests / -tokens headers, when present.
+        """
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_requests is None and remaining_tokens is None:
+            return
+        with self._cond:
+            now = time.monotonic()
+            requests_bucket, tokens_bucket = self._buckets_for(model)
+            try:
+                if remaining_requests is not None:
+                    requests_bucket.cap(float(remaining_requests), now)
+                if remaining_tokens is not None:
+                    tokens_bucket.cap(float(remaining_tokens), now)
+            except ValueError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return admission counters: admitted, queued, mean/max wait, 429 pauses, timeouts, in-flight and
+        waiting calls, and total wait per priority class.
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats["mean_wait_ms"] = round(stats["wait_ms"] / stats["admitted"], 1) if stats["admitted"] else 0.0
+            stats["wait_ms"] = round(stats["wait_ms"], 1)
+            stats["max_wait_ms"] = round(stats["max_wait_ms"], 1)
+            stats["active"] = self._active
+            stats["waiting"] = len(self._waiting)
+            stats["wait_ms_by_priority"] = {p: round(ms, 1) for p, ms in sorted(self._wait_by_priority.items())}
+        return stats
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """
+    Return the process-wide scheduler, creating it on first use.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def get_scheduler_stats() -> Dict[str, Any]:
+    return get_scheduler().stats()
@@ -0,0 +1,198 @@
+"""
+Message Templates
+-----------------
+This module renders the agent's user-facing messages locally from per-style templates:
+- Suggestion messages (available slots), booking confirmations and failures, email requests, and
+  notification emails (confirmation, reminder, follow-up)
+- Four styles: formal, casual, urgent, frustrated (other detected styles are mapped onto these)
+- Renders in microseconds with no network call
+
+Templates are the default output. LLM personalization is opt-in per message type (LLM_POLISH), and the
+template text is the fallback whenever the Groq call fails or times out.
+
+Optionally: LLM_POLISH (comma-separated message types to personalize with the LLM, e.g.
+'suggestion,notification'; 'all' for every type; empty by default)
+"""
+
+import os
+import datetime
+from typing import Dict, Any, List, Optional
+
+import pytz
+
+LLM_POLISH = {t.strip() for t in os.getenv("LLM_POLISH", "").lower().split(",") if t.strip()}
+
+MESSAGE_TYPES = ("suggestion", "booking", "email", "notification")
+STYLES = ("formal", "casual", "urgent", "frustrated")
+MAX_SUGGESTED_SLOTS = 3
+
+TEMPLATES = {
+    "suggestion": {
+        "formal": "I have found the following available times:\n{options}\nPlease let me know which one you would prefer.",
+        "casual": "Here are a few times that work:\n{options}\nWhich one suits you best?",
+        "urgent": "Earliest available times:\n{options}\nReply with one and I'll book it right away.",
+        "frustrated": "Sorry for the back and forth. These times are open:\n{options}\nJust pick one and I'll take care of the rest.",
+    },
+    "suggestion_none": {
+        "formal": "Unfortunately, I could not find any available time in the coming week. Would you like to suggest another time range?",
+        "casual": "Hmm, your calendar looks full for the next week. Is there another time range you'd like me to check?",
+        "urgent": "There's no free slot in the next week. Tell me another time range and I'll check it immediately.",
+        "frustrated": "I'm sorry, I couldn't find a free slot in the next week. If you give me another time range, I'll check it straight away.",
+    },
+    "booking_success": {
+        "formal": "Your meeting has been booked for {when}{where}. A calendar invitation has been sent{who}.",
+        "casual": "All set! Your meeting is on {when}{where}. I've sent the invite{who}.",
+        "urgent": "Booked: {when}{where}. Invite sent{who}.",
+        "frustrated": "Thanks for your patience. Your meeting is booked for {when}{where}, and the invite has been sent{who}.",
+    },
+    "booking_failure": {
+        "formal": "I'm sorry, but the booking could not be completed ({error}). Please try a different time or try again shortly.",
+        "casual": "Oops, I couldn't book that ({error}). Want to try another time?",
+        "urgent": "Booking failed ({error}). Send another time and I'll retry immediately.",
+        "frustrated": "I'm really sorry, the booking didn't go through ({error}). Let's try another time and I'll get it done.",
+    },
+    "email": {
+        "formal": "To send you the meeting confirmation, could you please provide your email address? It will only be used for this booking.",
+        "casual": "What's the best email to send the confirmation to? I'll only use it for this booking.",
+        "urgent": "Please share your email address so I can send the confirmation right away.",
+        "frustrated": "Just one last thing: which email should I send the confirmation to? It's only used for this booking.",
+    },
+    "email_retry": {
+        "formal": "That does not appear to be a valid email address. Could you please check it and send it again?",
+        "casual": "Hmm, that email doesn't look quite right. Could you double-check it?",
+        "urgent": "That email isn't valid. Please resend it.",
+        "frustrated": "Sorry, that email didn't come through as valid. Could you send it once more?",
+    },
+    "notification_body": {
+        "formal": "Dear {name},\n\n{lead}\n\nKind regards,\nTailorTalk",
+        "casual": "Hi {name},\n\n{lead}\n\nCheers,\nTailorTalk",
+        "urgent": "{name},\n\n{lead}\n\nTailorTalk",
+        "frustrated": "Hi {name},\n\nThank you for your patience. {lead}\n\nBest,\nTailorTalk",
+    },
+}
+
+NOTIFICATION_SUBJECTS = {
+    "confirmation": "Meeting confirmed: {when}",
+    "reminder": "Reminder: meeting on {when}",
+    "followup": "Following up on our meeting on {date}",
+}
+NOTIFICATION_LEADS = {
+    "confirmation": "Your meeting is confirmed for {when}{where}.",
+    "reminder": "This is a reminder that you have a meeting on {when}{where}.",
+    "followup": "Thank you for attending the meeting on {date}. Reply to this email if there is anything to follow up on.",
+}
+
+
+def normalize_style(communication_style: Optional[str]) -> str:
+    """
+    Map a detected communication style (free text from the intent node) onto one of STYLES.
+    """
+    style = (communication_style or "").lower()
+    if any(cue in style for cue in ("frustrat", "angry", "annoy", "upset", "impatien")):
+        return "frustrated"
+    if any(cue in style for cue in ("urgent", "hurr", "asap", "rush")):
+        return "urgent"
+    if any(cue in style for cue in ("formal", "professional", "polite", "neutral")):
+        return "formal"
+    return "casual"
+
+
+def polish_enabled(message_type: str) -> bool:
+    """
+    True if LLM personalization is enabled for this message type.
+    """
+    return "all" in LLM_POLISH or message_type in LLM_POLISH
+
+
+def _parse_datetime(value: str) -> Optional[datetime.datetime]:
+    try:
+        return datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def format_slot(slot: Dict[str, Any]) -> str:
+    """
+    Human-readable slot, e.g. 'Mon 10 Jun, 09:00-10:30 UTC', in the slot's 'timezone' if it has one.
+    """
+    start = _parse_datetime(slot.get("start", ""))
+    end = _parse_datetime(slot.get("end", ""))
+    if start is None or end is None:
+        return f"{slot.get('start')} - {slot.get('end')}"
+    if slot.get("timezone") and start.tzinfo is not None and end.tzinfo is not None:
+        try:
+            # Named zone for the label ('BST' rather than 'UTC+01:00')
+            tz = pytz.timezone(slot["timezone"])
+            start, end = start.astimezone(tz), end.astimezone(tz)
+        except pytz.UnknownTimeZoneError:
+            pass
+    zone = start.tzname() or ""
+    if start.date() == end.date():
+        text = f"{start:%a %d %b}, {start:%H:%M}-{end:%H:%M}"
+    else:
+        text = f"{start:%a %d %b %H:%M} - {end:%a %d %b %H:%M}"
+    return f"{text} {zone}".strip()
+
+
+def _event_fields(event_details: Dict[str, Any]) -> Dict[str, str]:
+    details = event_details or {}
+    date, time = details.get("date"), details.get("time")
+    when_date = date or "the agreed date"
+    parsed = _parse_datetime(f"{date}T{time or '00:00'}") if date else None
+    if parsed is not None:
+        when_date = f"{parsed:%A, %d %B %Y}"
+    when = f"{when_date} at {time}" if time else when_date
+    if details.get("duration"):
+        when += f" ({details['duration']} minutes)"
+    participants = [p for p in details.get("participants") or [] if p]
+    return {
+        "when": when,
+        "date": when_date,
+        "where": f" at {details['location']}" if details.get("location") else "",
+        "who": f" to {', '.join(participants)}" if participants else "",
+    }
+
+
+def render_suggestion(available_slots: List[Dict[str, Any]], communication_style: str = "neutral") -> str:
+    """
+    Suggest up to MAX_SUGGESTED_SLOTS free slots (or ask for another range if there are none).
+    """
+    style = normalize_style(communication_style)
+    if not available_slots:
+        return TEMPLATES["suggestion_none"][style]
+    options = "\n".join(f"- {format_slot(slot)}" for slot in available_slots[:MAX_SUGGESTED_SLOTS])
+    return TEMPLATES["suggestion"][style].format(options=options)
+
+
+def render_booking(success: bool, event_details: Dict[str, Any], error: str = None, communication_style: str = "neutral") -> str:
+    """
+    Booking confirmation (success) or failure explanation.
+    """
+    style = normalize_style(communication_style)
+    if success:
+        return TEMPLATES["booking_success"][style].format(**_event_fields(event_details))
+    return TEMPLATES["booking_failure"][style].format(error=str(error or "unknown error").rstrip("."))
+
+
+def render_email_request(communication_style: str = "neutral", previous_attempts: List[str] = None) -> str:
+    """
+    Ask for the user's email address (or for a corrected one after a previous attempt).
+    """
+    style = normalize_style(communication_style)
+    return TEMPLATES["email_retry" if previous_attempts else "email"][style]
+
+
+def render_notification(event_details: Dict[str, Any], notification_type: str = "confirmation", communication_style: str = "neutral", user_name: str = "User") -> Dict[str, str]:
+    """
+    Notification email for an event.
+    Returns:
+        Dict[str, str]: {'subject': ..., 'body': ...}
+    """
+    style = normalize_style(communication_style)
+    fields = _event_fields(event_details)
+    kind = notification_type if notification_type in NOTIFICATION_SUBJECTS else "confirmation"
+    lead = NOTIFICATION_LEADS[kind].format(**fields)
+    return {
+        "subject": NOTIFICATION_SUBJECTS[kind].format(**fields),
+        "body": TEMPLATES["notification_body"][style].format(name=user_name or "there", lead=lead),
+    }
@@ -0,0 +1,431 @@
+"""
+Mock LLM Server
+---------------
+This module is a local stand-in for the Groq API, for load tests and benchmarks without real LLM calls:
+- Implements POST /openai/v1/chat/completions (plain and streamed server-sent events) as used by groq_client.py
+- Recognises the calling node from its system prompt and answers with a scripted response, or with a
+  rule-based one built from the local fallbacks (intent rules, temporal parser, local routing, templates)
+- Injects latency (per-call and per streamed token) and errors from configurable distributions:
+  429 with Retry-After, 500, and malformed JSON content
+- Simulates provider prefix caching (usage.prompt_tokens_details.cached_tokens for repeated system prompts)
+- GET /stats reports calls and injected faults per node; POST /reset clears them
+
+Point the app at it with GROQ_API_URL=http://127.0.0.1:8088/openai/v1/chat/completions (any GROQ_API_KEY).
+
+Usage: python mock_llm_server.py [--port 8088] [--script script.json] [--latency-ms 300] [--rate-429 0.05] ...
+Optionally: MOCK_LLM_SCRIPT (path of a JSON script; see load_script for the format)
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+
+from history_manager import estimate_tokens
+from json_stream import extract_json
+from intent_rules import degraded_intent
+from temporal_parser import resolve_details_locally
+from router_node import route_locally
+from confirmation_node import interpret_confirmation_locally
+
+MOCK_LLM_SCRIPT = os.getenv("MOCK_LLM_SCRIPT")
+CHAT_COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+# First words of each node's system prompt (the *_SYSTEM_PROMPT constants)
+NODE_MARKERS = [
+    ("intent", "You are an AI assistant for a calendar booking agent."),
+    ("extraction", "You are an expert assistant for a calendar booking agent."),
+    ("router", "You are a conversation router"),
+    ("confirmation", "You are a confirmation handler"),
+    ("turn_analyzer", "You are the turn analyzer"),
+    ("suggestion", "You are a conversational AI assistant for scheduling."),
+    ("booking", "Craft a personalized confirmation message for a successful calendar booking"),
+    ("booking", "Explain a booking failure"),
+    ("email", "request the user's email address"),
+    ("notification", "You are an AI assistant for calendar notifications."),
+    ("calendar", "You are a scheduling assistant."),
+]
+
+DEFAULT_SCRIPT = {
+    "latency_ms": {"mean": 250, "stddev": 80},
+    "token_delay_ms": 10,
+    "errors": {"429": 0.0, "500": 0.0, "malformed": 0.0},
+    "retry_after": 1,
+    "nodes": {},
+}
+
+
+def load_script(path: str = None) -> Dict[str, Any]:
+    """
+    Load a mock script. Top-level settings apply to every node; "nodes" overrides them per node.
+    Format:
+        {
+          "latency_ms": {"mean": 250, "stddev": 80},
+          "token_delay_ms": 10,
+          "errors": {"429": 0.05, "500": 0.01, "malformed": 0.02},
+          "retry_after": 1,
+          "nodes": {
+            "router": {"latency_ms": {"mean": 120, "stddev": 20},
+                       "responses": ["{\\"next_node\\": \\"suggestion\\", \\"reason\\": \\"scripted\\"}"]}
+          }
+        }
+    Scripted "responses" are returned in order (cycling); nodes without them get rule-based responses.
+    """
+    script = json.loads(json.dumps(DEFAULT_SCRIPT))
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+        for key, value in loaded.items():
+            if isinstance(value, dict) and isinstance(script.get(key), dict):
+                script[key].update(value)
+            else:
+                script[key] = value
+    return script
+
+
+def identify_node(messages: List[Dict[str, str]]) -> str:
+    """
+    Name of the node that sent these messages, from its system prompt ('unknown' if not recognised).
+    """
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    for node, marker in NODE_MARKERS:
+        if marker in system:
+            return node
+    return "unknown"
+
+
+def _field(prompt: str, label: str) -> Optional[str]:
+    """
+    Text after 'Label:' in a node prompt: the rest of the line, or the following block if the line is empty.
+    """
+    match = re.search(rf"^{re.escape(label)}:[ \t]*(.*)$", prompt, re.MULTILINE)
+    if not match:
+        return None
+    if match.group(1).strip():
+        return match.group(1).strip()
+    block = prompt[match.end():].lstrip("\n")
+    return block.split("\n\n")[0].strip()
+
+
+def _history(prompt: str) -> List[Dict[str, str]]:
+    roles = {"U": "user", "A": "assistant", "S": "summary"}
+    history = []
+    for line in (_field(prompt, "Conversation history") or "").splitlines():
+        tag, _, content = line.partition(": ")
+        if tag in roles and content:
+            history.append({"role": roles[tag], "content": content})
+    return history
+
+
+def _latest_user_message(prompt: str) -> str:
+    return _field(prompt, "Latest user message") or _field(prompt, "User response") or ""
+
+
+def _mock_details(user_input: str, history: List[Dict[str, str]]) -> Dict[str, Any]:
+    details = resolve_details_locally(user_input, history, best_effort=True)
+    details["context_assembly"] = "Assembled by the mock LLM server from the local temporal parser."
+    return details
+
+
+def _mock_routing(intent: str, details: Dict[str, Any]) -> Dict[str, Any]:
+    routing = route_locally({}, intent, details)
+    routing.pop("degraded", None)
+    routing["reason"] = f"Mock rule-based routing to {routing['next_node']}."
+    return routing
+
+
+def rule_based_response(node: str, prompt: str) -> str:
+    """
+    Plausible completion content for a node, built from the app's own local fallbacks.
+    """
+    if node == "intent":
+        result = degraded_intent(_latest_user_message(prompt), _history(prompt))
+        result.pop("degraded", None)
+        return json.dumps(result)
+    if node == "extraction":
+        return json.dumps(_mock_details(_latest_user_message(prompt), _history(prompt)))
+    if node == "router":
+        details = extract_json(_field(prompt, "Extracted details") or "") or {}
+        return json.dumps(_mock_routing(_field(prompt, "User intent") or "", details))
+    if node == "confirmation":
+        result = interpret_confirmation_locally(_field(prompt, "User response") or "")
+        result.pop("degraded", None)
+        return json.dumps(result)
+    if node == "turn_analyzer":
+        user_input, history = _latest_user_message(prompt), _history(prompt)
+        intent = degraded_intent(user_input, history)
+        intent.pop("degraded", None)
+        details = _mock_details(user_input, history)
+        return json.dumps({"intent": intent, "details": details, "routing": _mock_routing(intent["intent"], details)})
+    if node in ("suggestion", "booking", "email"):
+        return _field(prompt, "Draft message") or "Mock response."
+    if node == "notification":
+        return _field(prompt, "Draft") or json.dumps({"subject": "Mock notification", "body": "Mock body."})
+    if node == "calendar":
+        return _field(prompt, "Free slots") or "[]"
+    return "Mock response."
+
+
+def malformed(content: str) -> str:
+    """
+    Corrupt a completion the way real models sometimes do: prose around truncated JSON.
+    """
+    return "Sure! Here is the result:\n```json\n" + content[:max(1, len(content) // 2)]
+
+
+def _sample_ms(distribution: Any) -> float:
+    if isinstance(distribution, (int, float)):
+        return float(distribution)
+    distribution = distribution or {}
+    return max(0.0, random.gauss(distribution.get("mean", 0), distribution.get("stddev", 0)))
+
+
+class MockLLM:
+    """
+    Response generation, fault injection and statistics shared by all request handler threads.
+    """
+
+    def __init__(self, script: Dict[str, Any]):
+        self.script = script
+        self._lock = threading.Lock()
+        self._cursors: Dict[str, int] = {}
+        self._seen_prefixes = set()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def settings(self, node: str) -> Dict[str, Any]:
+        settings = {key: value for key, value in self.script.items() if key != "nodes"}
+        overrides = self.script.get("nodes", {}).get(node, {})
+        for key, value in overrides.items():
+            if isinstance(value, dict) and isinstance(settings.get(key), dict):
+                settings[key] = dict(settings[key], **value)
+            else:
+                settings[key] = value
+        return settings
+
+    def count(self, node: str, event: str) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(node, {"calls": 0, "429": 0, "500": 0, "malformed": 0, "streamed": 0})
+            stats[event] = stats.get(event, 0) + 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {node: dict(stats) for node, stats in self._stats.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._cursors.clear()
+            self._seen_prefixes.clear()
+
+    def fault(self, node: str) -> Optional[str]:
+        """
+        Draw the injected fault for one call: '429', '500', 'malformed' or None.
+        """
+        errors = self.settings(node).get("errors") or {}
+        draw = random.random()
+        for fault in ("429", "500", "malformed"):
+            rate = float(errors.get(fault, 0) or 0)
+            if draw < rate:
+                return fault
+            draw -= rate
+        return None
+
+    def content(self, node: str, prompt: str) -> str:
+        responses = self.settings(node).get("responses")
+        if responses:
+            with self._lock:
+                cursor = self._cursors.get(node, 0)
+                self._cursors[node] = cursor + 1
+            response = responses[cursor % len(responses)]
+            return response if isinstance(response, str) else json.dumps(response)
+        return rule_based_response(node, prompt)
+
+    def usage(self, messages: List[Dict[str, str]], content: str) -> Dict[str, Any]:
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        prompt_tokens = estimate_tokens("".join(m.get("content", "") for m in messages))
+        digest = hashlib.sha256(system.encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = estimate_tokens(system) if digest in self._seen_prefixes else 0
+            self._seen_prefixes.add(digest)
+        completion_tokens = estimate_tokens(content)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    server_version = "MockLLM/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def mock(self) -> MockLLM:
+        return self.server.mock
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        if self.path == "/stats":
+            self._send_json(200, self.mock.stats())
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.path == "/reset":
+            self.mock.reset()
+            self._send_json(200, {"reset": True})
+            return
+        if self.path != CHAT_COMPLETIONS_PATH:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        try:
+            data = json.loads(raw or b"{}")
+            messages = data["messages"]
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": {"message": f"Invalid request body: {e}", "type": "invalid_request_error"}})
+            return
+
+        node = identify_node(messages)
+        settings = self.mock.settings(node)
+        self.mock.count(node, "calls")
+        time.sleep(_sample_ms(settings.get("latency_ms")) / 1000)
+        fault = self.mock.fault(node)
+        if fault == "429":
+            self.mock.count(node, "429")
+            retry_after = settings.get("retry_after", 1)
+            self._send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}}, {"Retry-After": str(retry_after)})
+            return
+        if fault == "500":
+            self.mock.count(node, "500")
+            self._send_json(500, {"error": {"message": "Internal server error (mock)", "type": "server_error"}})
+            return
+
+        prompt = "\n".join(m.get("content", "") for m in messages if m.get("role") == "user")
+        content = self.mock.content(node, prompt)
+        if fault == "malformed":
+            self.mock.count(node, "malformed")
+            content = malformed(content)
+        usage = self.mock.usage(messages, content)
+        completion_id = f"chatcmpl-mock-{random.getrandbits(48):012x}"
+        model = data.get("model", "mock")
+        if data.get("stream"):
+            self.mock.count(node, "streamed")
+            self._stream(completion_id, model, content, usage, settings)
+            return
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _stream(self, completion_id: str, model: str, content: str, usage: Dict[str, Any], settings: Dict[str, Any]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        token_delay = _sample_ms(settings.get("token_delay_ms")) / 1000
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None, extra: Dict[str, Any] = None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            event({"role": "assistant", "content": ""})
+            for piece in re.findall(r"\S+\s*|\s+", content):
+                time.sleep(token_delay)
+                event({"content": piece})
+            event({}, "stop", {"x_groq": {"usage": usage}})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading early (e.g. router early exit)
+            pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8088, script: Dict[str, Any] = None, verbose: bool = False) -> ThreadingHTTPServer:
+    """
+    Create (but do not start) a mock server; call serve_forever() on it, e.g. from a thread in tests.
+    """
+    server = ThreadingHTTPServer((host, port), MockLLMHandler)
+    server.daemon_threads = True
+    server.mock = MockLLM(script or load_script(MOCK_LLM_SCRIPT))
+    server.verbose = verbose
+    return server
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible mock of the Groq API for TailorTalk.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--script", default=MOCK_LLM_SCRIPT, help="JSON script with latency, errors and per-node responses")
+    parser.add_argument("--latency-ms", type=float, help="Mean response latency")
+    parser.add_argument("--latency-stddev-ms", type=float, help="Standard deviation of response latency")
+    parser.add_argument("--token-delay-ms", type=float, help="Delay between streamed fragments")
+    parser.add_argument("--rate-429", type=float, help="Share of calls answered with 429")
+    parser.add_argument("--rate-500", type=float, help="Share of calls answered with 500")
+    parser.add_argument("--rate-malformed", type=float, help="Share of calls answered with malformed JSON content")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+
+    script = load_script(args.script)
+    if args.latency_ms is not None:
+        script["latency_ms"]["mean"] = args.latency_ms
+    if args.latency_stddev_ms is not None:
+        script["latency_ms"]["stddev"] = args.latency_stddev_ms
+    if args.token_delay_ms is not None:
+        script["token_delay_ms"] = args.token_delay_ms
+    for fault, rate in (("429", args.rate_429), ("500", args.rate_500), ("malformed", args.rate_malformed)):
+        if rate is not None:
+            script["errors"][fault] = rate
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    server = make_server(args.host, args.port, script, args.verbose)
+    print(f"[MockLLM] serving http://{args.host}:{args.port}{CHAT_COMPLETIONS_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,141 @@
+"""
+Model Policy
+------------
+This module decides which Groq model each node calls:
+- Classification and routing nodes (intent, router, confirmation) use a small, low-latency model
+- Generation and extraction nodes keep the large model
+- A small-model result that fails to parse, misses required keys, or reports low confidence is escalated
+  automatically to the large model
+- The model chosen and the escalation rate are recorded per node (and per call in the turn trace)
+
+Optionally: GROQ_SMALL_MODEL, GROQ_LARGE_MODEL, GROQ_MODEL_<NODE> (e.g. GROQ_MODEL_ROUTER),
+ESCALATION_CONFIDENCE (default 0.6)
+"""
+
+import os
+import json
+import threading
+from typing import Dict, Any, List, Callable, Optional
+
+import requests
+
+from groq_client import DEFAULT_MODEL, chat_completion
+from json_stream import extract_json
+
+SMALL_MODEL = os.getenv("GROQ_SMALL_MODEL", "llama-3.1-8b-instant")
+LARGE_MODEL = os.getenv("GROQ_LARGE_MODEL", DEFAULT_MODEL)
+ESCALATION_CONFIDENCE = float(os.getenv("ESCALATION_CONFIDENCE", "0.6"))
+
+NODE_MODELS = {
+    "intent": SMALL_MODEL,
+    "router": SMALL_MODEL,
+    "confirmation": SMALL_MODEL,
+}
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def get_node_model(node: str) -> str:
+    """
+    Return the first-choice model for a node (GROQ_MODEL_<NODE> overrides NODE_MODELS).
+    """
+    return os.getenv(f"GROQ_MODEL_{node.upper()}", NODE_MODELS.get(node, LARGE_MODEL))
+
+
+def parse_content(result: Dict[str, Any]) -> Optional[Any]:
+    """
+    Parse the JSON content of a chat completion result, or None if it is not valid JSON.
+    """
+    try:
+        content = result["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    try:
+        return json.loads(content)
+    except (TypeError, ValueError):
+        return extract_json(content or "")
+
+
+def has_keys(*keys: str) -> Callable[[Any], bool]:
+    """
+    Acceptance check: the parsed output is an object containing all `keys` with non-empty values.
+    """
+    def accept(parsed: Any) -> bool:
+        return isinstance(parsed, dict) and all(parsed.get(k) not in (None, "") for k in keys)
+    return accept
+
+
+def confident(*keys: str, threshold: float = None) -> Callable[[Any], bool]:
+    """
+    Acceptance check: has_keys(*keys) and a numeric 'confidence' of at least the threshold.
+    """
+    required = has_keys(*keys)
+
+    def accept(parsed: Any) -> bool:
+        if not required(parsed):
+            return False
+        try:
+            return float(parsed.get("confidence", 0)) >= (ESCALATION_CONFIDENCE if threshold is None else threshold)
+        except (TypeError, ValueError):
+            return False
+    return accept
+
+
+def record_model_choice(node: str, model: str, escalated: bool) -> None:
+    """
+    Count a tiered call for `node`: which model answered first and whether it was escalated.
+    """
+    with _stats_lock:
+        stats = _stats.setdefault(node, {"calls": 0, "small_model_calls": 0, "escalations": 0})
+        stats["calls"] += 1
+        if model != LARGE_MODEL:
+            stats["small_model_calls"] += 1
+        if escalated:
+            stats["escalations"] += 1
+
+
+def chat_completion_tiered(node: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float, accept: Callable[[Any], bool], response_format: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Call the node's policy model and escalate to LARGE_MODEL if its output is not acceptable.
+    Args:
+        node (str): Calling node.
+        messages (List[Dict[str, str]]): Chat messages (role, content).
+        max_tokens (int): Maximum completion tokens.
+        temperature (float): Sampling temperature.
+        accept (Callable[[Any], bool]): Check on the parsed JSON output (None if it did not parse).
+        response_format (Dict[str, str], optional): Structured output mode.
+    Returns:
+        Dict[str, Any]: Groq response from the model whose answer is used.
+    Raises:
+        requests.exceptions.RequestException: If the final (large model) call fails.
+    """
+    model = get_node_model(node)
+    if model == LARGE_MODEL:
+        record_model_choice(node, model, False)
+        return chat_completion(node, messages, max_tokens, temperature, model=model, response_format=response_format)
+    try:
+        result = chat_completion(node, messages, max_tokens, temperature, model=model, response_format=response_format)
+        if accept(parse_content(result)):
+            record_model_choice(node, model, False)
+            return result
+    except requests.exceptions.HTTPError:
+        # e.g. small model unavailable or over quota; the large model may still answer
+        pass
+    record_model_choice(node, model, True)
+    print(f"[Model] node={node} escalating {model} -> {LARGE_MODEL}")
+    return chat_completion(node, messages, max_tokens, temperature, model=LARGE_MODEL, response_format=response_format, escalated=True)
+
+
+def get_model_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Per node: first-choice model, tiered calls, calls answered first by the small model, escalations and
+    escalation rate (over small-model calls).
+    """
+    with _stats_lock:
+        snapshot = {node: dict(stats) for node, stats in _stats.items()}
+    for node, stats in snapshot.items():
+        stats["model"] = get_node_model(node)
+        small = stats["small_model_calls"]
+        stats["escalation_rate"] = round(stats["escalations"] / small, 3) if small else 0.0
+    return snapshot
@@ -0,0 +1,32 @@
+"""
+Node Executor
+-------------
+This module provides the shared thread pool used to run independent nodes concurrently within a turn.
+- Node calls are I/O bound (Groq, Google APIs), so threads overlap their network round trips
+- Each *_async node variant returns a concurrent.futures.Future resolving to the node's normal result
+- The caller's context (e.g. the current turn trace) is carried into the worker thread
+
+Optionally: NODE_EXECUTOR_WORKERS (environment variable, default 8)
+"""
+
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Any
+
+NODE_EXECUTOR_WORKERS = int(os.getenv("NODE_EXECUTOR_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=NODE_EXECUTOR_WORKERS, thread_name_prefix="tailortalk-node")
+
+
+def submit(fn: Callable[..., Any], *args, **kwargs) -> Future:
+    """
+    Schedule a node function on the shared executor.
+    Args:
+        fn (Callable[..., Any]): Node function to run.
+        *args, **kwargs: Arguments forwarded to the node function.
+    Returns:
+        Future: Resolves to the node function's return value.
+    """
+    ctx = contextvars.copy_context()
+    return _executor.submit(ctx.run, fn, *args, **kwargs)
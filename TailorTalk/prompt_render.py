@@ -0,0 +1,133 @@
+"""
+Prompt Render
+-------------
+This module serializes the structures that nodes embed in their prompts (history, details, state, slots)
+compactly and deterministically, instead of interpolating Python repr() output:
+- History as one line per message with short role tags (U: user, A: assistant, S: summary of older turns)
+- Dicts and lists as minified JSON with sorted keys
+- Empty fields (None, '', [], {}) dropped
+- ISO timestamps trimmed: no microseconds, no ':00' seconds, '+00:00' written as 'Z'
+- Free slots as 'YYYY-MM-DD HH:MM-HH:MM' lines (local times plus the zone name for slots that carry a timezone)
+
+The same input always renders to the same bytes, which keeps prompt prefixes stable for caching.
+"""
+
+import re
+import json
+import threading
+from typing import Dict, Any, List
+
+ROLE_TAGS = {"user": "U", "assistant": "A", "summary": "S", "system": "SYS"}
+
+_OFFSET = re.compile(r"(Z|[+-]\d{2}:?\d{2})$")
+_TIMESTAMP = re.compile(r"^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2})(?::(\d{2}))?(?:\.\d+)?(Z|[+-]\d{2}:?\d{2})?$")
+
+_stats_lock = threading.Lock()
+_stats = {"renders": 0, "repr_chars": 0, "compact_chars": 0}
+
+
+def trim_timestamp(value: str) -> str:
+    """
+    Shorten an ISO 8601 timestamp ('2024-06-10T09:00:00.000000+00:00' -> '2024-06-10T09:00Z').
+    Strings that are not timestamps are returned unchanged.
+    """
+    match = _TIMESTAMP.match(value)
+    if not match:
+        return value
+    date, hm, seconds, offset = match.groups()
+    text = f"{date}T{hm}"
+    if seconds and seconds != "00":
+        text += f":{seconds}"
+    if offset in ("Z", "+00:00", "+0000", "-00:00"):
+        text += "Z"
+    elif offset:
+        text += offset
+    return text
+
+
+def compact(value: Any) -> Any:
+    """
+    Recursively drop empty fields and trim timestamps.
+    """
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            item = compact(item)
+            if item is None or item == "" or item == [] or item == {}:
+                continue
+            result[str(key)] = item
+        return result
+    if isinstance(value, (list, tuple, set)):
+        items = [compact(item) for item in value]
+        return [item for item in items if item is not None and item != "" and item != [] and item != {}]
+    if isinstance(value, str):
+        return trim_timestamp(value.strip())
+    return value
+
+
+def _track(original: Any, rendered: str) -> str:
+    with _stats_lock:
+        _stats["renders"] += 1
+        _stats["repr_chars"] += len(str(original))
+        _stats["compact_chars"] += len(rendered)
+    return rendered
+
+
+def render_data(value: Any) -> str:
+    """
+    Render a dict/list (details, state, preferences, ...) as minified, key-sorted JSON without empty fields.
+    Returns 'none' for empty input.
+    """
+    cleaned = compact(value)
+    if cleaned is None or cleaned == {} or cleaned == [] or cleaned == "":
+        return _track(value, "none")
+    if isinstance(cleaned, str):
+        return _track(value, cleaned)
+    return _track(value, json.dumps(cleaned, ensure_ascii=False, separators=(",", ":"), sort_keys=True, default=str))
+
+
+def render_history(conversation_history: List[Dict[str, str]]) -> str:
+    """
+    Render conversation history as 'U: ...' / 'A: ...' lines (whitespace collapsed). Returns 'none' if empty.
+    """
+    lines = []
+    for message in conversation_history or []:
+        content = re.sub(r"\s+", " ", str(message.get("content", ""))).strip()
+        if not content:
+            continue
+        role = message.get("role", "")
+        lines.append(f"{ROLE_TAGS.get(role, role[:1].upper() or '?')}: {content}")
+    return _track(conversation_history, "\n".join(lines) if lines else "none")
+
+
+def render_slots(slots: List[Dict[str, Any]]) -> str:
+    """
+    Render free slots as one 'YYYY-MM-DD HH:MM-HH:MM' line each (end date repeated only if it differs).
+    Slots localized with a 'timezone' key are written in local time followed by the zone name.
+    Returns 'none' if there are no slots.
+    """
+    lines = []
+    for slot in slots or []:
+        start = trim_timestamp(str(slot.get("start", "")))
+        end = trim_timestamp(str(slot.get("end", "")))
+        zone = slot.get("timezone")
+        if zone:
+            start, end = _OFFSET.sub("", start), _OFFSET.sub("", end)
+        start_date, _, start_time = start.partition("T")
+        end_date, _, end_time = end.partition("T")
+        if start_time and end_time and start_date == end_date:
+            line = f"{start_date} {start_time}-{end_time}"
+        else:
+            line = f"{start_date} {start_time} - {end_date} {end_time}".strip()
+        lines.append(f"{line} {zone}" if zone else line)
+    return _track(slots, "\n".join(lines) if lines else "none")
+
+
+def get_render_stats() -> Dict[str, Any]:
+    """
+    Compare the characters rendered against what repr() interpolation would have produced.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["saved_ratio"] = round(1 - stats["compact_chars"] / stats["repr_chars"], 3) if stats["repr_chars"] else 0.0
+    return stats
@@ -4,8 +4,12 @@ Router Node
 This module uses Groq LLM to manage intelligent conversation flow, acting as the "conductor" for the booking agent.
 - Decides the next node/action based on conversation state, user intent, and extracted details
 - Handles interruptions, modifications, user emotions, errors, and multi-meeting scenarios
+The small model answers first; an HTTP error or a decision without a known next_node escalates to the large
+model (model_policy.py).
+While the LLM is unavailable (circuit open or turn deadline passed), rule-based routing is used (route_locally).
 
 Requires: GROQ_API_KEY (set directly in the code)
+Optionally: ROUTER_EARLY_EXIT = '1' (default; stream the decision and stop once next_node is known) or '0'
 """
 
 import requests
@@ -13,10 +17,33 @@ from typing import Dict, Any, List
 import re
 import os
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"  # Updated endpoint
+from groq_client import stream_chat_completion
+from model_policy import LARGE_MODEL, chat_completion_tiered, get_node_model, has_keys, record_model_choice
+from json_stream import extract_json, stream_json_fields
+from history_manager import window_history
+from prompt_render import render_data, render_history
+from circuit_breaker import LLMUnavailable, llm_available
+from turn_trace import traced
 
+ROUTER_EARLY_EXIT = os.getenv("ROUTER_EARLY_EXIT", "1") == "1"
 
+# Nodes the frontend dispatches on next_node alone; for any other value it also needs 'reason'
+EARLY_EXIT_NODES = {"suggestion", "confirmation", "booking", "end"}
+# Every node a decision may name; anything else from the small model is escalated
+KNOWN_NODES = EARLY_EXIT_NODES | {"intent", "extraction", "router", "email", "calendar", "notification"}
+
+# Static instructions: kept byte-identical across calls so the provider can reuse the cached prefix
+ROUTER_SYSTEM_PROMPT = """You are a conversation router for a calendar booking agent. Analyze the current conversation state, user intent, extracted details, and conversation history. Decide the most appropriate next node or action to keep the conversation smooth and helpful.
+- Handle interruptions (e.g., user asks a question mid-booking)
+- Allow modifications after confirmation
+- Address user frustration or confusion
+- Explain errors if needed
+- Support booking multiple meetings in one conversation
+
+Respond ONLY with a valid JSON object with keys: next_node, reason, additional_actions (in that order). Do not include any explanation, markdown, or text outside the JSON."""
+
+
+@traced("router")
 def route_conversation(conversation_state: Dict[str, Any], user_intent: str, extracted_details: Dict[str, Any], conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
     """
     Decide the next node/action for the conversation based on current state, intent, and details.
@@ -31,38 +58,22 @@ def route_conversation(conversation_state: Dict[str, Any], user_intent: str, ext
             - reason: Explanation for the routing decision
             - additional_actions: List of any extra actions to take (optional)
     """
-    prompt = f"""
-    You are a conversation router for a calendar booking agent. Analyze the current conversation state, user intent, extracted details, and conversation history. Decide the most appropriate next node or action to keep the conversation smooth and helpful.
-    - Handle interruptions (e.g., user asks a question mid-booking)
-    - Allow modifications after confirmation
-    - Address user frustration or confusion
-    - Explain errors if needed
-    - Support booking multiple meetings in one conversation
-    
-    Conversation state: {conversation_state}
-    User intent: {user_intent}
-    Extracted details: {extracted_details}
-    Conversation history: {conversation_history}
-    
-    Respond ONLY with a valid JSON object with keys: next_node, reason, additional_actions. Do not include any explanation, markdown, or text outside the JSON.
-    """
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "llama-3.3-70b-versatile",  # Updated model name
-        "messages": [
-            {"role": "system", "content": "You are a conversation router for a calendar booking agent."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 256,
-        "temperature": 0.3
-    }
+    if not llm_available():
+        return route_locally(conversation_state, user_intent, extracted_details)
+    conversation_history = window_history(conversation_history, "router")
+    prompt = f"""Conversation state: {render_data(conversation_state)}
+User intent: {user_intent}
+Extracted details: {render_data(extracted_details)}
+Conversation history:
+{render_history(conversation_history)}"""
+    messages = [
+        {"role": "system", "content": ROUTER_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
+        if ROUTER_EARLY_EXIT:
+            return _route_streaming(messages)
+        result = chat_completion_tiered("router", messages, max_tokens=256, temperature=0.3, accept=_valid_decision)
         import json as pyjson
         try:
             content = result["choices"][0]["message"]["content"]
@@ -70,13 +81,77 @@ def route_conversation(conversation_state: Dict[str, Any], user_intent: str, ext
             return parsed
         except Exception as e:
             # Try to extract JSON substring
-            match = re.search(r'\{.*\}', content, re.DOTALL)
-            if match:
-                try:
-                    parsed = pyjson.loads(match.group(0))
-                    return parsed
-                except Exception as e2:
-                    return {"next_node": "end", "reason": f"Failed to parse extracted JSON: {str(e2)}", "additional_actions": []}
+            parsed = extract_json(content)
+            if parsed is not None:
+                return parsed
             return {"next_node": "end", "reason": f"Failed to parse LLM response: {str(e)}", "additional_actions": []}
+    except LLMUnavailable as e:
+        print(f"[Router] LLM unavailable, routing locally: {e}")
+        return route_locally(conversation_state, user_intent, extracted_details)
     except requests.exceptions.RequestException as e:
-        return {"next_node": "end", "reason": f"Groq API request failed: {str(e)}", "additional_actions": []} 
\ No newline at end of file
+        return {"next_node": "end", "reason": f"Groq API request failed: {str(e)}", "additional_actions": []}
+
+
+def route_locally(conversation_state: Dict[str, Any], user_intent: str, extracted_details: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rule-based routing used while the LLM is unavailable: cancel -> end, confirmed complete details -> booking,
+    complete details -> confirmation, anything else -> suggestion (offer free slots).
+    Returns:
+        Dict[str, Any]: Same shape as route_conversation, with degraded=True.
+    """
+    details = extracted_details or {}
+    complete = bool(details.get("date") and details.get("time"))
+    if user_intent == "cancellation":
+        next_node, reason = "end", "User declined; routed locally (LLM unavailable)."
+    elif user_intent == "confirmation" and complete:
+        next_node, reason = "booking", "User confirmed complete booking details; routed locally (LLM unavailable)."
+    elif complete:
+        next_node, reason = "confirmation", "Date and time are known; routed locally (LLM unavailable)."
+    else:
+        next_node, reason = "suggestion", "Date or time missing, offering free slots; routed locally (LLM unavailable)."
+    return {"next_node": next_node, "reason": reason, "additional_actions": [], "degraded": True}
+
+
+def _valid_decision(parsed: Any) -> bool:
+    return has_keys("next_node")(parsed) and parsed["next_node"] in KNOWN_NODES
+
+
+def _route_streaming(messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Stream the routing decision and stop reading as soon as it is actionable: once next_node is complete
+    and is one of EARLY_EXIT_NODES, or once both next_node and reason are complete otherwise. Closing the
+    stream closes the connection, so the rest of the generation is not waited for.
+    Returns:
+        Dict[str, Any]: Same shape as route_conversation; fields that were not generated get empty defaults.
+    """
+    model = get_node_model("router")
+    fields = None
+    try:
+        fields = _stream_decision(messages, model)
+    except requests.exceptions.HTTPError as e:
+        if model == LARGE_MODEL:
+            raise
+        # e.g. small model unavailable or over quota; the large model may still answer
+        print(f"[Router] {model} failed: {e}")
+    escalated = model != LARGE_MODEL and (fields is None or not _valid_decision(fields))
+    record_model_choice("router", model, escalated)
+    if escalated:
+        print(f"[Model] node=router escalating {model} -> {LARGE_MODEL}")
+        fields = _stream_decision(messages, LARGE_MODEL, escalated=True)
+    content = fields.pop("_text")
+    complete = fields.pop("_complete")
+    if "next_node" not in fields:
+        return {"next_node": "end", "reason": f"Failed to parse LLM response: {content!r}", "additional_actions": []}
+    fields.setdefault("reason", "")
+    fields.setdefault("additional_actions", [])
+    if not complete:
+        print(f"[Router] early exit on next_node={fields['next_node']}")
+    return fields
+
+
+def _stream_decision(messages: List[Dict[str, str]], model: str, escalated: bool = False) -> Dict[str, Any]:
+    return stream_json_fields(
+        stream_chat_completion("router", messages, max_tokens=256, temperature=0.3, model=model, escalated=escalated),
+        ["next_node", "reason"],
+        stop_when=lambda parsed: parsed.get("next_node") in EARLY_EXIT_NODES
+    ) 
\ No newline at end of file
@@ -7,15 +7,43 @@ This module uses Groq LLM to transform technical scheduling data into natural, c
 - Present multiple options clearly and engagingly
 - Maintain conversational flow
 
+Messages are rendered from local templates (message_templates.py); LLM personalization is opt-in via
+LLM_POLISH=suggestion, and the template is used whenever the LLM call fails.
+
 Requires: GROQ_API_KEY (set directly in the code)
 """
 
 import requests
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
+
+from groq_client import chat_completion, stream_chat_completion
+from prompt_render import render_data, render_slots
+from message_templates import polish_enabled, render_suggestion
+
+# Static instructions: kept byte-identical across calls so the provider can reuse the cached prefix
+SUGGESTION_SYSTEM_PROMPT = """You are a conversational AI assistant for scheduling. Given the available time slots, user preferences, and communication style, craft a natural, engaging suggestion message.
+- Match the user's tone (given as Tone)
+- Provide context for why certain slots are suggested
+- Present multiple options clearly, but do not overwhelm
+- Keep the conversation flowing naturally
+- Start from the draft message and personalize it; do not invent slots that are not listed
+
+Respond with a single suggestion message in natural language."""
+
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"  # Updated endpoint
+def _build_suggestion_messages(available_slots: List[Dict[str, str]], user_preferences: Dict[str, Any], communication_style: str, context: str, draft: str) -> List[Dict[str, str]]:
+    prompt = f"""Tone: {communication_style}
+User preferences: {render_data(user_preferences)}
+Context: {context}
+Available slots:
+{render_slots(available_slots)}
+Draft message:
+{draft}"""
+    return [
+        {"role": "system", "content": SUGGESTION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
 
 
 def generate_suggestion_message(available_slots: List[Dict[str, str]], user_preferences: Dict[str, Any], communication_style: str = "neutral", context: str = "") -> str:
@@ -27,42 +55,53 @@ def generate_suggestion_message(available_slots: List[Dict[str, str]], user_pref
         communication_style (str): Desired tone/style (e.g., 'formal', 'casual').
         context (str): Additional context for the meeting or user.
     Returns:
-        str: Natural language suggestion message.
+        str: Natural language suggestion message (the template rendering unless LLM polish is enabled and succeeds).
     """
-    prompt = f"""
-    You are a conversational AI assistant for scheduling. Given the following available time slots, user preferences, and communication style, craft a natural, engaging suggestion message.
-    - Match the user's tone: {communication_style}
-    - Provide context for why certain slots are suggested
-    - Present multiple options clearly, but do not overwhelm
-    - Keep the conversation flowing naturally
-    
-    Available slots: {available_slots}
-    User preferences: {user_preferences}
-    Context: {context}
-    
-    Respond with a single suggestion message in natural language.
-    """
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "llama-3.3-70b-versatile",  # Updated model name
-        "messages": [
-            {"role": "system", "content": "You are a suggestion generation assistant for calendar booking."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 256,
-        "temperature": 0.7
-    }
+    draft = render_suggestion(available_slots, communication_style)
+    if not polish_enabled("suggestion"):
+        return draft
+    messages = _build_suggestion_messages(available_slots, user_preferences, communication_style, context, draft)
     try:
-        response = requests.post(GROQ_API_URL, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
+        result = chat_completion("suggestion", messages, max_tokens=256, temperature=0.7)
         try:
             content = result["choices"][0]["message"]["content"]
-            return content.strip()
+            return content.strip() or draft
         except Exception as e:
-            return "I'm sorry, I couldn't generate a suggestion at this time."
+            return draft
     except requests.exceptions.RequestException as e:
-        return f"Groq API request failed: {str(e)}" 
\ No newline at end of file
+        print(f"[Suggestion] LLM polish failed, using template: {e}")
+        return draft
+
+
+def stream_suggestion_message(available_slots: List[Dict[str, str]], user_preferences: Dict[str, Any], communication_style: str = "neutral", context: str = "") -> Iterator[str]:
+    """
+    Streaming variant of generate_suggestion_message: yields the message in fragments as Groq produces them.
+    Args:
+        available_slots (List[Dict[str, str]]): List of available time slots (dicts with 'start' and 'end').
+        user_preferences (Dict[str, Any]): User's scheduling preferences.
+        communication_style (str): Desired tone/style (e.g., 'formal', 'casual').
+        context (str): Additional context for the meeting or user.
+    Returns:
+        Iterator[str]: Message fragments. The template rendering is yielded as a single fragment when LLM
+        polish is disabled, or when the request fails before any text arrives.
+    """
+    draft = render_suggestion(available_slots, communication_style)
+    if not polish_enabled("suggestion"):
+        yield draft
+        return
+    messages = _build_suggestion_messages(available_slots, user_preferences, communication_style, context, draft)
+    produced = False
+    try:
+        for fragment in stream_chat_completion("suggestion", messages, max_tokens=256, temperature=0.7):
+            if not produced:
+                fragment = fragment.lstrip()
+            if fragment:
+                produced = True
+                yield fragment
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"[Suggestion] LLM polish failed, using template: {e}")
+        if not produced:
+            yield draft
+        return
+    if not produced:
+        yield draft
\ No newline at end of file
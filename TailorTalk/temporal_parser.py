@@ -0,0 +1,349 @@
+"""
+Temporal Parser
+---------------
+This module is a deterministic, local parser for the date, time and duration expressions handled by the
+Detail Extraction Node, so most booking turns need no LLM call:
+- Relative dates (today, tomorrow, day after tomorrow, in 3 days, this/next Friday)
+- Absolute dates (2024-06-10, June 10th, 10 June 2025) and a bare day of the month (on the 20th)
+- Clock times (3pm, 3:30 pm, 15:00, noon, at 3) and relative times (in 2 hours)
+- Durations (for 30 minutes, 1.5 hours, half an hour, 45-minute)
+- Weekday arithmetic in the user's timezone
+
+Anything it cannot resolve with certainty ("after the holiday", "before my lunch meeting", "sometime in the morning",
+participants, locations) is reported as unresolved so extract_details can fall back to the LLM.
+
+Optionally: DEFAULT_TIMEZONE (default 'UTC'), DEFAULT_DURATION_MINUTES (default 30)
+"""
+
+import os
+import re
+import datetime
+from typing import Dict, Any, List, Optional
+
+import pytz
+
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "UTC")
+DEFAULT_DURATION_MINUTES = int(os.getenv("DEFAULT_DURATION_MINUTES", "30"))
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"]
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20, "thirty": 30,
+    "forty": 40, "forty-five": 45, "forty five": 45, "sixty": 60, "ninety": 90
+}
+
+_WEEKDAY = r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday|mon|tue|tues|wed|thu|thur|thurs|fri|sat|sun)"
+_MONTH = r"(january|february|march|april|may|june|july|august|september|october|november|december|jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec)"
+_NUM = r"(\d+(?:\.\d+)?|" + "|".join(sorted((re.escape(w) for w in NUMBER_WORDS), key=len, reverse=True)) + r")"
+_MIN_UNIT = r"(?:minutes?|mins?)\b"
+_HOUR_UNIT = r"(?:hours?|hrs?)\b"
+
+# Order matters: earlier patterns consume their span before later ones run.
+_RELATIVE_TIME = re.compile(r"\bin " + _NUM + r" ?(" + _MIN_UNIT + "|" + _HOUR_UNIT + ")")
+_RELATIVE_DAYS = re.compile(r"\bin " + _NUM + r" (days?|weeks?)\b")
+_DURATION_HALF = re.compile(r"\b(?:for )?(?:(an?|one|\d+) hours? and a half|(an?|one|\d+) and a half hours?|half an hour|half hour)\b")
+_DURATION = re.compile(r"\b(?:for )?" + _NUM + r"[ -]?(" + _MIN_UNIT + "|" + _HOUR_UNIT + r")(?:[ -]long)?")
+_DURATION_SHORT = re.compile(r"\b(?:for )?(\d+(?:\.\d+)?)(h|m)\b")
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_MONTH_DAY = re.compile(r"\b" + _MONTH + r"\.? (\d{1,2})(?:st|nd|rd|th)?(?:,? (\d{4}))?\b(?! ?(?:am|pm|a\.m\.|p\.m\.|:\d))")
+_DAY_MONTH = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?(?: of)? " + _MONTH + r"\.?(?:,? (\d{4}))?\b")
+_ORDINAL_DAY = re.compile(r"\b(?:on )?(?:the )?(\d{1,2})(?:st|nd|rd|th)\b")
+_NUMERIC_DATE = re.compile(r"\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b")
+_DAY_AFTER_TOMORROW = re.compile(r"\bday after tomorrow\b")
+_TODAY = re.compile(r"\b(today|tonight)\b")
+_TOMORROW = re.compile(r"\b(tomorrow|tmrw|tmr)\b")
+_WEEKDAY_REF = re.compile(r"\b(?:(this|next|coming|on) )?" + _WEEKDAY + r"\b")
+_CLOCK = re.compile(r"\b(?:at |@ ?)?(\d{1,2})(?::(\d{2}))? ?(am|pm|a\.m\.|p\.m\.)")
+_CLOCK_24H = re.compile(r"\b(?:at )?([01]?\d|2[0-3]):([0-5]\d)\b")
+_CLOCK_BARE = re.compile(r"\bat (\d{1,2})\b(?! ?(?:days?|weeks?|minutes?|mins?|hours?|hrs?|people))")
+_NAMED_TIME = re.compile(r"\b(?:at )?(noon|midday|midnight)\b")
+
+# Expressions the parser deliberately does not resolve; their presence means the LLM must decide.
+_UNRESOLVED_CUES = re.compile(
+    r"\b(after|before|around|about|approximately|sometime|some time|morning|afternoon|evening|night|weekend|"
+    r"holiday|holidays|lunch|breakfast|dinner|end of|beginning of|start of|early|late|later|soon|asap|"
+    r"next week|this week|next month|this month|week|month|either|or)\b"
+)
+# Details the parser does not extract at all (participants, locations).
+_OTHER_DETAIL_CUES = re.compile(
+    r"(@|\bwith (?!me\b|you\b)|\b(room|office|zoom|teams|google meet|skype|location|venue|address|at the|in the)\b)"
+)
+
+
+def _to_number(token: str) -> float:
+    token = token.strip()
+    if token in NUMBER_WORDS:
+        return NUMBER_WORDS[token]
+    return float(token)
+
+
+def _month_index(token: str) -> int:
+    token = token.lower().rstrip(".")
+    for i, name in enumerate(MONTHS):
+        if name.startswith(token[:3]):
+            return i + 1
+    raise ValueError(token)
+
+
+def _weekday_index(token: str) -> int:
+    for i, name in enumerate(WEEKDAYS):
+        if name.startswith(token[:3]):
+            return i
+    raise ValueError(token)
+
+
+def _consume(text: str, match: "re.Match") -> str:
+    return text[:match.start()] + " " * (match.end() - match.start()) + text[match.end():]
+
+
+def _get_now(timezone: str, now: Optional[datetime.datetime]) -> datetime.datetime:
+    tz = pytz.timezone(timezone or DEFAULT_TIMEZONE)
+    if now is None:
+        return datetime.datetime.now(tz)
+    if now.tzinfo is None:
+        return tz.localize(now)
+    return now.astimezone(tz)
+
+
+def parse_temporal(text: str, timezone: str = None, now: Optional[datetime.datetime] = None) -> Dict[str, Any]:
+    """
+    Parse date, time and duration expressions from a single message.
+    Args:
+        text (str): The message to parse.
+        timezone (str): IANA timezone of the user (e.g., 'Europe/London'); defaults to DEFAULT_TIMEZONE.
+        now (datetime.datetime, optional): Reference time; defaults to the current time in the timezone.
+    Returns:
+        Dict[str, Any]: Keys:
+            - date: 'YYYY-MM-DD' or None
+            - time: 'HH:MM' (24h) or None
+            - duration: minutes (int) or None
+            - found: True if any temporal expression was resolved
+            - unresolved: list of expressions/cues the parser could not resolve
+            - ambiguity_notes: assumptions made while resolving
+    """
+    now = _get_now(timezone, now)
+    today = now.date()
+    work = " " + re.sub(r"\s+", " ", text.lower()) + " "
+    dates: List[datetime.date] = []
+    times: List[str] = []
+    durations: List[int] = []
+    notes: List[str] = []
+    unresolved: List[str] = []
+
+    # Relative times ("in 2 hours") set both date and time.
+    for m in list(_RELATIVE_TIME.finditer(work)):
+        amount = _to_number(m.group(1))
+        minutes = amount * 60 if re.match(_HOUR_UNIT, m.group(2)) else amount
+        target = now + datetime.timedelta(minutes=minutes)
+        dates.append(target.date())
+        times.append(target.strftime("%H:%M"))
+        work = _consume(work, m)
+    for m in list(_RELATIVE_DAYS.finditer(work)):
+        amount = int(_to_number(m.group(1)))
+        days = amount * 7 if m.group(2).startswith("week") else amount
+        dates.append(today + datetime.timedelta(days=days))
+        work = _consume(work, m)
+
+    # Durations
+    for m in list(_DURATION_HALF.finditer(work)):
+        hours_token = m.group(1) or m.group(2)
+        hours = _to_number(hours_token) if hours_token else 0
+        durations.append(int(hours * 60 + 30))
+        work = _consume(work, m)
+    for m in list(_DURATION.finditer(work)):
+        amount = _to_number(m.group(1))
+        minutes = amount * 60 if re.match(_HOUR_UNIT, m.group(2)) else amount
+        durations.append(int(round(minutes)))
+        work = _consume(work, m)
+    for m in list(_DURATION_SHORT.finditer(work)):
+        amount = float(m.group(1))
+        durations.append(int(round(amount * 60 if m.group(2) == "h" else amount)))
+        work = _consume(work, m)
+
+    # Absolute dates
+    for m in list(_ISO_DATE.finditer(work)):
+        try:
+            dates.append(datetime.date(int(m.group(1)), int(m.group(2)), int(m.group(3))))
+        except ValueError:
+            unresolved.append(m.group(0).strip())
+        work = _consume(work, m)
+    for pattern, month_group, day_group in ((_MONTH_DAY, 1, 2), (_DAY_MONTH, 2, 1)):
+        for m in list(pattern.finditer(work)):
+            try:
+                month, day = _month_index(m.group(month_group)), int(m.group(day_group))
+                if m.group(3):
+                    candidate = datetime.date(int(m.group(3)), month, day)
+                else:
+                    candidate = datetime.date(today.year, month, day)
+                    if candidate < today:
+                        candidate = datetime.date(today.year + 1, month, day)
+                        notes.append(f"'{m.group(0).strip()}' has no year; assumed {candidate.year}.")
+                dates.append(candidate)
+            except ValueError:
+                unresolved.append(m.group(0).strip())
+            work = _consume(work, m)
+    for m in list(_ORDINAL_DAY.finditer(work)):
+        # "the 20th" with no month: the next date with that day of the month (today included)
+        day = int(m.group(1))
+        year, month = today.year, today.month
+        candidate = None
+        for _ in range(12):
+            try:
+                candidate = datetime.date(year, month, day)
+            except ValueError:
+                candidate = None
+            if candidate is not None and candidate >= today:
+                break
+            candidate = None
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        if candidate is None:
+            unresolved.append(m.group(0).strip())
+        else:
+            dates.append(candidate)
+            notes.append(f"'{m.group(0).strip()}' has no month; assumed {candidate.isoformat()}.")
+        work = _consume(work, m)
+    for m in list(_NUMERIC_DATE.finditer(work)):
+        # 6/10 is June 10th or 6th October depending on locale
+        unresolved.append(m.group(0).strip())
+        work = _consume(work, m)
+
+    # Relative dates
+    for m in list(_DAY_AFTER_TOMORROW.finditer(work)):
+        dates.append(today + datetime.timedelta(days=2))
+        work = _consume(work, m)
+    for m in list(_TOMORROW.finditer(work)):
+        dates.append(today + datetime.timedelta(days=1))
+        work = _consume(work, m)
+    for m in list(_TODAY.finditer(work)):
+        dates.append(today)
+        if m.group(1) == "tonight":
+            unresolved.append("tonight")
+        work = _consume(work, m)
+    for m in list(_WEEKDAY_REF.finditer(work)):
+        qualifier, weekday = m.group(1), _weekday_index(m.group(2))
+        days_ahead = (weekday - today.weekday()) % 7
+        if qualifier == "next":
+            # "next Friday" = Friday of next calendar week
+            days_ahead = weekday - today.weekday() + 7
+            notes.append(f"'{m.group(0).strip()}' interpreted as {WEEKDAYS[weekday].title()} of next week.")
+        elif days_ahead == 0 and qualifier != "this":
+            days_ahead = 7
+        dates.append(today + datetime.timedelta(days=days_ahead))
+        work = _consume(work, m)
+
+    # Times
+    for m in list(_CLOCK.finditer(work)):
+        hour, minute = int(m.group(1)), int(m.group(2) or 0)
+        if not 1 <= hour <= 12 or minute > 59:
+            unresolved.append(m.group(0).strip())
+        else:
+            meridiem = m.group(3).replace(".", "")
+            hour = hour % 12 + (12 if meridiem == "pm" else 0)
+            times.append(f"{hour:02d}:{minute:02d}")
+        work = _consume(work, m)
+    for m in list(_CLOCK_24H.finditer(work)):
+        times.append(f"{int(m.group(1)):02d}:{m.group(2)}")
+        work = _consume(work, m)
+    for m in list(_NAMED_TIME.finditer(work)):
+        times.append("00:00" if m.group(1) == "midnight" else "12:00")
+        work = _consume(work, m)
+    for m in list(_CLOCK_BARE.finditer(work)):
+        hour = int(m.group(1))
+        if not 1 <= hour <= 12:
+            unresolved.append(m.group(0).strip())
+        else:
+            # "at 3" during business hours: 1-7 -> afternoon, 8-12 -> as said
+            resolved = hour + 12 if hour <= 7 else hour
+            times.append(f"{resolved:02d}:00")
+            notes.append(f"'{m.group(0).strip()}' has no am/pm; assumed {resolved:02d}:00.")
+        work = _consume(work, m)
+
+    unresolved.extend(m.group(0) for m in _UNRESOLVED_CUES.finditer(work))
+
+    result = {"date": None, "time": None, "duration": None, "found": False, "unresolved": unresolved, "ambiguity_notes": notes}
+    for field, values in (("date", sorted(set(dates))), ("time", sorted(set(times))), ("duration", sorted(set(durations)))):
+        if len(values) > 1:
+            result["unresolved"].append(f"multiple {field} values")
+        elif values:
+            value = values[0]
+            result[field] = value.isoformat() if isinstance(value, datetime.date) else value
+            result["found"] = True
+    result["residual"] = work.strip()
+    return result
+
+
+def resolve_details_locally(user_input: str, conversation_history: List[Dict[str, str]], timezone: str = None, now: Optional[datetime.datetime] = None, best_effort: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Assemble extract_details output from the user's messages without an LLM call, if every message is fully resolvable.
+    Args:
+        user_input (str): The latest message from the user.
+        conversation_history (List[Dict[str, str]]): List of previous messages (role: 'user'/'assistant', content: str).
+        timezone (str): IANA timezone of the user; defaults to DEFAULT_TIMEZONE.
+        now (datetime.datetime, optional): Reference time.
+        best_effort (bool): Never defer to the LLM (used while it is unavailable); whatever could not be
+            resolved is listed in ambiguity_notes instead.
+    Returns:
+        Optional[Dict[str, Any]]: Same shape as extract_details, or None if the LLM is needed (never None with best_effort).
+    """
+    user_messages = [m.get("content", "") for m in conversation_history or [] if m.get("role") == "user"]
+    if not user_messages or user_messages[-1] != user_input:
+        user_messages.append(user_input)
+
+    details = {"date": None, "time": None, "duration": None}
+    notes: List[str] = []
+    turns_used = 0
+    latest = None
+    for message in user_messages:
+        parsed = parse_temporal(message, timezone=timezone, now=now)
+        if parsed["unresolved"] or _OTHER_DETAIL_CUES.search(parsed["residual"]):
+            if not best_effort:
+                return None
+            if parsed["unresolved"]:
+                notes.append(f"Not resolved without the LLM: {', '.join(parsed['unresolved'])}.")
+        if parsed["found"]:
+            turns_used += 1
+        for field in details:
+            if parsed[field] is not None:
+                details[field] = parsed[field]
+        notes.extend(parsed["ambiguity_notes"])
+        latest = parsed
+
+    if latest is not None and not latest["found"] and not best_effort:
+        # A bare "yes"/"that works" may be agreeing to a time the assistant proposed; let the LLM assemble it.
+        for msg in reversed(conversation_history or []):
+            if msg.get("role") == "assistant":
+                if parse_temporal(msg.get("content", ""), timezone=timezone, now=now)["found"]:
+                    return None
+                break
+
+    missing_info = [field for field in ("date", "time") if details[field] is None]
+    if details["duration"] is None and not missing_info:
+        details["duration"] = DEFAULT_DURATION_MINUTES
+        notes.append(f"Duration not specified; assumed {DEFAULT_DURATION_MINUTES} minutes.")
+    result = {
+        "date": details["date"],
+        "time": details["time"],
+        "duration": details["duration"],
+        "participants": [],
+        "location": None,
+        "missing_info": missing_info,
+        "ambiguity_notes": notes,
+        "context_assembly": f"Resolved locally from {turns_used} user turn(s) without an LLM call" + (" (best effort, LLM unavailable)." if best_effort else ".")
+    }
+    if timezone:
+        # booking_node reads this to create the event in the user's timezone
+        result["timezone"] = timezone
+    return result
+
+
+def apply_user_timezone(details: Dict[str, Any], timezone: str) -> Dict[str, Any]:
+    """
+    Set the user's timezone on extracted details that lack one, whichever path produced them (local parser,
+    LLM extraction or the fused turn analyzer), so booking_node never falls back to UTC.
+    Returns:
+        Dict[str, Any]: The same details dict.
+    """
+    if not details.get("timezone"):
+        details["timezone"] = timezone or DEFAULT_TIMEZONE
+    return details
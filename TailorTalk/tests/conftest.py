@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The app's modules are flat files in the TailorTalk directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_CACHE_PATH", "")
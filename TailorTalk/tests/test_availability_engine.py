@@ -0,0 +1,15 @@
+from availability_engine import find_common_slots
+
+
+def _at(hour, minute):
+    return f"2026-10-19T{hour:02d}:{minute:02d}:00Z"
+
+
+def test_partial_quorum_windows_are_maximal():
+    busy = {
+        "a": [{"start": _at(9, 54), "end": _at(10, 2)}],
+        "b": [{"start": _at(9, 16), "end": _at(9, 25)}, {"start": _at(9, 54), "end": _at(10, 5)}],
+    }
+    windows = find_common_slots(busy, _at(9, 0), _at(10, 0), slot_minutes=10, quorum=0.5)
+    # 09:25-09:54 (everyone free) lies inside this window and must not be reported separately
+    assert windows == [{"start": "2026-10-19T09:00:00+00:00", "end": "2026-10-19T09:54:00+00:00", "free": 1, "busy": ["b"]}]
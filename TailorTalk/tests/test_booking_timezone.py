@@ -0,0 +1,57 @@
+import json
+
+import booking_node
+import extraction_node
+from temporal_parser import apply_user_timezone
+
+
+class _Request:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class _Events:
+    def __init__(self):
+        self.inserted = []
+
+    def insert(self, calendarId, body, sendUpdates):
+        self.inserted.append(body)
+        return _Request(dict(body, id="event-1"))
+
+
+class _Service:
+    def __init__(self):
+        self.calendar_events = _Events()
+
+    def events(self):
+        return self.calendar_events
+
+
+class _Credentials:
+    token = "token"
+    refresh_token = "refresh"
+    client_id = "client"
+
+
+def test_llm_extracted_booking_uses_user_timezone(monkeypatch):
+    llm_details = {"date": "2026-10-20", "time": "15:00", "duration": 30, "participants": [], "missing_info": []}
+    monkeypatch.setattr(extraction_node, "chat_completion", lambda *args, **kwargs: {"choices": [{"message": {"content": json.dumps(llm_details)}}]})
+    service = _Service()
+    monkeypatch.setattr(booking_node, "get_calendar_service", lambda credentials=None: service)
+
+    details = extraction_node.extract_details("book it the day after the holiday at 3pm", [], timezone="Europe/London")
+    assert "timezone" not in details  # the LLM path does not set it
+    apply_user_timezone(details, "Europe/London")
+    result = booking_node.book_calendar_event(details, credentials=_Credentials())
+
+    assert result["success"]
+    event = service.calendar_events.inserted[0]
+    assert event["start"] == {"dateTime": "2026-10-20T15:00:00", "timeZone": "Europe/London"}
+    assert event["end"]["timeZone"] == "Europe/London"
+
+
+def test_apply_user_timezone_keeps_parsed_timezone():
+    assert apply_user_timezone({"timezone": "Asia/Tokyo"}, "Europe/London")["timezone"] == "Asia/Tokyo"
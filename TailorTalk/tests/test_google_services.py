@@ -0,0 +1,38 @@
+import threading
+
+import google_services
+
+
+class _Credentials:
+    token = "token"
+    refresh_token = "refresh"
+    client_id = "client"
+
+
+def test_service_is_reused_across_threads():
+    google_services.invalidate_services()
+    credentials = _Credentials()
+    services = []
+
+    def call():
+        services.append(google_services.get_service("calendar", "v3", credentials))
+
+    for _ in range(2):
+        # Streamlit runs each rerun on a new script thread
+        thread = threading.Thread(target=call)
+        thread.start()
+        thread.join()
+
+    assert services[0] is services[1]
+    assert google_services.get_service_cache_stats()["size"] == 1
+
+
+def test_each_thread_gets_its_own_transport():
+    http = google_services._ThreadLocalHttp(_Credentials())
+    transports = []
+    for _ in range(2):
+        thread = threading.Thread(target=lambda: transports.append(http._http()))
+        thread.start()
+        thread.join()
+    assert transports[0] is not transports[1]
+    assert http._http() is http._http()
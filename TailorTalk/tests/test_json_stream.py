@@ -0,0 +1,21 @@
+import json
+
+from json_stream import IncrementalJSONParser
+
+
+def test_fields_complete_across_fragment_boundaries():
+    text = 'Sure: {"next_node": "booking", "reason": "a \\"quoted\\" }{ reason", "additional_actions": [{"x": 1}], "n": 2}'
+    parser = IncrementalJSONParser()
+    for i in range(0, len(text), 3):
+        parser.feed(text[i:i + 3])
+    assert parser.done
+    assert parser.fields == json.loads(text[len("Sure: "):])
+    assert parser.text == text
+
+
+def test_key_available_before_object_ends():
+    parser = IncrementalJSONParser()
+    parser.feed('{"next_node": "confi')
+    assert "next_node" not in parser.fields
+    assert parser.feed('rmation", "reason": "un')["next_node"] == "confirmation"
+    assert not parser.done
@@ -0,0 +1,10 @@
+from calendar_node import localize_slots
+from message_templates import format_slot
+from prompt_render import render_slots
+
+
+def test_slots_are_shown_in_user_timezone():
+    slots = localize_slots([{"start": "2026-10-20T14:00:00+00:00", "end": "2026-10-20T15:30:00Z"}], "Europe/London")
+    assert slots[0]["start"] == "2026-10-20T15:00:00+01:00"
+    assert format_slot(slots[0]) == "Tue 20 Oct, 15:00-16:30 BST"
+    assert render_slots(slots) == "2026-10-20 15:00-16:30 Europe/London"
@@ -0,0 +1,154 @@
+"""
+Turn Analyzer Node
+------------------
+This module uses a single structured Groq LLM call to do the work of three nodes at once:
+- Intent recognition (intent, confidence, style, context summary)
+- Detail extraction (date, time, duration, participants, location, missing info)
+- Routing (next node, reason, additional actions)
+
+The output is split back into the same three dicts that analyze_intent, extract_details and
+route_conversation return, so frontend.py can consume either mode unchanged.
+While the LLM is unavailable (circuit open or turn deadline passed), the three dicts are produced by the
+local fallbacks of those nodes instead (analyze_turn_locally).
+
+Requires: GROQ_API_KEY (environment variable)
+Optionally: TURN_ANALYZER_MODE = 'pipeline' (default, three calls) or 'fused' (one call)
+"""
+
+import requests
+from typing import Dict, Any, List
+import re
+import os
+
+from groq_client import chat_completion
+from json_stream import extract_json
+from history_manager import window_history
+from prompt_render import render_data, render_history
+from intent_rules import degraded_intent
+from temporal_parser import resolve_details_locally
+from router_node import route_locally
+from circuit_breaker import LLMUnavailable, llm_available
+from turn_trace import traced
+
+TURN_ANALYZER_MODE = os.getenv("TURN_ANALYZER_MODE", "pipeline").lower()
+
+INTENT_DEFAULTS = {"intent": "unknown", "confidence": 0.0, "style": "neutral", "context_summary": ""}
+DETAILS_DEFAULTS = {
+    "date": None,
+    "time": None,
+    "duration": None,
+    "participants": [],
+    "location": None,
+    "missing_info": [],
+    "ambiguity_notes": [],
+    "context_assembly": ""
+}
+ROUTING_DEFAULTS = {"next_node": "end", "reason": "", "additional_actions": []}
+
+# Static instructions: kept byte-identical across calls so the provider can reuse the cached prefix
+TURN_ANALYZER_SYSTEM_PROMPT = """You are the turn analyzer for a calendar booking agent. Analyze the conversation state, conversation history and the latest user message, and produce three sections in one JSON object.
+
+1. "intent": for the latest user message
+- intent: primary intent (booking, question, complaint, casual, etc.)
+- confidence: 0-1
+- style: communication style (formal, casual, urgent, frustrated, etc.)
+- context_summary: how this message relates to previous turns
+
+2. "details": booking details assembled across all turns
+- date (absolute, e.g., 2024-06-10)
+- time (24h format, e.g., 15:00)
+- duration (in minutes)
+- participants (list of names or emails, if any)
+- location (if mentioned)
+- missing_info (list of required details not provided)
+- ambiguity_notes (list of ambiguities or context-dependent meanings)
+- context_assembly (summary of how details were gathered across turns)
+Handle complex temporal expressions (e.g., "next Friday after the holiday", "before my lunch meeting"). Infer missing information if possible, and note any assumptions.
+
+3. "routing": the most appropriate next node to keep the conversation smooth and helpful
+- next_node: one of suggestion, confirmation, booking, end, or another node name if details are missing
+- reason: explanation for the routing decision
+- additional_actions: list of any extra actions to take
+Handle interruptions, modifications after confirmation, user frustration or confusion, errors, and multiple meetings in one conversation.
+
+Respond ONLY with a valid JSON object with keys: intent, details, routing. Do not include any explanation, markdown, or text outside the JSON."""
+
+
+def _split_turn_result(parsed: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Normalize the fused LLM output into intent, details and routing dicts with every expected key present.
+    """
+    intent = dict(INTENT_DEFAULTS)
+    intent.update(parsed.get("intent") or {})
+    details = dict(DETAILS_DEFAULTS)
+    details.update(parsed.get("details") or {})
+    routing = dict(ROUTING_DEFAULTS)
+    routing.update(parsed.get("routing") or {})
+    return {"intent": intent, "details": details, "routing": routing}
+
+
+def _error_result(message: str, raw_response: Any = None) -> Dict[str, Dict[str, Any]]:
+    return {
+        "intent": {"error": message, "raw_response": raw_response},
+        "details": {"error": message, "raw_response": raw_response},
+        "routing": dict(ROUTING_DEFAULTS, reason=message)
+    }
+
+
+def analyze_turn_locally(user_input: str, conversation_state: Dict[str, Any], conversation_history: List[Dict[str, str]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Degraded turn analysis without the LLM: local intent rules, best-effort temporal parsing and rule-based routing.
+    """
+    intent = degraded_intent(user_input, conversation_history)
+    details = dict(DETAILS_DEFAULTS)
+    details.update(resolve_details_locally(user_input, conversation_history, best_effort=True))
+    routing = route_locally(conversation_state, intent["intent"], details)
+    return {"intent": intent, "details": details, "routing": routing}
+
+
+@traced("turn_analyzer")
+def analyze_turn(user_input: str, conversation_state: Dict[str, Any], conversation_history: List[Dict[str, str]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Analyze intent, extract details and decide the next node with a single LLM call.
+    Args:
+        user_input (str): The latest message from the user.
+        conversation_state (Dict[str, Any]): Current state of the conversation (e.g., which node, what info collected).
+        conversation_history (List[Dict[str, str]]): List of previous messages (role: 'user'/'assistant', content: str).
+    Returns:
+        Dict[str, Dict[str, Any]]: {'intent': ..., 'details': ..., 'routing': ...}, each shaped like the
+        output of analyze_intent, extract_details and route_conversation respectively. On failure,
+        'intent' and 'details' carry an 'error' key and routing falls back to 'end'.
+    """
+    if not llm_available():
+        return analyze_turn_locally(user_input, conversation_state, conversation_history)
+    conversation_history = window_history(conversation_history, "turn_analyzer")
+    prompt = f"""Conversation state: {render_data(conversation_state)}
+Conversation history:
+{render_history(conversation_history)}
+Latest user message: {user_input}"""
+    messages = [
+        {"role": "system", "content": TURN_ANALYZER_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    try:
+        result = chat_completion("turn_analyzer", messages, max_tokens=768, temperature=0.2, response_format={"type": "json_object"})
+        import json as pyjson
+        content = None
+        try:
+            content = result["choices"][0]["message"]["content"]
+            parsed = pyjson.loads(content)
+            return _split_turn_result(parsed)
+        except Exception as e:
+            # Try to extract JSON substring
+            parsed = extract_json(content or "")
+            if isinstance(parsed, dict):
+                try:
+                    return _split_turn_result(parsed)
+                except Exception as split_error:
+                    e = split_error
+            return _error_result(f"Failed to parse LLM response: {str(e)}", content)
+    except LLMUnavailable as e:
+        print(f"[TurnAnalyzer] LLM unavailable, analyzing locally: {e}")
+        return analyze_turn_locally(user_input, conversation_state, conversation_history)
+    except requests.exceptions.RequestException as e:
+        return _error_result(f"Groq API request failed: {str(e)}", getattr(e, 'response', None) and e.response.text)
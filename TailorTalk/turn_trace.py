@@ -0,0 +1,355 @@
+"""
+Turn Trace
+----------
+This module collects per-call token and latency accounting for every node call in a user turn:
+- Prompt characters and tokens, completion tokens (from the Groq 'usage' field), latency and cache status
+- Process CPU time spent during the turn (for comparing versions on replayed conversations, see cassette.py)
+- Records are gathered into a TurnTrace bound to the current turn (propagated to node executor threads)
+- Traces render as a table in the frontend and export as JSON lines for offline analysis
+- Nested spans: one root span per turn, a span per node (traced decorator / span context manager) and per
+  external call (Groq, Google Calendar/People, MailerSend), with attributes such as tokens, status and cache
+- Spans export as OpenTelemetry (OTLP/JSON) trace documents and render as a waterfall in the frontend
+
+Optionally: TURN_TRACE_PATH (append each finished turn as one JSON line to this file),
+TURN_TRACE_OTLP_PATH (append each finished turn as one OTLP/JSON line, e.g. for an OpenTelemetry collector)
+"""
+
+import os
+import json
+import time
+import uuid
+import functools
+import threading
+import contextlib
+import contextvars
+from typing import Dict, Any, List, Optional, Callable, Iterator
+
+TURN_TRACE_PATH = os.getenv("TURN_TRACE_PATH", "")
+TURN_TRACE_OTLP_PATH = os.getenv("TURN_TRACE_OTLP_PATH", "")
+
+SERVICE_NAME = "tailortalk"
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("turn_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("turn_span", default=None)
+_export_lock = threading.Lock()
+
+
+class Span:
+    """
+    One timed operation within a turn (a node, or an external call made by a node).
+    """
+
+    def __init__(self, name: str, parent_id: Optional[str] = None, kind: int = SPAN_KIND_INTERNAL, attributes: Dict[str, Any] = None, start: float = None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start = time.time() if start is None else start
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def finish(self, end: float = None) -> None:
+        if self.end is None:
+            self.end = time.time() if end is None else end
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "end": self.end,
+            "attributes": dict(self.attributes),
+            "error": self.error
+        }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+class TurnTrace:
+    """
+    Accounting records for all node calls made while handling one user message.
+    """
+
+    def __init__(self, turn_id: str = None, history_length: int = 0):
+        self.turn_id = turn_id or uuid.uuid4().hex[:12]
+        self.trace_id = uuid.uuid4().hex
+        self.history_length = history_length
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cpu_started = time.process_time()
+        self.cpu_finished: Optional[float] = None
+        self.records: List[Dict[str, Any]] = []
+        self.outputs: Dict[str, Any] = {}
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = self.add_span(Span("turn", attributes={"turn.id": self.turn_id, "turn.history_length": history_length}, start=self.started_at))
+
+    def add_record(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    def add_span(self, span: Span) -> Span:
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def waterfall(self) -> List[Dict[str, Any]]:
+        """
+        Spans in start order with depth and offsets from the turn start, for the debug panel.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda sp: sp.start)
+        depths = {}
+        rows = []
+        for sp in spans:
+            depth = depths.get(sp.parent_id, -1) + 1
+            depths[sp.span_id] = depth
+            end = sp.end if sp.end is not None else (self.finished_at or time.time())
+            rows.append({
+                "span": "  " * depth + sp.name,
+                "depth": depth,
+                "start_ms": round((sp.start - self.started_at) * 1000, 1),
+                "end_ms": round((end - self.started_at) * 1000, 1),
+                "duration_ms": round((end - sp.start) * 1000, 1),
+                "status": "error" if sp.error else "ok",
+                "attributes": dict(sp.attributes)
+            })
+        return rows
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """
+        The turn's spans as an OTLP/JSON ExportTraceServiceRequest document.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        otlp_spans = []
+        for sp in spans:
+            end = sp.end if sp.end is not None else (self.finished_at or time.time())
+            otlp_span = {
+                "traceId": self.trace_id,
+                "spanId": sp.span_id,
+                "name": sp.name,
+                "kind": sp.kind,
+                "startTimeUnixNano": str(int(sp.start * 1e9)),
+                "endTimeUnixNano": str(int(end * 1e9)),
+                "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in sp.attributes.items()],
+                "status": {"code": 2, "message": sp.error} if sp.error else {"code": 1}
+            }
+            if sp.parent_id:
+                otlp_span["parentSpanId"] = sp.parent_id
+            otlp_spans.append(otlp_span)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "turn_trace"}, "spans": otlp_spans}]
+            }]
+        }
+
+    def set_output(self, node: str, output: Any) -> None:
+        """
+        Attach a node's result to the trace (shown in the debug panel instead of inline dumps).
+        """
+        with self._lock:
+            self.outputs[node] = output
+
+    def totals(self) -> Dict[str, Any]:
+        with self._lock:
+            records = list(self.records)
+        llm_calls = [r for r in records if r["cache"] in ("miss", "off")]
+        return {
+            "calls": len(records),
+            "llm_calls": len(llm_calls),
+            "cache_hits": sum(1 for r in records if r["cache"] == "hit"),
+            "escalations": sum(1 for r in records if r.get("escalated")),
+            "prompt_tokens": sum(r["prompt_tokens"] or 0 for r in llm_calls),
+            "cached_prompt_tokens": sum(r.get("cached_tokens") or 0 for r in llm_calls),
+            "completion_tokens": sum(r["completion_tokens"] or 0 for r in llm_calls),
+            "llm_latency_ms": round(sum(r["latency_ms"] for r in llm_calls), 1),
+            "wall_ms": round(((self.finished_at or time.time()) - self.started_at) * 1000, 1),
+            # Process-wide: includes node executor threads (and any concurrent sessions)
+            "cpu_ms": round(((self.cpu_finished or time.process_time()) - self.cpu_started) * 1000, 1)
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            records = [dict(r) for r in self.records]
+        return {
+            "turn_id": self.turn_id,
+            "started_at": self.started_at,
+            "history_length": self.history_length,
+            "records": records,
+            "totals": self.totals()
+        }
+
+    def to_jsonl(self) -> str:
+        """
+        Serialize the trace as a single JSON line.
+        """
+        return json.dumps(self.to_dict(), ensure_ascii=False, default=str)
+
+
+def start_turn_trace(history_length: int = 0) -> TurnTrace:
+    """
+    Create a trace and bind it to the current context; node calls made from here (and from executor
+    threads scheduled from here) are recorded into it.
+    """
+    trace = TurnTrace(history_length=history_length)
+    _current_trace.set(trace)
+    _current_span.set(trace.root)
+    return trace
+
+
+def get_current_trace() -> Optional[TurnTrace]:
+    return _current_trace.get()
+
+
+def finish_turn_trace(path: str = None) -> Optional[TurnTrace]:
+    """
+    Close the current trace, export it to `path` (or TURN_TRACE_PATH) if configured, and unbind it.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    trace.finished_at = time.time()
+    trace.cpu_finished = time.process_time()
+    trace.root.finish(trace.finished_at)
+    trace.root.set("cpu_ms", round((trace.cpu_finished - trace.cpu_started) * 1000, 1))
+    path = path or TURN_TRACE_PATH
+    if path:
+        export_jsonl([trace], path)
+    if TURN_TRACE_OTLP_PATH:
+        export_otlp_jsonl([trace], TURN_TRACE_OTLP_PATH)
+    _current_trace.set(None)
+    _current_span.set(None)
+    return trace
+
+
+def export_jsonl(traces: List[TurnTrace], path: str) -> None:
+    """
+    Append traces to a JSON lines file.
+    """
+    with _export_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            for trace in traces:
+                f.write(trace.to_jsonl() + "\n")
+
+
+def export_otlp_jsonl(traces: List[TurnTrace], path: str) -> None:
+    """
+    Append traces as OTLP/JSON documents, one per line (the OpenTelemetry collector file exporter format).
+    """
+    with _export_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            for trace in traces:
+                f.write(json.dumps(trace.to_otlp(), ensure_ascii=False, default=str) + "\n")
+
+
+@contextlib.contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Time a block as a child of the current span (no-op outside a turn). Spans opened inside the block, including
+    on node executor threads scheduled from it, nest under it. Exceptions mark the span as failed and propagate.
+    Yields:
+        Optional[Span]: The span (call .set(key, value) to add attributes), or None outside a turn.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    sp = trace.add_span(Span(name, parent.span_id if parent else None, kind, attributes))
+    token = _current_span.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        sp.finish()
+
+
+def traced(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Decorator: run a node function inside a span named `name`; a returned dict with an 'error' key marks it failed.
+    """
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name) as sp:
+                result = fn(*args, **kwargs)
+                if sp is not None and isinstance(result, dict):
+                    if result.get("error"):
+                        sp.error = str(result["error"])
+                    if result.get("degraded"):
+                        sp.set("degraded", True)
+                return result
+        return wrapper
+    return decorator
+
+
+def record_call(node: str, model: str, prompt_chars: int, prompt_tokens: Optional[int], completion_tokens: Optional[int], latency_ms: float, cache: str, status: Any = None, ttft_ms: Optional[float] = None, escalated: bool = False, cached_tokens: Optional[int] = None) -> None:
+    """
+    Record one node call into the current turn trace (no-op outside a turn).
+    Args:
+        node (str): Calling node.
+        model (str): Model name ('local' for calls answered without an LLM).
+        prompt_chars (int): Characters sent in the prompt messages.
+        prompt_tokens (int): Prompt tokens from Groq 'usage' (estimated when unavailable).
+        completion_tokens (int): Completion tokens from Groq 'usage'.
+        latency_ms (float): Wall time of the call.
+        cache (str): 'hit', 'miss', 'off' (not cacheable) or 'local'.
+        status: HTTP status or error marker.
+        ttft_ms (float, optional): Time to first token, for streamed calls.
+        escalated (bool): True if this call re-ran a small-model call on the large model (see model_policy.py).
+        cached_tokens (int, optional): Prompt tokens served from the provider's prefix cache.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    # The call has just finished: add it as a span ending now under whichever span made it
+    end = time.time()
+    parent = _current_span.get()
+    llm = cache in ("miss", "off")
+    call_span = Span(f"groq {node}" if llm else f"{cache} {node}", parent.span_id if parent else None, SPAN_KIND_CLIENT if llm else SPAN_KIND_INTERNAL, start=end - latency_ms / 1000)
+    call_span.finish(end)
+    for key, value in (("node", node), ("gen_ai.request.model", model), ("gen_ai.usage.input_tokens", prompt_tokens),
+                       ("gen_ai.usage.output_tokens", completion_tokens), ("gen_ai.usage.cached_input_tokens", cached_tokens),
+                       ("cache", cache), ("http.response.status_code", status if isinstance(status, int) else None),
+                       ("ttft_ms", round(ttft_ms, 1) if ttft_ms is not None else None), ("escalated", escalated or None)):
+        call_span.set(key, value)
+    if llm and not (isinstance(status, int) and status < 400):
+        call_span.error = f"status={status}"
+    trace.add_span(call_span)
+    trace.add_record({
+        "node": node,
+        "model": model,
+        "prompt_chars": prompt_chars,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "latency_ms": round(latency_ms, 1),
+        "cache": cache,
+        "status": status,
+        "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+        "escalated": escalated,
+        "cached_tokens": cached_tokens
+    })